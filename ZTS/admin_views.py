@@ -0,0 +1,84 @@
+# ZTS/admin_views.py
+# ---------------------------------
+# Admin endpoints used by the ZTS admin report (templates/ZTS/admin_report.html):
+#
+#   GET  /zts/live/{code}     the live counters of a session as JSON (polled by
+#                             the report; from memory, no database access)
+#   POST /zts/export/{code}   start the TradingAction export of a session now,
+#                             also while it is still running (a snapshot)
+#   GET  /zts/export/{code}   download the newest finished export file
+#   POST /zts/profile/{code}  open ('seconds' > 0) or stop ('seconds' = 0) a
+#                             profiling window of a session (profiling.py)
+#   GET  /zts/profile/{code}  download its samples in folded-stacks format
+#
+# They are oTree admin views, so the admin login and the CSRF token of the
+# admin pages are checked as on oTree's own pages. oTree 6 has no setting
+# for extra routes: register() (called when pages.py is imported) adds them
+# to the route list oTree appends after importing the apps' pages.
+
+import os
+
+from otree.channels.routing import websocket_routes
+from otree.database import db
+from otree.models import Session
+from otree.views.cbv import AdminView
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+from . import exports, profiling
+from .models import Subsession, live_status, start_trading_action_export, trading_action_export_name
+
+
+class LiveStatus(AdminView):
+    url_pattern = '/zts/live/{code}'
+
+    def get(self, request, code):
+        return JSONResponse(live_status(code))
+
+
+class ExportTradingActions(AdminView):
+    url_pattern = '/zts/export/{code}'
+
+    def get(self, request, code):
+        for complete in (True, False):
+            path = exports.finished_artifact(trading_action_export_name(code, complete))
+            if path is not None:
+                return FileResponse(path, filename=os.path.basename(path), media_type='text/csv')
+        return Response('No finished export of this session.', status_code=404)
+
+    def post(self, request, code):
+        session = db.get_or_404(Session, code=code)
+        job = start_trading_action_export(Subsession.objects_get(session=session, round_number=1))
+        return JSONResponse(dict(job.as_dict(), partial=job.name != trading_action_export_name(code)))
+
+
+class ProfileSession(AdminView):
+    url_pattern = '/zts/profile/{code}'
+
+    def get(self, request, code):
+        return PlainTextResponse(profiling.folded(code), headers={
+            'Content-Disposition': 'attachment; filename="zts_{}.folded"'.format(code)})
+
+    def post(self, request, code):
+        db.get_or_404(Session, code=code)
+        try:
+            seconds = float(self.get_post_data().get('seconds') or 0)
+        except ValueError:
+            return Response('seconds must be a number', status_code=400)
+        if seconds > 0:
+            profiling.start(code, seconds)
+        else:
+            profiling.stop(code)
+        return JSONResponse(profiling.status(code))
+
+
+VIEWS = [LiveStatus, ExportTradingActions, ProfileSession]
+
+
+def register():
+    """
+    Add the routes of VIEWS unless they are already there.
+    """
+    registered = {getattr(route, 'endpoint', None) for route in websocket_routes}
+    websocket_routes.extend(Route(view.url_pattern, view, name=view.__name__)
+                            for view in VIEWS if view not in registered)
@@ -0,0 +1,151 @@
+# ZTS/analysis.py
+# ---------------------------------
+# Bootstrap confidence intervals for differences between the treatment and
+# control arms, computed from the materialized RoundSummary rows.
+#
+# Participants are the resampling unit: each participant contributes the mean
+# of a metric over their (non-training) rounds, and both arms are resampled
+# with replacement independently. Resamples are drawn in fixed-size chunks as
+# (chunk x n) index matrices, and the chunks are spread over a process pool.
+# Every chunk has its own child of one numpy SeedSequence, so the result for a
+# given seed does not depend on the number of workers.
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence
+import os
+
+import numpy as np
+
+
+DEFAULT_METRICS = ('roi', 'sharpe', 'max_dd')
+# resamples per chunk; one chunk is one task for the process pool
+CHUNK_RESAMPLES = 2000
+# below this many draws (resamples x participants) the pool costs more than it saves
+MIN_PARALLEL_DRAWS = 5_000_000
+
+
+def participant_means(summaries: Iterable, metric: str, include_training: bool = False) -> Dict[str, Dict[str, float]]:
+    """
+    Mean of a metric per participant, grouped by arm:
+    {arm: {participant code: mean}}. Accepts dicts with 'arm', 'participant'
+    (code), 'is_training_round' and the metric (see
+    models.get_round_summary_rows, which reads them in one query), or
+    RoundSummary rows, which load their participant one by one.
+    """
+    sums = {}
+    for rs in summaries:
+        row = rs if isinstance(rs, dict) else dict(
+            arm=rs.arm, participant=rs.participant.code,
+            is_training_round=rs.is_training_round, **{metric: getattr(rs, metric)},
+        )
+        if row.get('is_training_round') and not include_training:
+            continue
+        value = row.get(metric)
+        if value is None:
+            continue
+        value = float(value)
+        if not np.isfinite(value):
+            continue
+        acc = sums.setdefault(row.get('arm') or '', {}).setdefault(row['participant'], [0.0, 0])
+        acc[0] += value
+        acc[1] += 1
+    return {arm: {code: s / n for code, (s, n) in by_code.items()} for arm, by_code in sums.items()}
+
+
+def _resample_means(values: np.ndarray, n_resamples: int, seed) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(values), size=(n_resamples, len(values)))
+    return values[idx].mean(axis=1)
+
+
+def _bootstrap_chunk(args) -> np.ndarray:
+    treatment, control, n_resamples, seed = args
+    seed_t, seed_c = seed.spawn(2)
+    return _resample_means(treatment, n_resamples, seed_t) - _resample_means(control, n_resamples, seed_c)
+
+
+def bootstrap_difference(
+    treatment: Sequence[float],
+    control: Sequence[float],
+    n_resamples: int = 10000,
+    confidence: float = 0.95,
+    seed: Optional[int] = 0,
+    workers: Optional[int] = None,
+) -> Dict:
+    """
+    Percentile bootstrap of mean(treatment) - mean(control).
+
+    :param workers: size of the process pool; None picks os.cpu_count() for
+        large jobs and runs small ones in-process, 1 never starts a pool
+    :return: dict with estimate, ci_low, ci_high, p_value (two-sided share of
+        resampled differences on the other side of 0), se and group sizes
+    """
+    t = np.asarray(treatment, dtype=float)
+    c = np.asarray(control, dtype=float)
+    result = dict(n_treatment=int(len(t)), n_control=int(len(c)), n_resamples=int(n_resamples),
+                  confidence=confidence, estimate=None, ci_low=None, ci_high=None, p_value=None, se=None)
+    if len(t) == 0 or len(c) == 0 or n_resamples <= 0:
+        return result
+
+    sizes = [CHUNK_RESAMPLES] * (n_resamples // CHUNK_RESAMPLES)
+    if n_resamples % CHUNK_RESAMPLES:
+        sizes.append(n_resamples % CHUNK_RESAMPLES)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(t, c, size, s) for size, s in zip(sizes, seeds)]
+
+    if workers is None:
+        workers = (os.cpu_count() or 1) if n_resamples * (len(t) + len(c)) >= MIN_PARALLEL_DRAWS else 1
+    workers = max(1, min(int(workers), len(tasks)))
+    if workers == 1:
+        diffs = np.concatenate([_bootstrap_chunk(task) for task in tasks])
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            diffs = np.concatenate(list(pool.map(_bootstrap_chunk, tasks)))
+
+    estimate = float(t.mean() - c.mean())
+    alpha = (1.0 - confidence) / 2.0
+    low, high = np.quantile(diffs, [alpha, 1.0 - alpha])
+    p_value = 2.0 * min(float(np.mean(diffs <= 0.0)), float(np.mean(diffs >= 0.0)))
+    result.update(
+        estimate=estimate,
+        ci_low=float(low),
+        ci_high=float(high),
+        p_value=min(p_value, 1.0),
+        se=float(diffs.std(ddof=1)) if len(diffs) > 1 else 0.0,
+    )
+    return result
+
+
+def compare_arms(
+    summaries: Iterable,
+    metrics: Sequence[str] = DEFAULT_METRICS,
+    treatment: str = 'treatment',
+    control: str = 'control',
+    include_training: bool = False,
+    **kwargs,
+) -> Dict[str, Dict]:
+    """
+    Bootstrap CIs of the treatment - control difference for each metric.
+    Keyword arguments are passed on to bootstrap_difference.
+    """
+    summaries = list(summaries)
+    results = {}
+    for metric in metrics:
+        by_arm = participant_means(summaries, metric, include_training=include_training)
+        results[metric] = bootstrap_difference(
+            list(by_arm.get(treatment, {}).values()),
+            list(by_arm.get(control, {}).values()),
+            **kwargs
+        )
+    return results
+
+
+def format_results(results: Dict[str, Dict]) -> List[List]:
+    """
+    Rows (with header) for CSV export or printing.
+    """
+    rows = [['metric', 'n_treatment', 'n_control', 'estimate', 'ci_low', 'ci_high', 'p_value', 'se']]
+    for metric, r in results.items():
+        rows.append([metric, r['n_treatment'], r['n_control'], r['estimate'],
+                     r['ci_low'], r['ci_high'], r['p_value'], r['se']])
+    return rows
@@ -0,0 +1,113 @@
+# ZTS/assets.py
+# ---------------------------------
+# Bundled and fingerprinted front-end scripts of the ZTS pages.
+# The scripts of a bundle are concatenated into one file whose name contains a
+# hash of the content, _static/ZTS/bundles/<bundle>.<hash>.js, served by
+# oTree's static files like any other script (the template loads it with
+# {% static %}). As the URL changes whenever a script changes, a browser
+# never runs a stale bundle, and participants download one file instead of
+# one per script.
+#
+# The file is written on the first page render after a script changed
+# (checked by modification time, so editing a script in development needs no
+# build step), or ahead of time with
+#
+#   python -m ZTS.assets
+#
+# e.g. in a release step when the deployed _static is read-only. If the file
+# can neither be found nor written, static_path() returns None and the page
+# loads the single scripts instead. Writing a new version keeps the previous
+# one, so a page rendered just before a script changed can still load its
+# bundle; older versions are removed.
+#
+# Caching: oTree serves _static without Cache-Control headers (only ETag and
+# Last-Modified), so a browser still revalidates the bundle on each page and
+# gets a 304 without the body; the fingerprint cannot be used for an
+# 'immutable' long-lived cache here.
+
+from functools import lru_cache
+from typing import Optional, Tuple
+import glob
+import hashlib
+import logging
+import os
+import tempfile
+
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = '_static'
+BUNDLE_DIR = 'ZTS/bundles'
+BUNDLES = {
+    'trading': ('ZTS/chart.js', 'ZTS/trade_controller.js'),
+}
+
+_failed = set()   # (bundle, error) that could not be written, logged once
+
+
+def _mtimes(name: str) -> Tuple[float, ...]:
+    return tuple(os.path.getmtime(os.path.join(STATIC_DIR, f)) for f in BUNDLES[name])
+
+
+@lru_cache(maxsize=16)
+def _build(name: str, mtimes: Tuple[float, ...]) -> Tuple[str, bytes]:
+    parts = []
+    for filename in BUNDLES[name]:
+        with open(os.path.join(STATIC_DIR, filename), 'rb') as f:
+            parts.append(b'// ' + filename.encode() + b'\n' + f.read().rstrip() + b'\n;\n')
+    content = b''.join(parts)
+    return hashlib.sha256(content).hexdigest()[:12], content
+
+
+def bundle(name: str) -> Tuple[str, bytes]:
+    """
+    (fingerprint, content) of a bundle.
+    """
+    return _build(name, _mtimes(name))
+
+
+def emit(name: str) -> str:
+    """
+    Write the current bundle into STATIC_DIR unless it is there already, and
+    remove the versions before the previous one. Returns its path relative
+    to STATIC_DIR.
+    """
+    fingerprint, content = bundle(name)
+    path = '{}/{}.{}.js'.format(BUNDLE_DIR, name, fingerprint)
+    target = os.path.join(STATIC_DIR, path)
+    if not os.path.exists(target):
+        directory = os.path.dirname(target)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, target)
+        # newest first; the first one besides the new bundle is the previous version
+        others = sorted((old for old in glob.glob(os.path.join(directory, '{}.*.js'.format(name)))
+                         if old != target), key=os.path.getmtime, reverse=True)
+        for old in others[1:]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return path
+
+
+def static_path(name: str) -> Optional[str]:
+    """
+    Path of the current bundle for {% static %}, or None if it cannot be written.
+    """
+    try:
+        return emit(name)
+    except OSError as e:
+        # not bundle(name) here: reading the scripts may be what failed
+        key = (name, str(e))
+        if key not in _failed:
+            _failed.add(key)
+            logger.exception('could not write the %s bundle, serving the single scripts', name)
+        return None
+
+
+if __name__ == '__main__':
+    for bundle_name in BUNDLES:
+        print(os.path.join(STATIC_DIR, emit(bundle_name)))
@@ -0,0 +1,392 @@
+# ZTS/baselines.py
+# ---------------------------------
+# Reference strategies played over the scenario files, to calibrate payoffs
+# and to put participants' behaviour into perspective. Run
+#
+#   python -m ZTS.baselines [timeseries_filepath] --cash 5000 --shares 17
+#
+# for a table per scenario and strategy, or call sweep() from an analysis script.
+#
+# Trades follow the rules of buy_shares/sell_shares (trade_controller.js):
+# a click trades one button amount at the price of the current day, never on
+# day 0; a buy click without enough cash buys as many shares as it can and
+# leaves the cash at 0, a sell click without enough shares sells the rest.
+#
+# Strategies (each played by a batch of agents, vectorized over the agents):
+#   - buy_and_hold:   spends all cash on day 1
+#   - momentum:       one click in the direction of the last 'lookback' days
+#   - mean_reversion: one click against the deviation from the moving average
+#   - random:         clicks at human rates (Poisson per day), random side and button
+#   - anchoring:      buys below and sells above the last number in the news
+#                     (the start price if there is none)
+# Agents differ by parameters (lookback, threshold, click rate) and, for the
+# random strategies, by their draws. Every (scenario, strategy) pair is one task
+# for a process pool; each task gets its own child of one numpy SeedSequence,
+# so the results for a seed do not depend on the number of workers.
+#
+# The output per scenario and strategy are the distributions (over agents) of
+# the summarize_round metrics and of the payoff, i.e. the end portfolio value
+# that random_round_payoff pays if the round is drawn.
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+import argparse
+import csv
+import os
+import re
+
+import numpy as np
+
+from .utils_metrics import reference_stats, summarize_round
+
+
+STRATEGIES = ('buy_and_hold', 'momentum', 'mean_reversion', 'random', 'anchoring')
+METRICS = ('roi', 'max_dd', 'trade_count', 'turnover', 'anchor_bp', 'sharpe', 'sortino',
+           'excess_return', 'oracle_capture', 'payoff')
+QUANTILES = (0.05, 0.5, 0.95)
+# agents per strategy; deterministic strategies spread them over their parameter grid
+DEFAULT_AGENTS = 200
+# clicks per second of the random strategy (spread over the agents)
+HUMAN_CLICK_RATES = (0.05, 0.1, 0.2, 0.5)
+
+_number = re.compile(r'(-?\d+(?:\.\d+)?)')
+
+
+def read_scenario(path: str):
+    """
+    Prices and news of a timeseries CSV (columns date, price[, news]).
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        rows = list(csv.DictReader(f))
+    prices = [float(row['price']) for row in rows]
+    news = [row.get('news') or '' for row in rows]
+    return prices, news
+
+
+def scenario_files(filepath: str) -> List[str]:
+    return sorted(name for name in os.listdir(filepath) if name.endswith('.csv'))
+
+
+def news_anchors(news: Sequence[str], first_price: float) -> np.ndarray:
+    """
+    Last positive number mentioned in the news up to each day
+    (parsed like Player._try_append_anchor_from_payload), else the first price.
+    """
+    anchors = np.empty(len(news))
+    anchor = first_price
+    for i, text in enumerate(news):
+        m = _number.search((text or '').replace(',', ''))
+        if m and float(m.group(1)) > 0:
+            anchor = float(m.group(1))
+        anchors[i] = anchor
+    return anchors
+
+
+def execute(cash: np.ndarray, shares: np.ndarray, price: float, clicks: np.ndarray, size: np.ndarray):
+    """
+    Apply 'clicks' button clicks of 'size' shares (> 0 buy, < 0 sell) per
+    agent, with the rules of buy_shares/sell_shares. Updates cash and shares
+    in place and returns the traded shares per agent (signed).
+    """
+    n = np.abs(clicks)
+    size = np.broadcast_to(size, clicks.shape).astype(float)
+
+    buy = (clicks > 0) & (cash > 0)
+    full = np.minimum(n, np.floor(cash / (size * price)))
+    rest = np.floor((cash - full * size * price) / price)
+    # a click that cannot be covered buys the rest and leaves no cash
+    partial = buy & (n > full)
+    bought = np.where(buy, full * size + np.where(partial, rest, 0.0), 0.0)
+
+    sell = (clicks < 0) & (shares > 0)
+    full = np.minimum(n, np.floor(shares / size))
+    sold = np.where(sell, np.where(n > full, shares, full * size), 0.0)
+
+    cash -= bought * price
+    cash[partial] = 0.0
+    cash += sold * price
+    shares += bought - sold
+    return bought - sold
+
+
+def browser_reports(prices: Sequence[float], cash: float, shares: int, clicks: Sequence, asset: str = '',
+                    coalesce: bool = False) -> List[Dict]:
+    """
+    The live reports trade_controller.js sends for one round: 'Start', one
+    'Buy'/'Sell' per click that trades and 'End' on the last day, with the
+    values of get_trade_report. Used to drive the live method from bots and
+    to check the server side against the browser.
+
+    :param clicks: (day, amount) per button click in the order of the clicks;
+        amount > 0 buys, < 0 sells, day >= 1
+    :param coalesce: merge the clicks of a day into net orders as with
+        'order_coalesce_ms' (assuming the window covers the whole day): one
+        report per day with the number of merged clicks in 'clicks'; a
+        partial buy ends an order, and a net order of zero is not sent
+    """
+    start_cash = float(cash)
+    cash_ = np.array([start_cash])
+    shares_ = np.array([float(shares)])
+    reports = []
+    pending = dict(day=None, quantity=0, clicks=0)
+
+    def report(action, day, quantity, **extra):
+        price = float(prices[day])
+        share_value = float(shares_[0]) * price if action != 'Start' else 0.0
+        total = float(cash_[0]) + share_value
+        reports.append(dict(
+            action=action, quantity=quantity, time='day {}'.format(day),
+            client_ts_ms=len(reports), client_seq=len(reports) + 1,
+            price_per_share=price, cash=float(cash_[0]), owned_shares=int(shares_[0]),
+            share_value=share_value, portfolio_value=total, cur_day=day, asset=asset,
+            roi_percent=total / start_cash * 100 - 100 if action != 'Start' else 0.0,
+            pandl=total - start_cash if action != 'Start' else 0.0,
+            **extra
+        ))
+
+    def flush():
+        if pending['quantity']:
+            report('Buy' if pending['quantity'] > 0 else 'Sell', pending['day'], pending['quantity'],
+                   clicks=pending['clicks'])
+        pending.update(day=None, quantity=0, clicks=0)
+
+    report('Start', 0, 0)
+    for day, amount in clicks:
+        if pending['day'] != day:
+            # the browser sends the open order when the day ends
+            flush()
+        price = float(prices[day])
+        partial = amount > 0 and 0 < cash_[0] < amount * price
+        traded = execute(cash_, shares_, price, np.array([np.sign(amount)], dtype=float), abs(amount))
+        if not traded[0]:
+            continue
+        if not coalesce:
+            report('Buy' if traded[0] > 0 else 'Sell', day, int(traded[0]))
+            continue
+        pending.update(day=day, quantity=pending['quantity'] + int(traded[0]), clicks=pending['clicks'] + 1)
+        if partial:
+            flush()
+    flush()
+    report('End', len(prices) - 1, 0)
+    return reports
+
+
+def _strategy_agents(strategy: str, n_agents: int) -> Dict[str, np.ndarray]:
+    """
+    Parameters per agent.
+    """
+    idx = np.arange(n_agents)
+    if strategy == 'momentum':
+        return dict(lookback=np.array([3, 5, 10, 20])[idx % 4], button=idx // 4 % 3)
+    if strategy == 'mean_reversion':
+        return dict(window=np.array([10, 20, 50])[idx % 3],
+                    threshold=np.array([0.01, 0.02, 0.05])[idx // 3 % 3], button=idx // 9 % 3)
+    if strategy == 'anchoring':
+        return dict(threshold=np.array([0.0, 0.01, 0.02, 0.05])[idx % 4], button=idx // 4 % 3)
+    if strategy == 'random':
+        return dict(rate=np.array(HUMAN_CLICK_RATES)[idx % len(HUMAN_CLICK_RATES)])
+    return dict()
+
+
+def play(strategy: str, prices: Sequence[float], news: Sequence[str], cash: float, shares: int,
+         buttons: Sequence[int], n_agents: int, refresh_rate_ms: float = 1000, seed=None) -> Dict[str, np.ndarray]:
+    """
+    Play one strategy with n_agents agents over one scenario.
+    Returns 'values' (days x agents portfolio values after each day's trades),
+    'traded' (days x agents signed shares) and the agent parameters.
+    """
+    rng = np.random.default_rng(seed)
+    px = np.asarray(prices, dtype=float)
+    buttons = np.asarray(buttons, dtype=float)
+    params = _strategy_agents(strategy, n_agents)
+    cash_ = np.full(n_agents, float(cash))
+    shares_ = np.full(n_agents, float(shares))
+    values = np.empty((len(px), n_agents))
+    traded = np.zeros((len(px), n_agents))
+    values[0] = cash_ + shares_ * px[0]
+    cumsum = np.concatenate([[0.0], np.cumsum(px)])
+    anchors = news_anchors(news, px[0]) if strategy == 'anchoring' else None
+    clicks_per_day = params['rate'] * refresh_rate_ms / 1000.0 if strategy == 'random' else None
+
+    for t in range(1, len(px)):
+        price = px[t]
+        if strategy == 'buy_and_hold':
+            slots = []
+            if t == 1:
+                # enough clicks of the largest button to run out of cash
+                n = np.ceil(cash_ / (buttons[-1] * price)) + 1
+                slots = [(n, buttons[-1])]
+        elif strategy == 'momentum':
+            past = px[np.maximum(t - params['lookback'], 0)]
+            slots = [(np.sign(price - past), buttons[params['button']])]
+        elif strategy == 'mean_reversion':
+            start = np.maximum(t + 1 - params['window'], 0)
+            ma = (cumsum[t + 1] - cumsum[start]) / (t + 1 - start)
+            dev = price / ma - 1.0
+            slots = [(np.where(dev < -params['threshold'], 1, np.where(dev > params['threshold'], -1, 0)),
+                      buttons[params['button']])]
+        elif strategy == 'anchoring':
+            dev = price / anchors[t] - 1.0
+            slots = [(np.where(dev < -params['threshold'], 1, np.where(dev > params['threshold'], -1, 0)),
+                      buttons[params['button']])]
+        elif strategy == 'random':
+            n_clicks = rng.poisson(clicks_per_day)
+            # one slot per click, in the order they happen during the day
+            slots = []
+            for k in range(int(n_clicks.max(initial=0))):
+                side = np.where(rng.random(n_agents) < 0.5, 1, -1)
+                slots.append((np.where(k < n_clicks, side, 0), buttons[rng.integers(0, len(buttons), n_agents)]))
+        else:
+            raise ValueError('unknown strategy: {}'.format(strategy))
+
+        for clicks, size in slots:
+            traded[t] += execute(cash_, shares_, price, np.asarray(clicks, dtype=float), size)
+        values[t] = cash_ + shares_ * price
+
+    return dict(values=values, traded=traded, **params)
+
+
+def summarize_agents(played: Dict[str, np.ndarray], prices: Sequence[float], anchors: Optional[Sequence[float]],
+                     reference: Dict, periods_per_year: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    summarize_round metrics of every agent (one array per metric),
+    plus 'payoff' (end portfolio value).
+    """
+    values, traded = played['values'], played['traded']
+    px = np.asarray(prices, dtype=float)
+    rows = []
+    for a in range(values.shape[1]):
+        days = np.nonzero(traded[:, a])[0]
+        trades = [dict(qty=float(traded[d, a]), price=float(px[d]),
+                       side='Buy' if traded[d, a] > 0 else 'Sell', ts=int(d)) for d in days]
+        pv = values[:, a].tolist()
+        rows.append(summarize_round(
+            start_value=pv[0], end_value=pv[-1], portfolio_values=pv, trades=trades,
+            anchors=list(anchors) if anchors is not None else [],
+            periods_per_year=periods_per_year, reference=reference,
+        ))
+    result = {metric: np.array([row[metric] for row in rows], dtype=float) for metric in rows[0]}
+    result['payoff'] = values[-1].copy()
+    return result
+
+
+def distribution(values: np.ndarray) -> Dict[str, float]:
+    q = np.quantile(values, QUANTILES)
+    return dict(mean=float(values.mean()), std=float(values.std()),
+                p05=float(q[0]), p50=float(q[1]), p95=float(q[2]))
+
+
+def _sweep_task(args) -> Dict:
+    filepath, name, strategy, settings, seed = args
+    prices, news = read_scenario(os.path.join(filepath, name))
+    played = play(strategy, prices, news, settings['cash'], settings['shares'], settings['buttons'],
+                  settings['agents'] if strategy != 'buy_and_hold' else 1,
+                  settings['refresh_rate_ms'], seed)
+    anchors = news_anchors(news, prices[0]) if any(news) else None
+    metrics = summarize_agents(played, prices, anchors, reference_stats(prices), settings['periods_per_year'])
+    return dict(scenario=name, strategy=strategy, agents=played['values'].shape[1],
+                **{metric: distribution(metrics[metric]) for metric in METRICS})
+
+
+def sweep(
+    filepath: str,
+    cash: float,
+    shares: int,
+    buttons: Sequence[int] = (1, 10, 20),
+    strategies: Sequence[str] = STRATEGIES,
+    agents: int = DEFAULT_AGENTS,
+    refresh_rate_ms: float = 1000,
+    periods_per_year: Optional[int] = None,
+    seed: Optional[int] = 0,
+    workers: Optional[int] = None,
+) -> List[Dict]:
+    """
+    Play every strategy over every scenario file in filepath.
+    Returns one dict per (scenario, strategy) with a distribution
+    (mean, std, p05, p50, p95) per metric.
+
+    :param workers: size of the process pool; None uses os.cpu_count(),
+        1 runs in-process
+    """
+    names = scenario_files(filepath)
+    settings = dict(cash=float(cash), shares=int(shares), buttons=sorted(buttons), agents=int(agents),
+                    refresh_rate_ms=float(refresh_rate_ms), periods_per_year=periods_per_year)
+    pairs = [(name, strategy) for name in names for strategy in strategies]
+    seeds = np.random.SeedSequence(seed).spawn(len(pairs))
+    tasks = [(filepath, name, strategy, settings, s) for (name, strategy), s in zip(pairs, seeds)]
+
+    workers = max(1, min(int(workers or os.cpu_count() or 1), len(tasks) or 1))
+    if workers == 1:
+        return [_sweep_task(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_sweep_task, tasks))
+
+
+def expected_payouts(results: List[Dict], real_world_currency_per_point: float = 1.0,
+                     participation_fee: float = 0.0) -> Dict[str, Dict]:
+    """
+    Expected payout per strategy under random_round_payoff, with the paid
+    round drawn uniformly from the scenarios of the sweep:
+    {strategy: {'points', 'currency', 'per_scenario': {scenario: points}}}.
+    """
+    by_strategy = {}
+    for row in results:
+        by_strategy.setdefault(row['strategy'], {})[row['scenario']] = row['payoff']['mean']
+    payouts = {}
+    for strategy, per_scenario in by_strategy.items():
+        points = sum(per_scenario.values()) / len(per_scenario)
+        payouts[strategy] = dict(
+            points=points,
+            currency=points * real_world_currency_per_point + participation_fee,
+            per_scenario=per_scenario,
+        )
+    return payouts
+
+
+def format_results(results: List[Dict], metrics: Sequence[str] = METRICS) -> List[List]:
+    """
+    Rows (with header) for CSV export or printing: one row per scenario,
+    strategy and metric.
+    """
+    rows = [['scenario', 'strategy', 'agents', 'metric', 'mean', 'std', 'p05', 'p50', 'p95']]
+    for r in results:
+        for metric in metrics:
+            d = r[metric]
+            rows.append([r['scenario'], r['strategy'], r['agents'], metric,
+                         d['mean'], d['std'], d['p05'], d['p50'], d['p95']])
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play reference strategies over the ZTS scenario files.')
+    parser.add_argument('filepath', nargs='?', default='_static/ZTS/timeseries_files/')
+    parser.add_argument('--cash', type=float, default=5000)
+    parser.add_argument('--shares', type=int, default=17)
+    parser.add_argument('--buttons', type=int, nargs=3, default=[1, 10, 20])
+    parser.add_argument('--strategies', nargs='+', choices=STRATEGIES, default=list(STRATEGIES))
+    parser.add_argument('--agents', type=int, default=DEFAULT_AGENTS)
+    parser.add_argument('--refresh-rate-ms', type=float, default=1000)
+    parser.add_argument('--periods-per-year', type=int, default=None)
+    parser.add_argument('--currency-per-point', type=float, default=1.0)
+    parser.add_argument('--participation-fee', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', help='write the metric distributions to this CSV file')
+    args = parser.parse_args(argv)
+
+    results = sweep(args.filepath, args.cash, args.shares, args.buttons, args.strategies, args.agents,
+                    args.refresh_rate_ms, args.periods_per_year, args.seed, args.workers)
+    rows = format_results(results)
+    if args.out:
+        with open(args.out, 'w', newline='') as f:
+            csv.writer(f).writerows(rows)
+    else:
+        for row in rows:
+            print('\t'.join('{:.4f}'.format(v) if isinstance(v, float) else str(v) for v in row))
+    print('\nExpected payout under random_round_payoff')
+    for strategy, payout in expected_payouts(results, args.currency_per_point, args.participation_fee).items():
+        print('{}\t{:.2f} points\t{:.2f}'.format(strategy, payout['points'], payout['currency']))
+
+
+if __name__ == '__main__':
+    main()
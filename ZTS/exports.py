@@ -0,0 +1,189 @@
+# ZTS/exports.py
+# ---------------------------------
+# Background export jobs.
+# An export is split into tasks (one per session and round); a thread pool
+# runs the tasks, each writing its rows to a part file in chunks, and the parts
+# are concatenated in task order into the final CSV, which replaces the
+# previous file atomically. The caller that starts a job returns at once;
+# the admin report shows status(), and the app's custom export streams the
+# file (read_rows) once the job is done.
+#
+# Artifacts live in EXPORT_DIR (env ZTS_EXPORT_DIR, default ./__exports).
+# A job started with cacheable=True (the session is complete, so its data can
+# no longer change) reuses an existing artifact instead of exporting again.
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+import csv
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.environ.get('ZTS_EXPORT_DIR', os.path.join(os.getcwd(), '__exports'))
+# threads per job
+EXPORT_WORKERS = int(os.environ.get('ZTS_EXPORT_WORKERS', 4))
+# rows written per chunk
+CHUNK_ROWS = 5000
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+
+class ExportJob:
+    def __init__(self, name: str, path: str, n_tasks: int):
+        self.name = name
+        self.path = path
+        self.status = QUEUED
+        self.n_tasks = n_tasks
+        self.tasks_done = 0
+        self.rows = 0
+        self.error = ''
+        self.cached = False
+        self.started = time.time()
+        self.finished = None
+        self.lock = threading.Lock()
+
+    def as_dict(self) -> Dict:
+        with self.lock:
+            return dict(
+                name=self.name,
+                status=self.status,
+                progress=round(self.tasks_done / self.n_tasks, 3) if self.n_tasks else 1.0,
+                tasks_done=self.tasks_done,
+                n_tasks=self.n_tasks,
+                rows=self.rows,
+                cached=self.cached,
+                error=self.error,
+                seconds=round((self.finished or time.time()) - self.started, 1),
+            )
+
+
+_jobs = {}   # name -> latest ExportJob
+_jobs_lock = threading.Lock()
+
+
+def artifact_path(name: str) -> str:
+    return os.path.join(EXPORT_DIR, '{}.csv'.format(name))
+
+
+def get_job(name: str) -> Optional[ExportJob]:
+    return _jobs.get(name)
+
+
+def status(name: str) -> Dict:
+    job = _jobs.get(name)
+    if job is not None:
+        return job.as_dict()
+    if os.path.exists(artifact_path(name)):
+        return dict(name=name, status=DONE, progress=1.0, cached=True, error='')
+    return dict(name=name, status='none', progress=0.0, cached=False, error='')
+
+
+def finished_artifact(name: str) -> Optional[str]:
+    """
+    Path of the artifact if it exists and no job is writing it, else None.
+    """
+    job = _jobs.get(name)
+    if job is not None and job.status != DONE:
+        return None
+    path = artifact_path(name)
+    return path if os.path.exists(path) else None
+
+
+def read_rows(path: str, types: Optional[List[Callable]] = None) -> Iterable[List]:
+    """
+    Data rows of an artifact (without its header).
+    With 'types' (one callable per column), the values are converted back:
+    an empty field is None (as csv writes None), except in str columns.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        if types is None:
+            yield from reader
+            return
+        for row in reader:
+            yield [value if t is str else (t(value) if value != '' else None) for t, value in zip(types, row)]
+
+
+def start(
+    name: str,
+    header: List,
+    tasks: List,
+    write_task: Callable[[object], Iterable[List]],
+    cacheable: bool = False,
+) -> ExportJob:
+    """
+    Start an export job unless one with this name is already running.
+
+    :param name: artifact name, e.g. 'trading_actions_<session code>'
+    :param tasks: task descriptions, exported in this order
+    :param write_task: called in a worker thread with one task; yields its rows
+    :param cacheable: reuse an existing artifact instead of exporting again
+    """
+    path = artifact_path(name)
+    with _jobs_lock:
+        job = _jobs.get(name)
+        if job is not None and job.status in (QUEUED, RUNNING):
+            return job
+        if cacheable and os.path.exists(path) and (job is None or job.status == DONE):
+            job = ExportJob(name, path, 0)
+            job.status, job.cached, job.finished = DONE, True, time.time()
+            _jobs[name] = job
+            return job
+        job = _jobs[name] = ExportJob(name, path, len(tasks))
+    threading.Thread(target=_run, args=(job, header, tasks, write_task),
+                     name='zts-export-' + name, daemon=True).start()
+    return job
+
+
+def _write_part(job: ExportJob, part_path: str, task, write_task):
+    with open(part_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        chunk = []
+        for row in write_task(task):
+            chunk.append(row)
+            if len(chunk) >= CHUNK_ROWS:
+                writer.writerows(chunk)
+                with job.lock:
+                    job.rows += len(chunk)
+                chunk = []
+        writer.writerows(chunk)
+    with job.lock:
+        job.rows += len(chunk)
+        job.tasks_done += 1
+
+
+def _run(job: ExportJob, header: List, tasks: List, write_task):
+    with job.lock:
+        job.status = RUNNING
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix=job.name + '.', dir=EXPORT_DIR)
+    try:
+        parts = [os.path.join(workdir, 'part_{:05d}.csv'.format(i)) for i in range(len(tasks))]
+        with ThreadPoolExecutor(max_workers=max(1, min(EXPORT_WORKERS, len(tasks)))) as pool:
+            futures = [pool.submit(_write_part, job, part, task, write_task) for part, task in zip(parts, tasks)]
+            for future in futures:
+                future.result()
+        tmp_path = os.path.join(workdir, 'result.csv')
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as out:
+            csv.writer(out).writerow(header)
+            for part in parts:
+                with open(part, encoding='utf-8') as f:
+                    shutil.copyfileobj(f, out)
+        os.replace(tmp_path, job.path)
+        with job.lock:
+            job.status = DONE
+    except Exception as e:
+        logger.exception('export %s failed', job.name)
+        with job.lock:
+            job.status = FAILED
+            job.error = repr(e)
+    finally:
+        job.finished = time.time()
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,179 @@
+# ZTS/live_state.py
+# ---------------------------------
+# Shared per-player live state, so that any server worker can handle any
+# participant's live_trading_report without sticky routing.
+#
+# The state of one participant is a small JSON-compatible dict per kind:
+#   - 'report': round number, position (cash, shares), the last client_seq
+#     and the latest (client_seq, client_ts_ms) pairs (see record_report)
+#   - 'nudge': round features and nudge rate limits (see nudges.py)
+#   - 'bucket': the live-method token bucket (see rate_limit.py)
+#   - 'ephemeral': position, round logs and trades of an ephemeral round
+#     (see Player.is_ephemeral in models.py)
+# Timestamps stored in the state are wall-clock (time.time), as monotonic
+# clocks are not comparable between processes.
+#
+# Backends:
+#   - RedisLiveStore: one key per participant and kind, updated with
+#     WATCH/MULTI so concurrent workers do not lose updates (used when
+#     REDIS_URL is set and the redis package is installed).
+#   - LocalLiveStore: in-process stand-in with the same interface, for a
+#     single worker, development and tests.
+# update() may call its function more than once (optimistic retry), so the
+# function must only change the state it is given.
+
+from typing import Callable, Dict, Optional
+import json
+import logging
+import threading
+import time
+
+from .write_behind import get_redis
+
+
+logger = logging.getLogger(__name__)
+
+# live state outlives a session day; Redis expires it after this many seconds
+STATE_TTL_S = 24 * 3600
+# (client_seq, client_ts_ms) of the last reports, to recognize resends
+RECENT_REPORTS = 16
+
+
+class LocalLiveStore:
+    """
+    In-process store: a dict of states guarded by one lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            state = self._states.get(key)
+            return json.loads(state) if state is not None else None
+
+    def update(self, key: str, func: Callable[[Dict], object]):
+        """
+        Call func(state) with the current state of key (a new dict if there is
+        none), store the state it leaves and return func's result.
+        """
+        with self._lock:
+            raw = self._states.get(key)
+            state = json.loads(raw) if raw is not None else {}
+            result = func(state)
+            # stored as JSON like in Redis, so both backends behave the same
+            self._states[key] = json.dumps(state)
+            return result
+
+    def delete(self, key: str):
+        with self._lock:
+            self._states.pop(key, None)
+
+
+class RedisLiveStore:
+    """
+    States as JSON strings in Redis, updated in WATCH/MULTI transactions.
+    """
+
+    def __init__(self, client, prefix: str = 'zts:live:', ttl: int = STATE_TTL_S):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[Dict]:
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw else None
+
+    def update(self, key: str, func: Callable[[Dict], object]):
+        name = self.prefix + key
+
+        def transaction(pipe):
+            raw = pipe.get(name)
+            state = json.loads(raw) if raw else {}
+            result = func(state)
+            pipe.multi()
+            pipe.set(name, json.dumps(state), ex=self.ttl)
+            return result
+
+        return self.client.transaction(transaction, name, value_from_callable=True)
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+
+_local_store = LocalLiveStore()
+
+
+def get_store():
+    """
+    Redis-backed store if REDIS_URL is configured, otherwise the in-process one.
+    """
+    client = get_redis()
+    if client is not None:
+        return RedisLiveStore(client)
+    return _local_store
+
+
+def state_key(kind: str, session_code: str, participant_code: str) -> str:
+    return '{}:{}:{}'.format(kind, session_code, participant_code)
+
+
+def record_report(player, payload: Dict, store=None) -> bool:
+    """
+    Update the 'report' state of a player with one live message.
+    Returns False if the message is a resend of one already seen in this
+    round (same client_seq and client_ts_ms, e.g. after a reconnect), which
+    the caller should ignore. A client_seq that goes backwards otherwise
+    means the browser's counter started over (cleared storage, another tab
+    or device); the message is taken and the restart is logged.
+    """
+    store = store or get_store()
+    round_number = player.round_number
+    seq = _int_or_none(payload.get('client_seq'))
+    sent = [seq, _int_or_none(payload.get('client_ts_ms'))]
+
+    def apply(state):
+        if seq is not None and state.get('round') == round_number and sent in state['recent']:
+            return None
+        if state.get('round') != round_number or payload.get('action') == 'Start':
+            state.clear()
+            state.update(round=round_number, last_seq=0, messages=0, restarts=0, recent=[])
+        restarted_from = 0
+        if seq is not None:
+            if seq <= state['last_seq']:
+                restarted_from = state['last_seq']
+                state['restarts'] += 1
+            state['last_seq'] = seq
+            state['recent'] = (state['recent'] + [sent])[-RECENT_REPORTS:]
+        state['messages'] += 1
+        try:
+            state['cash'] = float(payload['cash'])
+            state['shares'] = float(payload['owned_shares'])
+        except (KeyError, TypeError, ValueError):
+            pass
+        state['updated'] = time.time()
+        return restarted_from
+
+    restarted_from = store.update(state_key('report', player.session.code, player.participant.code), apply)
+    if restarted_from is None:
+        return False
+    if restarted_from:
+        logger.warning('client_seq of %s went back from %d to %d in round %d; the browser counter restarted',
+                       player.participant.code, restarted_from, seq, round_number)
+    return True
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_report_state(player, store=None) -> Optional[Dict]:
+    """
+    Last known position and counters of a player ('report' state), or None.
+    """
+    store = store or get_store()
+    return store.get(state_key('report', player.session.code, player.participant.code))
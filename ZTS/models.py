@@ -1,7 +1,20 @@
 import json
-import random
+import math
+import os
 import re
+import time
+from functools import lru_cache
+import numpy as np
 from otree.api import *
+from otree.models import Session, Participant
+from sqlalchemy import BigInteger, Column, Index, create_engine, event, func, select
+from sqlalchemy.orm import Mapper, Session as DBSession, object_session
+from otree.database import IN_MEMORY, db, engine
+from .replay import new_running, replay_batch, replay_round, running_close, running_step
+from .scenarios import is_spec, load_scenario, scenario_reference_stats
+from .utils_metrics import reference_stats, summarize_rolling, summarize_rolling_batch
+from .write_behind import flush_rows, get_action_queue, player_id_of, queue_key, start_flusher
+from . import analysis, exports, live_state, monitor, nudges, order_book, profiling, rate_limit, round_series, vars_budget
 c = cu
 from otree.api import (
     models,
@@ -37,17 +50,28 @@ class Subsession(BaseSubsession):
         - Draws a random payoff round (excluding training round if present).
         """
         if self.round_number == 1:
-            self.session.num_rounds = len(json.loads(self.session.config['timeseries_filename']))
+            # resolve the config once for the whole session
+            config = self.session.config
+            num_rounds = len(json.loads(config['timeseries_filename']))
+            self.session.num_rounds = num_rounds
 
-            for player in self.get_players():
-                first_round = 1
-                if self.session.config['training_round']:
-                    first_round = 2
+            first_round = 2 if config['training_round'] else 1
+            if first_round > num_rounds:
+                raise ValueError('Num rounds cannot be smaller than 1 (or 2 if there is a training session)!')
 
-                if first_round > self.session.num_rounds:
-                    raise ValueError('Num rounds cannot be smaller than 1 (or 2 if there is a training session)!')
-
-                player.participant.vars['round_to_pay'] = random.randint(first_round, self.session.num_rounds)
+            # one vectorised draw for all participants; set 'round_to_pay_seed'
+            # in the session config to make the payoff rounds reproducible.
+            # Nothing is written here: the ORM flush at the end of session
+            # creation saves the changed participant.vars with one statement,
+            # UPDATE otree_participant SET _vars=? WHERE id=?, passed to the
+            # driver's executemany with one parameter set per participant
+            # (what bulk_update_mappings would emit as well). The driver still
+            # runs it once per row; there is no SELECT per participant.
+            participants = self.session.get_participants()
+            rng = np.random.default_rng(config.get('round_to_pay_seed'))
+            rounds_to_pay = rng.integers(first_round, num_rounds + 1, size=len(participants)).tolist()
+            for participant, round_to_pay in zip(participants, rounds_to_pay):
+                participant.vars['round_to_pay'] = round_to_pay
 
     def get_config_multivalue(self, value_name):
         """
@@ -64,20 +88,129 @@ class Subsession(BaseSubsession):
     def get_timeseries_values(self):
         """
         Read this round's timeseries file and parse lists of values.
+        The entry may also be a generator spec (see scenarios.py).
+        Both are cached in memory, so rendering a page costs no disk access
+        (the file's modification time is checked at most every TIMESERIES_STAT_TTL_S).
 
         :return: (asset_name, prices, news_list_or_empty_str_list)
         """
-        filename = self.get_config_multivalue('timeseries_filename')
-        asset = filename.strip('.csv')
-        path = self.session.config['timeseries_filepath'] + filename
-        rows = read_csv(path, TimeSeriesFile)
-        prices = [dic['price'] for dic in rows]
-        if 'news' in rows[0].keys():
-            news = [dic['news'] if dic['news'] else '' for dic in rows]
-        else:
-            news = '' * len(prices)
+        entry = self.get_config_multivalue('timeseries_filename')
+        if is_spec(entry):
+            return load_scenario(entry)
+        asset = entry.strip('.csv')
+        path = self.session.config['timeseries_filepath'] + entry
+        prices, news = read_timeseries_file(path, timeseries_mtime(path))
         return asset, prices, news
 
+    def get_reference_stats(self):
+        """
+        Benchmarks of this round's scenario (buy-and-hold return, volatility,
+        max drawdown, oracle return; see utils_metrics.reference_stats).
+        Computed once per scenario and cached like the series itself.
+        """
+        entry = self.get_config_multivalue('timeseries_filename')
+        if is_spec(entry):
+            return scenario_reference_stats(entry)
+        path = self.session.config['timeseries_filepath'] + entry
+        return read_timeseries_reference(path, timeseries_mtime(path))
+
+    def session_complete(self):
+        """
+        Whether every player has finished the last round, i.e. has its
+        RoundSummary (written in ResultsPage.before_next_page), so the
+        TradingActions of the session can no longer change.
+        """
+        last = self.in_round(self.session.num_rounds)
+        return len(get_round_summaries(self.session, last.round_number)) >= len(last.get_players())
+
+    def vars_for_admin_report(self):
+        """
+        Live session monitor. The page refreshes its counters (live_status)
+        from admin_views.LiveStatus, which answers from memory, so watching
+        costs no queries.
+        """
+        code = self.session.code
+        live = live_status(code)
+        return dict(
+            live,
+            # '<' escaped, so participant-sent strings cannot close the <script> it sits in
+            live_json=json.dumps(live).replace('<', '\\u003c'),
+            monitor_poll_ms=self.session.config.get('monitor_poll_ms', 2000),
+            profile_window_s=self.session.config.get('profile_window_s') or 60,
+            vars_footprint=vars_budget.report(code),
+        )
+
+    def replay_trading_actions(self, rel_tol=1e-6, abs_tol=0.01):
+        """
+        Recompute cash, shares and equity of every player-round in this session
+        from the scenario prices and the logged TradingActions, and flag rows
+        where the values reported by the browser disagree (see replay.py).
+
+        :return: list of replay results, keyed by (participant code, round number)
+        """
+        rounds = []
+        for subsession in self.in_rounds(1, self.session.num_rounds):
+            by_player = get_actions_by_player(self.session, subsession.round_number)
+            rounds.extend(player.get_replay_input(by_player.get(player.id, []))
+                          for player in subsession.get_players())
+        return replay_batch(rounds, rel_tol=rel_tol, abs_tol=abs_tol)
+
+    def message_latencies(self, percentiles=(50, 90, 99)):
+        """
+        Distribution of server receipt time minus browser send time (ms) over
+        all TradingActions of this session, and the number of reports that
+        arrived out of order (client_seq not increasing). The two clocks are
+        not synchronised, so compare distributions rather than single values.
+        """
+        deltas = []
+        out_of_order = 0
+        last_seq = {}
+        for ta in query_trading_actions(self.session):
+            if ta.client_ts_ms is not None and ta.server_ts_ms is not None:
+                deltas.append(ta.server_ts_ms - ta.client_ts_ms)
+            if ta.client_seq is not None:
+                last = last_seq.get(ta.player_id)
+                if last is not None and ta.client_seq <= last:
+                    out_of_order += 1
+                last_seq[ta.player_id] = ta.client_seq
+        result = dict(n=len(deltas), out_of_order=out_of_order)
+        if deltas:
+            arr = np.asarray(deltas, dtype=float)
+            result.update(mean=float(arr.mean()), max=float(arr.max()))
+            result.update({'p{}'.format(q): float(v) for q, v in zip(percentiles, np.percentile(arr, percentiles))})
+        return result
+
+    def compare_arms(self, metrics=('roi', 'sharpe', 'max_dd'), n_resamples=10000, seed=0, workers=None):
+        """
+        Bootstrap confidence intervals of the treatment - control difference of
+        round metrics over all RoundSummaries of this session (see analysis.py).
+        """
+        return analysis.compare_arms(
+            get_round_summary_rows(self.session, metrics), metrics=metrics,
+            n_resamples=n_resamples, seed=seed, workers=workers,
+        )
+
+    def rolling_metrics(self, window=None):
+        """
+        Rolling volatility, Sharpe, drawdown and turnover of every player-round
+        in this session, computed from the replayed daily equity curves.
+
+        :param window: window length in days (default: 'metrics_rolling_window_days')
+        :return: list of summarize_rolling results, keyed by (participant code, round number)
+        """
+        config = self.session.config
+        window = window or config.get('metrics_rolling_window_days', 20)
+        rounds = [
+            dict(key=res['key'], values=res['equity_curve'].tolist(), notional=res['notional_curve'].tolist())
+            for res in self.replay_trading_actions()
+        ]
+        return summarize_rolling_batch(
+            rounds,
+            window=window,
+            rf_annual=config.get('metrics_rf_annual', 0.0),
+            periods_per_year=config.get('metrics_periods_per_year', None),
+        )
+
 
 class Group(BaseGroup):
     pass
@@ -93,48 +226,52 @@ class Player(BasePlayer):
     # Optional: persist simple round-start value if you want it saved as a field
     portfolio_value_start = models.FloatField(initial=0)
 
+    # Write-behind bookkeeping: id of the last queued row stored in the DB
+    actions_cursor = models.StringField(initial='')
+
     # Helper to init/reset per-round logs safely
+    # (series and trade log are bounded in size, see round_series.py)
     def _ensure_round_logs(self, reset: bool = False):
         pvars = self.participant.vars
-        if reset or ('pv_series_round' not in pvars):
-            pvars['pv_series_round'] = []
-        if reset or ('trades_log_round' not in pvars):
-            pvars['trades_log_round'] = []
-        if reset or ('anchors_round' not in pvars):
-            pvars['anchors_round'] = []
+        for key, log in self._new_round_logs().items():
+            if reset or (key not in pvars):
+                pvars[key] = log
+
+    def _new_round_logs(self):
+        config = self.session.config
+        capacity = config.get('round_series_capacity', round_series.DEFAULT_CAPACITY)
+        return dict(
+            pv_series_round=round_series.new_series(
+                capacity,
+                config.get('round_series_buckets', round_series.DEFAULT_MAX_BUCKETS),
+                rf_per=round_series.rf_per_period(config.get('metrics_rf_annual', 0.0),
+                                                  config.get('metrics_periods_per_year', None)),
+            ),
+            trades_log_round=round_series.new_trades(capacity),
+            anchors_round=[],
+        )
+
+    def is_ephemeral(self):
+        """
+        Whether this round is only kept in memory (session config 'ephemeral_rounds':
+        'training' for the training round, 'all' for every round; never in the
+        group market mode, where the positions live on the players).
+        """
+        config = self.session.config
+        mode = config.get('ephemeral_rounds')
+        if not mode or config.get('group_market'):
+            return False
+        if mode == 'all':
+            return True
+        return mode == 'training' and bool(config['training_round']) and self.round_number == 1
 
     def _try_append_anchor_from_payload(self, payload: dict):
         """
         Try to capture a numeric anchor from common payload fields.
-        Looks for: 'anchor', 'news_anchor', or parses first number from 'news'.
         """
         pvars = self.participant.vars
         self._ensure_round_logs()  # ensure containers exist
-        anchor_val = None
-
-        # direct numeric fields
-        for key in ('anchor', 'news_anchor'):
-            if key in payload:
-                try:
-                    val = float(payload.get(key))
-                    if val > 0:
-                        anchor_val = val
-                        break
-                except Exception:
-                    pass
-
-        # parse from news text if not found yet
-        if anchor_val is None and 'news' in payload:
-            try:
-                text = payload.get('news', '')
-                if isinstance(text, str) and text:
-                    m = re.search(r'(-?\d+(?:\.\d+)?)', text.replace(',', ''))
-                    if m:
-                        val = float(m.group(1))
-                        if val > 0:
-                            anchor_val = val
-            except Exception:
-                pass
+        anchor_val = _anchor_from_payload(payload)
 
         if anchor_val is not None:
             try:
@@ -142,21 +279,139 @@ class Player(BasePlayer):
             except Exception:
                 pass
 
+    def _ephemeral_report(self, payload):
+        """
+        live_trading_report of an ephemeral round: the position and the round
+        logs are kept in the live state store (see live_state.py) instead of
+        the database. The trades are replayed as they arrive (see
+        replay.running_step), so the round's series is the daily equity curve
+        a persisted round gets from its TradingActions. Only 'End' writes,
+        once: the player's position, the bounded round logs in
+        participant.vars (for the ResultsPage metrics) and the payoff.
+        No TradingActions are stored.
+        :return: the round state after this message
+        """
+        action = payload['action']
+        anchor = _anchor_from_payload(payload)
+        round_number = self.round_number
+        fresh_logs = self._new_round_logs()
+        _, prices, _ = self.subsession.get_timeseries_values()
+        start_cash = self.subsession.get_config_multivalue('initial_cash')
+        start_shares = self.subsession.get_config_multivalue('initial_shares')
+
+        def apply(state):
+            if state.get('round') != round_number or action == 'Start':
+                state.clear()
+                state.update(round=round_number, start_value=None,
+                             replay=new_running(start_cash, start_shares), **fresh_logs)
+            value = float(payload['portfolio_value'])
+            if action == 'Start':
+                state['start_value'] = value
+            if anchor is not None:
+                state['anchors_round'].append(anchor)
+            if action in ('Buy', 'Sell'):
+                qty = float(payload.get('quantity', 0.0))
+                px = float(payload.get('price_per_share', 0.0))
+                if abs(qty) > 0 and px > 0:
+                    round_series.add_trade(state['trades_log_round'], qty, px, action,
+                                           payload.get('time', round_number))
+            closed = running_step(state['replay'], prices, payload)
+            if action == 'End':
+                closed += running_close(state['replay'], prices)
+            for day_value in closed:
+                round_series.append(state['pv_series_round'], day_value)
+            state['position'] = dict(
+                cash=float(payload['cash']),
+                shares=int(payload['owned_shares']),
+                share_value=float(payload['share_value']),
+                portfolio_value=value,
+                pandl=float(payload['pandl']),
+            )
+            return state
+
+        store = live_state.get_store()
+        key = live_state.state_key('ephemeral', self.session.code, self.participant.code)
+        state = store.update(key, apply)
+
+        if action == 'End':
+            for field, value in state['position'].items():
+                setattr(self, field, value)
+            if state['start_value'] is not None:
+                self.portfolio_value_start = state['start_value']
+            pvars = self.participant.vars
+            for log in ('pv_series_round', 'trades_log_round', 'anchors_round'):
+                pvars[log] = state[log]
+            self.set_payoff()
+            store.delete(key)
+        return state
+
+    @profiling.profiled
     def live_trading_report(self, payload):
         """
         Accepts the trading reports from the front end and
         stores them in the database; also logs per-round series for metrics.
         :param payload: trading report dict
+        :return: {id_in_group: {'nudge': ...}} if a nudge fires, else None
         """
+        server_ts_ms = int(time.time() * 1000)
+
+        # Per-player limiter (see rate_limit.py): over the limit, trades are
+        # stored without the optional work below and other messages are ignored
+        admission = rate_limit.admit(self, payload)
+        if admission == rate_limit.DROPPED:
+            return
+
+        # Shared live state (see live_state.py): position and report sequence,
+        # visible to every worker; a resent report is ignored
+        if not live_state.record_report(self, payload):
+            return
+
+        # Feed the in-memory session monitor (admin report), no DB access
+        monitor.record(self.session.code, self.participant.code, self.round_number, payload)
+
+        # Profiling window from the session config (see profiling.py)
+        config = self.session.config
+        if payload['action'] == 'Start' and config.get('profile_window_s') \
+                and self.round_number == config.get('profile_round', 1):
+            profiling.start_once(self.session.code, config['profile_window_s'])
+
+        # Ephemeral rounds (training, pilots) stay in memory until 'End'
+        if self.is_ephemeral():
+            state = self._ephemeral_report(payload)
+            if admission == rate_limit.THROTTLED:
+                return
+            nudge = self._evaluate_nudge(payload, state['anchors_round'])
+            if nudge:
+                return {self.id_in_group: dict(nudge=nudge)}
+            return
+
         # Ensure per-round logs exist
         self._ensure_round_logs()
 
-        # Copy primary state from payload (original behavior)
-        self.cash = float(payload['cash'])
-        self.shares = int(payload['owned_shares'])
-        self.share_value = float(payload['share_value'])
-        self.portfolio_value = float(payload['portfolio_value'])
-        self.pandl = float(payload['pandl'])
+        # Group market mode (see order_book.py): orders go through the book and
+        # the server keeps the positions, so they are not taken from the payload
+        market = self.session.config.get('group_market')
+        if market and payload['action'] in ('Order', 'Cancel'):
+            return self._market_message(payload, server_ts_ms)
+        if market and payload['action'] in ('Buy', 'Sell'):
+            return
+        if market:
+            if payload['action'] == 'Start':
+                order_book.drop_books(self.session.code, self.round_number - 1)
+                self.cash = float(self.subsession.get_config_multivalue('initial_cash'))
+                self.shares = int(self.subsession.get_config_multivalue('initial_shares'))
+            elif payload['action'] == 'End':
+                self._market_book().cancel_all(self.id_in_group)
+            self._mark_to_market(float(payload['price_per_share']))
+            payload = dict(payload, cash=self.cash, owned_shares=self.shares,
+                           share_value=self.share_value, portfolio_value=self.portfolio_value)
+        else:
+            # Copy primary state from payload (original behavior)
+            self.cash = float(payload['cash'])
+            self.shares = int(payload['owned_shares'])
+            self.share_value = float(payload['share_value'])
+            self.portfolio_value = float(payload['portfolio_value'])
+            self.pandl = float(payload['pandl'])
 
         # If this is the first message of the round (action 'Start'), reset logs and set starting PV
         if payload.get('action') == 'Start':
@@ -164,23 +419,23 @@ class Player(BasePlayer):
             # record round start portfolio value
             try:
                 self.portfolio_value_start = float(self.portfolio_value)
-                self.participant.vars['pv_series_round'].append(float(self.portfolio_value_start))
+                round_series.append(self.participant.vars['pv_series_round'], float(self.portfolio_value_start))
             except Exception:
                 pass
 
         # Append current portfolio value to the series on every message
         try:
             if self.portfolio_value is not None:
-                self.participant.vars['pv_series_round'].append(float(self.portfolio_value))
+                round_series.append(self.participant.vars['pv_series_round'], float(self.portfolio_value))
         except Exception:
             pass
 
         # Try to capture anchors if present (optional)
         self._try_append_anchor_from_payload(payload)
 
-        # Persist action to ExtraModel (original behavior)
-        TradingAction.create(
-            player=self,
+        # Persist action to ExtraModel (original behavior),
+        # or buffer it when write-behind is enabled for this session
+        row = dict(
             action=payload['action'],
             quantity=payload['quantity'],
             time=payload['time'],
@@ -191,8 +446,17 @@ class Player(BasePlayer):
             portfolio_value=payload['portfolio_value'],
             cur_day=payload['cur_day'],
             asset=payload['asset'],
-            roi=payload['roi_percent']
+            roi=payload['roi_percent'],
+            client_ts_ms=_int_or_none(payload.get('client_ts_ms')),
+            client_seq=_int_or_none(payload.get('client_seq')),
+            server_ts_ms=server_ts_ms,
+            clicks=_int_or_none(payload.get('clicks')) or 1,
+            ready_ms=_int_or_none(payload.get('ready_ms')),
         )
+        if self.session.config.get('trading_action_write_behind'):
+            self._queue_trading_action(row)
+        else:
+            self._create_trading_action(row)
 
         # If an actual trade occurred, append minimal trade log (qty/price/side)
         try:
@@ -201,19 +465,235 @@ class Player(BasePlayer):
                 qty = float(payload.get('quantity', 0.0))
                 px = float(payload.get('price_per_share', 0.0))
                 if abs(qty) > 0 and px > 0:
-                    self.participant.vars['trades_log_round'].append({
-                        'qty': qty,
-                        'price': px,
-                        'side': side,
-                        'ts': payload.get('time', self.round_number),
-                    })
+                    round_series.add_trade(self.participant.vars['trades_log_round'],
+                                           qty, px, side, payload.get('time', self.round_number))
         except Exception:
             pass
 
         # End of round -> set payoff (original behavior)
         if payload['action'] == 'End':
+            if self.session.config.get('trading_action_write_behind'):
+                self.flush_trading_actions()
             self.set_payoff()
 
+        if admission == rate_limit.THROTTLED:
+            return
+
+        # Optional participant.vars footprint instrumentation (see vars_budget.py)
+        vars_budget.check(self, 'live:' + payload['action'], live=True)
+
+        # In-process nudges (treatment arm only), sent back over the live channel
+        nudge = self._evaluate_nudge(payload)
+        if nudge:
+            return {self.id_in_group: dict(nudge=nudge)}
+
+    def _market_book(self):
+        return order_book.get_book(self.session.code, self.group.id_in_subsession, self.round_number)
+
+    def _mark_to_market(self, price):
+        self.share_value = self.shares * price
+        self.portfolio_value = self.cash + self.share_value
+        self.pandl = self.portfolio_value - float(self.subsession.get_config_multivalue('initial_cash'))
+
+    def _market_message(self, payload, server_ts_ms):
+        """
+        Group market mode: an 'Order' (side, quantity, limit_price) or a
+        'Cancel' (order_id) for the group's book. Both players of a fill are
+        updated and get a Buy or Sell TradingAction at the fill price.
+        The result and the top of the book are sent to the whole group.
+        """
+        book = self._market_book()
+        with book.lock:
+            try:
+                if payload['action'] == 'Cancel':
+                    order = book.cancel(int(payload['order_id']), self.id_in_group)
+                    if order is None:
+                        raise ValueError('unknown order')
+                    fills = []
+                else:
+                    order, fills = book.submit(self.id_in_group, payload.get('side'),
+                                               float(payload['limit_price']), int(payload['quantity']),
+                                               cash=self.cash, shares=self.shares)
+            except (KeyError, TypeError, ValueError) as e:
+                return {self.id_in_group: dict(market=dict(error=str(e)))}
+
+            # fills are booked at the aggressor's day; the price of that day
+            # values the shares of both sides
+            _, prices, _ = self.subsession.get_timeseries_values()
+            cur_day = min(max(_int_or_none(payload.get('cur_day')) or 0, 0), len(prices) - 1)
+            for fill in fills:
+                for player, quantity in ((self.group.get_player_by_id(fill.buyer), fill.quantity),
+                                         (self.group.get_player_by_id(fill.seller), -fill.quantity)):
+                    player._apply_fill(fill, quantity, float(prices[cur_day]), cur_day, payload,
+                                       server_ts_ms, aggressor=player.id_in_group == fill.aggressor)
+            book_top = book.top()
+
+        return {0: dict(market=dict(
+            order=order.as_dict(),
+            cancelled=payload['action'] == 'Cancel',
+            fills=[fill.as_dict() for fill in fills],
+            book=book_top,
+        ))}
+
+    def _apply_fill(self, fill, quantity, day_price, cur_day, payload, server_ts_ms, aggressor):
+        """
+        Book one side of a fill (quantity > 0 buys) and store it like a trade report.
+        """
+        self._ensure_round_logs()
+        self.cash -= quantity * fill.price
+        self.shares += quantity
+        self._mark_to_market(day_price)
+        start_value = self.portfolio_value_start or 0
+        row = dict(
+            action='Buy' if quantity > 0 else 'Sell',
+            quantity=quantity,
+            time=payload.get('time', ''),
+            price_per_share=fill.price,
+            cash=self.cash,
+            owned_shares=self.shares,
+            share_value=self.share_value,
+            portfolio_value=self.portfolio_value,
+            cur_day=cur_day,
+            asset=payload.get('asset', ''),
+            roi=(self.portfolio_value / start_value - 1) * 100 if start_value else 0.0,
+            client_ts_ms=_int_or_none(payload.get('client_ts_ms')) if aggressor else None,
+            client_seq=_int_or_none(payload.get('client_seq')) if aggressor else None,
+            server_ts_ms=server_ts_ms,
+            clicks=1,
+        )
+        if self.session.config.get('trading_action_write_behind'):
+            self._queue_trading_action(row)
+        else:
+            self._create_trading_action(row)
+        round_series.append(self.participant.vars['pv_series_round'], float(self.portfolio_value))
+        round_series.add_trade(self.participant.vars['trades_log_round'],
+                               float(quantity), float(fill.price), row['action'], row['time'] or self.round_number)
+
+    def _evaluate_nudge(self, payload, anchors=None):
+        """
+        Run the nudge rules (see nudges.py) on this message. Returns the nudge
+        dict or None if nudges are off, the participant is in the control arm,
+        or the rate limits hold it back.
+        """
+        config = self.session.config
+        pvars = self.participant.vars
+        if not config.get('live_nudges'):
+            return None
+        if not nudges.in_treatment(pvars.get('cond', ''), pvars.get('arm')):
+            return None
+        return nudges.engine.process(
+            self.session.code,
+            self.participant.code,
+            self.round_number,
+            payload,
+            pvars.get('anchors_round', []) if anchors is None else anchors,
+            nudges.get_rules(config),
+            cooldown_s=config.get('nudge_cooldown_s', 30),
+            max_per_round=config.get('nudge_max_per_round', 5),
+        )
+
+    def _queue_trading_action(self, row):
+        # the queued row is a complete TradingAction mapping for the bulk insert
+        get_action_queue().append(queue_key(self), dict(
+            row, player_id=self.id, session_id=self.session.id, round_number=self.round_number))
+        if background_writes():
+            start_flusher(flush_queued_trading_actions)
+
+    def flush_trading_actions(self):
+        """
+        Bulk-insert the TradingAction rows of this player-round that are still
+        in the write-behind queue (see write_behind.py), in the request's
+        transaction. The Player row is locked and its cursor re-read first,
+        as the background flusher may have stored rows since it was loaded.
+        :return: number of inserted rows
+        """
+        dbs = object_session(self)
+        dbs.refresh(self, ['actions_cursor'], with_for_update=True)
+        rows, cursor = flush_rows(get_action_queue(), queue_key(self), self.actions_cursor)
+        if cursor is None:
+            return 0
+        dbs.bulk_insert_mappings(TradingAction, rows)
+        self.actions_cursor = cursor
+        return len(rows)
+
+    def finish_trading_actions(self):
+        """
+        Remove the write-behind queue of this player-round once its last flush
+        (TradingPage) is committed: acknowledge the rows up to the stored
+        cursor and let the queue drop the key (see write_behind.py).
+        """
+        queue, key = get_action_queue(), queue_key(self)
+        if self.actions_cursor:
+            queue.ack(key, self.actions_cursor)
+        queue.finish(key)
+
+    def _create_trading_action(self, row):
+        # session and round are denormalized onto the row for indexed queries
+        return TradingAction.create(player=self, session=self.session, round_number=self.round_number, **row)
+
+    def get_replay_input(self, trading_actions=None):
+        """
+        Scenario prices, start holdings and logged TradingActions of this
+        player-round in the form replay_batch expects. Pass the player's
+        TradingActions if they were already loaded (e.g. for a whole round).
+        An ephemeral round has none (it is replayed while it is played, see
+        _ephemeral_report).
+        """
+        _, prices, _ = self.subsession.get_timeseries_values()
+        if trading_actions is None:
+            trading_actions = TradingAction.filter(player=self)
+        # group market trades settle at the price of the matched order
+        market = self.session.config.get('group_market')
+        actions = [
+            dict(action=ta.action, quantity=ta.quantity, cur_day=ta.cur_day,
+                 fill_price=ta.price_per_share if market and ta.action in ('Buy', 'Sell') else None,
+                 price_per_share=ta.price_per_share, cash=ta.cash,
+                 owned_shares=ta.owned_shares, portfolio_value=ta.portfolio_value)
+            for ta in trading_actions
+        ]
+        return dict(
+            key=(self.participant.code, self.round_number),
+            prices=prices,
+            actions=actions,
+            start_cash=self.subsession.get_config_multivalue('initial_cash'),
+            start_shares=self.subsession.get_config_multivalue('initial_shares'),
+        )
+
+    def get_equity_curve(self):
+        """
+        Portfolio value at the close of every day of this round, rebuilt from
+        the scenario prices and the logged trades in one vectorized replay
+        (see replay.py). Empty if nothing was logged for the round.
+        """
+        rnd = self.get_replay_input()
+        if not rnd['actions'] or not rnd['prices']:
+            return []
+        res = replay_round(rnd['prices'], rnd['actions'], rnd['start_cash'], rnd['start_shares'])
+        return res['equity_curve'].tolist()
+
+    def get_rolling_metrics(self, window=None):
+        """
+        Rolling volatility, Sharpe, drawdown and turnover of this player-round
+        (see utils_metrics.summarize_rolling).
+        """
+        config = self.session.config
+        rnd = self.get_replay_input()
+        res = replay_round(rnd['prices'], rnd['actions'], rnd['start_cash'], rnd['start_shares'])
+        return summarize_rolling(
+            values=res['equity_curve'].tolist(),
+            notional=res['notional_curve'].tolist(),
+            window=window or config.get('metrics_rolling_window_days', 20),
+            rf_annual=config.get('metrics_rf_annual', 0.0),
+            periods_per_year=config.get('metrics_periods_per_year', None),
+        )
+
+    def get_round_summary(self):
+        """
+        The RoundSummary of this player-round, or None before ResultsPage was submitted.
+        """
+        summaries = RoundSummary.filter(player=self)
+        return summaries[0] if summaries else None
+
     def set_payoff(self):
         """
         Set the player's payoff for the current round to the total portfolio value.
@@ -232,11 +712,85 @@ class Player(BasePlayer):
             self.participant.payoff -= self.payoff
 
 
+def _anchor_from_payload(payload: dict):
+    """
+    Numeric anchor of a live message, if any.
+    Looks for: 'anchor', 'news_anchor', or parses first number from 'news'.
+    """
+    anchor_val = None
+
+    # direct numeric fields
+    for key in ('anchor', 'news_anchor'):
+        if key in payload:
+            try:
+                val = float(payload.get(key))
+                if val > 0:
+                    anchor_val = val
+                    break
+            except Exception:
+                pass
+
+    # parse from news text if not found yet
+    if anchor_val is None and 'news' in payload:
+        try:
+            text = payload.get('news', '')
+            if isinstance(text, str) and text:
+                m = re.search(r'(-?\d+(?:\.\d+)?)', text.replace(',', ''))
+                if m:
+                    val = float(m.group(1))
+                    if val > 0:
+                        anchor_val = val
+        except Exception:
+            pass
+    return anchor_val
+
+
+def _rounded(value, digits):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return round(value, digits) if math.isfinite(value) else 0.0
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def index_link_columns(model, *indexes):
+    """
+    Indexes given as (name, column, ...) that include models.Link columns
+    ('player_id', 'session_id', ...). oTree adds those columns only when the
+    mappers are configured, so the indexes cannot go in __table_args__; they
+    are added to the table after configure_mappers, before the tables are
+    created.
+    """
+    def add_indexes():
+        table = model.__table__
+        existing = {ix.name for ix in table.indexes}
+        for name, *columns in indexes:
+            if name not in existing:
+                Index(name, *(table.c[col] for col in columns))
+    event.listen(Mapper, 'after_configured', add_indexes)
+
+
 class TradingAction(ExtraModel):
     """
     Extra database model storing all transactions. Each transaction is
-    linked to the player who executed it.
+    linked to the player who executed it; session and round_number are
+    copied from the player so the common queries (see query_trading_actions)
+    need no joins.
+    'time' is the browser's local time as text; client_ts_ms (browser clock),
+    server_ts_ms (receipt by live_trading_report) and client_seq (per-round
+    report counter of the browser) are exact and sortable.
     """
+    __table_args__ = (
+        Index('zts_tradingaction_server_ts', 'server_ts_ms'),
+    )
+
     ACTIONS = [
         ('Buy', 'Buy'),
         ('Sell', 'Sell'),
@@ -245,6 +799,8 @@ class TradingAction(ExtraModel):
     ]
 
     player = models.Link(Player)
+    session = models.Link(Session)
+    round_number = models.IntegerField()
     action = models.CharField(choices=ACTIONS, max_length=10)
     quantity = models.FloatField(initial=0.0)
     time = models.StringField()
@@ -256,6 +812,183 @@ class TradingAction(ExtraModel):
     cur_day = models.IntegerField()
     asset = models.CharField(blank=True, max_length=100)
     roi = models.FloatField()
+    # epoch milliseconds; BigInteger because they do not fit a 32-bit INTEGER
+    client_ts_ms = Column(BigInteger, nullable=True)
+    server_ts_ms = Column(BigInteger, nullable=True)
+    client_seq = models.IntegerField(blank=True)
+    # number of button clicks the browser merged into this order
+    clicks = models.IntegerField(initial=1)
+    # Start only: ms from the page request until the round started in the browser
+    ready_ms = models.IntegerField(blank=True)
+
+
+index_link_columns(
+    TradingAction,
+    ('zts_tradingaction_player_round_day', 'player_id', 'round_number', 'cur_day'),
+    ('zts_tradingaction_session_round', 'session_id', 'round_number'),
+    ('zts_tradingaction_session_action', 'session_id', 'action'),
+)
+
+
+class RoundSummary(ExtraModel):
+    """
+    Materialized per player-round metrics (see utils_metrics.summarize_round),
+    written once when the player leaves the ResultsPage. Linked to session and
+    participant so admin pages, exports and cross-round profiles can query it
+    directly instead of re-aggregating TradingActions.
+    """
+    player = models.Link(Player)
+    session = models.Link(Session)
+    participant = models.Link(Participant)
+    round_number = models.IntegerField()
+    arm = models.StringField(blank=True)
+    is_training_round = models.BooleanField(initial=False)
+    start_value = models.FloatField()
+    end_value = models.FloatField()
+    roi = models.FloatField()
+    max_dd = models.FloatField()
+    trade_count = models.IntegerField()
+    turnover = models.FloatField()
+    anchor_bp = models.FloatField()
+    sharpe = models.FloatField()
+    sortino = models.FloatField()
+    # relative to the scenario (see utils_metrics.benchmark_relative)
+    excess_return = models.FloatField(initial=0.0)
+    oracle_capture = models.FloatField(initial=0.0)
+
+    def features(self):
+        """
+        Round features under the names used in the Qualtrics query string,
+        rounded as they always were in that URL (non-finite values as 0.0).
+        """
+        return dict(
+            roi=_rounded(self.roi, 6),
+            max_dd=_rounded(self.max_dd, 6),
+            trades=int(self.trade_count or 0),
+            turnover=_rounded(self.turnover, 6),
+            anchor_bp=_rounded(self.anchor_bp, 2),
+            sharpe=_rounded(self.sharpe, 6),
+            sortino=_rounded(self.sortino, 6),
+        )
+
+
+index_link_columns(
+    RoundSummary,
+    ('zts_roundsummary_session_round', 'session_id', 'round_number'),
+    ('zts_roundsummary_participant_round', 'participant_id', 'round_number'),
+)
+
+
+def save_round_summary(player, summary, start_value, end_value):
+    """
+    Store the output of summarize_round for a player-round.
+    Returns the existing row if the round was already summarized.
+    """
+    existing = player.get_round_summary()
+    if existing:
+        return existing
+    return RoundSummary.create(
+        player=player,
+        session=player.session,
+        participant=player.participant,
+        round_number=player.round_number,
+        arm=nudges.arm_of(player.participant.vars.get('cond'), player.participant.vars.get('arm')),
+        is_training_round=bool(player.session.config['training_round'] and player.round_number == 1),
+        start_value=float(start_value or 0.0),
+        end_value=float(end_value or 0.0),
+        roi=summary['roi'],
+        max_dd=summary['max_dd'],
+        trade_count=summary['trade_count'],
+        turnover=summary['turnover'],
+        anchor_bp=summary['anchor_bp'],
+        sharpe=summary['sharpe'],
+        sortino=summary['sortino'],
+        excess_return=summary.get('excess_return', 0.0),
+        oracle_capture=summary.get('oracle_capture', 0.0),
+    )
+
+
+def get_round_summaries(session, round_number=None):
+    """
+    All round summaries of a session (optionally of one round),
+    ordered by creation. Uses the (session, round) index.
+    """
+    if round_number is None:
+        return RoundSummary.filter(session=session)
+    return RoundSummary.filter(session=session, round_number=round_number)
+
+
+def get_round_summary_rows(session, metrics):
+    """
+    Round summaries of a session as dicts with the participant code, read in
+    one query joined with the participants (for analysis.participant_means).
+    """
+    query = (
+        db.query(RoundSummary, Participant.code)
+        .join(Participant, RoundSummary.participant_id == Participant.id)
+        .filter(RoundSummary.session_id == session.id)
+    )
+    return [
+        dict(arm=rs.arm, participant=code, is_training_round=rs.is_training_round,
+             **{metric: getattr(rs, metric) for metric in metrics})
+        for rs, code in query
+    ]
+
+
+def get_participant_profile(participant):
+    """
+    Round summaries of one participant ordered by round, e.g. for learning curves.
+    """
+    return sorted(RoundSummary.filter(participant=participant), key=lambda rs: rs.round_number)
+
+
+def query_trading_actions(session, round_number=None, actions=None, since_ms=None, until_ms=None, dbs=None):
+    """
+    TradingActions of a session ordered by id, optionally restricted to a round,
+    to some actions (e.g. ('Buy', 'Sell')) and to a server time range in epoch
+    ms [since_ms, until_ms). Returns a SQLAlchemy query; 'dbs' is the DB
+    session to use (default: the request's).
+    Rows stored before the session/round columns existed are not found.
+    """
+    query = (dbs or db).query(TradingAction).filter(TradingAction.session_id == session.id)
+    if round_number is not None:
+        query = query.filter(TradingAction.round_number == round_number)
+    if actions:
+        query = query.filter(TradingAction.action.in_(list(actions)))
+    if since_ms is not None:
+        query = query.filter(TradingAction.server_ts_ms >= since_ms)
+    if until_ms is not None:
+        query = query.filter(TradingAction.server_ts_ms < until_ms)
+    return query.order_by(TradingAction.id)
+
+
+def get_trades(session, round_number=None):
+    """
+    All Buy/Sell actions of a session (optionally of one round).
+    """
+    return query_trading_actions(session, round_number, actions=('Buy', 'Sell')).all()
+
+
+def get_actions_by_player(session, round_number):
+    """
+    TradingActions of one round in a single query: {player id: [actions in order]}.
+    """
+    by_player = {}
+    for ta in query_trading_actions(session, round_number):
+        by_player.setdefault(ta.player_id, []).append(ta)
+    return by_player
+
+
+def get_last_actions(session, round_number):
+    """
+    The latest TradingAction of every player in a round: {player id: action}.
+    """
+    last_ids = (
+        db.query(func.max(TradingAction.id))
+        .filter(TradingAction.session_id == session.id, TradingAction.round_number == round_number)
+        .group_by(TradingAction.player_id)
+    )
+    return {ta.player_id: ta for ta in db.query(TradingAction).filter(TradingAction.id.in_(last_ids))}
 
 
 class TimeSeriesFile(ExtraModel):
@@ -264,17 +997,211 @@ class TimeSeriesFile(ExtraModel):
     news = models.StringField()
 
 
+# how long the modification time of a timeseries file is trusted before it is checked again
+TIMESERIES_STAT_TTL_S = 5.0
+_timeseries_mtimes = {}
+
+
+def timeseries_mtime(path):
+    """
+    Modification time of a timeseries file, read from the disk at most every
+    TIMESERIES_STAT_TTL_S seconds per file, so the cache key of
+    read_timeseries_file costs no stat per call. An edited file is parsed
+    again at most that long after the change.
+    """
+    now = time.monotonic()
+    checked = _timeseries_mtimes.get(path)
+    if checked is None or now - checked[0] > TIMESERIES_STAT_TTL_S:
+        checked = _timeseries_mtimes[path] = (now, os.path.getmtime(path))
+    return checked[1]
+
+
+@lru_cache(maxsize=64)
+def read_timeseries_file(path, mtime):
+    """
+    Parse a timeseries CSV once per (path, modification time).
+    The returned lists are shared between callers; do not modify them.
+    """
+    rows = read_csv(path, TimeSeriesFile)
+    prices = [dic['price'] for dic in rows]
+    if 'news' in rows[0].keys():
+        news = [dic['news'] if dic['news'] else '' for dic in rows]
+    else:
+        news = [''] * len(prices)
+    return prices, news
+
+
+@lru_cache(maxsize=64)
+def read_timeseries_reference(path, mtime):
+    """
+    reference_stats of a timeseries file, once per (path, modification time).
+    """
+    prices, _ = read_timeseries_file(path, mtime)
+    return reference_stats(prices)
+
+
+EXPORT_HEADER = ['session', 'round_nr', 'participant', 'action', 'quantity', 'price_per_share', 'cash',
+                 'owned_shares', 'share_value', 'portfolio_value', 'cur_day', 'asset', 'roi',
+                 'client_ts_ms', 'server_ts_ms', 'client_seq', 'clicks', 'ready_ms']
+# column types of EXPORT_HEADER, to read an export file back with the types of the DB rows
+EXPORT_TYPES = [str, int, str, str, float, float, float, float, float, float, int, str, float,
+                int, int, int, int, int]
+
+
 def custom_export(players):
     """
-    Custom export with detailed trading actions.
-    NOTE: exports actions from the whole DB; add filtering if you need per-session only.
+    Custom export with the detailed trading actions of the given players.
+    A session whose export of its complete data has finished (see
+    start_trading_action_export) is streamed from that file, with the column
+    types of the DB rows; the others are queried player by player.
     """
     # header row
-    yield ['session', 'round_nr', 'participant', 'action', 'quantity', 'price_per_share', 'cash',
-           'owned_shares', 'share_value', 'portfolio_value', 'cur_day', 'asset', 'roi']
+    yield EXPORT_HEADER
     # data content
+    exported = {}   # session code -> rows come from the export file
     for p in players:
+        code = p.session.code
+        if code not in exported:
+            path = exports.finished_artifact(trading_action_export_name(code))
+            exported[code] = path is not None
+            if path is not None:
+                yield from exports.read_rows(path, EXPORT_TYPES)
+        if exported[code]:
+            continue
         for ta in TradingAction.filter(player=p):
-            yield [p.session.code, p.subsession.round_number, p.participant.code, ta.action, ta.quantity,
+            yield [code, p.subsession.round_number, p.participant.code, ta.action, ta.quantity,
                    ta.price_per_share, ta.cash, ta.owned_shares, ta.share_value, ta.portfolio_value,
-                   ta.cur_day, ta.asset, ta.roi]
+                   ta.cur_day, ta.asset, ta.roi, ta.client_ts_ms, ta.server_ts_ms, ta.client_seq, ta.clicks,
+                   ta.ready_ms]
+
+
+@lru_cache(maxsize=1)
+def background_engine():
+    """
+    Engine for DB work in background threads. oTree runs all requests on one
+    connection (a StaticPool) under a global lock, so a thread must not use
+    `engine`: closing its session would roll back the request's transaction.
+    None for the in-memory DB of devserver and bots, which no other connection sees.
+    """
+    if IN_MEMORY:
+        return None
+    return create_engine(engine.url)
+
+
+def background_writes() -> bool:
+    """
+    Whether background threads may write: not with SQLite, which allows one
+    writer at a time while oTree's connection keeps its transaction open.
+    """
+    bg_engine = background_engine()
+    return bg_engine is not None and bg_engine.dialect.name != 'sqlite'
+
+
+def flush_queued_trading_actions(key: str) -> int:
+    """
+    Background flusher (see write_behind.py): bulk-insert the queued rows of
+    one player-round and advance the Player's cursor in one transaction on
+    background_engine(). The Player row is locked while reading the cursor.
+    """
+    queue = get_action_queue()
+    if not queue.has_rows(key):
+        return 0
+    player_id = player_id_of(key)
+    players = Player.__table__
+    with background_engine().begin() as conn:
+        player = conn.execute(
+            select([players.c.actions_cursor]).where(players.c.id == player_id).with_for_update()
+        ).first()
+        if player is None:
+            return 0
+        rows, new_cursor = flush_rows(queue, key, player.actions_cursor or '')
+        if new_cursor is None:
+            return 0
+        conn.execute(TradingAction.__table__.insert(), rows)
+        conn.execute(players.update().where(players.c.id == player_id).values(actions_cursor=new_cursor))
+    queue.ack(key, new_cursor)
+    return len(rows)
+
+
+def _trading_action_rows(dbs, session_id, session_code, round_number):
+    query = (
+        dbs.query(TradingAction, Participant.code)
+        .join(Player, TradingAction.player_id == Player.id)
+        .join(Participant, Player.participant_id == Participant.id)
+        .filter(TradingAction.session_id == session_id, TradingAction.round_number == round_number)
+        .order_by(TradingAction.id)
+        .yield_per(exports.CHUNK_ROWS)
+    )
+    for ta, participant_code in query:
+        yield [session_code, round_number, participant_code, ta.action, ta.quantity,
+               ta.price_per_share, ta.cash, ta.owned_shares, ta.share_value, ta.portfolio_value,
+               ta.cur_day, ta.asset, ta.roi, ta.client_ts_ms, ta.server_ts_ms, ta.client_seq, ta.clicks,
+               ta.ready_ms]
+
+
+def _export_round_rows(task):
+    """
+    TradingAction rows of one (session, round), read in chunks through a DB
+    session of its own on background_engine().
+    """
+    dbs = DBSession(bind=background_engine())
+    try:
+        yield from _trading_action_rows(dbs, *task)
+    finally:
+        dbs.close()
+
+
+def live_status(session_code):
+    """
+    Counters of the ZTS admin report that change while a session runs. All
+    of them are kept in memory (monitor.py, rate_limit.py, exports.py,
+    profiling.py); no database access.
+    """
+    return dict(
+        monitor=monitor.snapshot(session_code),
+        live_limits=rate_limit.stats(session_code),
+        export_status=trading_action_export_status(session_code),
+        profile_status=profiling.status(session_code),
+    )
+
+
+def trading_action_export_name(session_code, complete=True):
+    """
+    Export artifact of a session: the export of the complete session, which
+    custom_export streams, or a snapshot of a session that is still running.
+    """
+    return 'trading_actions_{}{}'.format(session_code, '' if complete else '_partial')
+
+
+def trading_action_export_status(session_code):
+    """
+    exports.status() of the session's export, or of its snapshot if there is
+    no export of the complete session ('partial': True).
+    """
+    status = exports.status(trading_action_export_name(session_code))
+    if status['status'] == 'none':
+        status = dict(exports.status(trading_action_export_name(session_code, complete=False)), partial=True)
+    return status
+
+
+def start_trading_action_export(subsession):
+    """
+    Export the TradingActions of a session as a background job (see exports.py),
+    one task per round. Started by ResultsPage when the last player finishes the
+    session (config 'trading_action_export_on_complete'), or on demand from the
+    admin report (admin_views.py). The export of a complete session is cached,
+    and custom_export (the "Data" tab) streams it instead of querying; a session
+    that is still running gets a snapshot, which is only downloaded.
+    """
+    session = subsession.session
+    complete = subsession.session_complete()
+    tasks = [(session.id, session.code, r) for r in range(1, session.num_rounds + 1)]
+    write_task = _export_round_rows
+    if background_engine() is None:
+        # in-memory DB: read the rows here, only write the file in the background
+        tasks = [list(_trading_action_rows(db, *task)) for task in tasks]
+        write_task = iter
+    return exports.start(
+        trading_action_export_name(session.code, complete),
+        EXPORT_HEADER, tasks, write_task, cacheable=complete,
+    )
@@ -0,0 +1,157 @@
+# ZTS/monitor.py
+# ---------------------------------
+# In-memory live session monitor.
+# live_trading_report feeds every message into record(); the ZTS admin report
+# shows snapshot() and refreshes it by loading itself again. Nothing here
+# touches the database, so watching a running session costs no extra queries.
+# The counters are per server process and are lost on restart.
+
+from collections import deque
+from typing import Dict, Optional
+import math
+import threading
+import time
+
+
+# window for the messages/sec and trades/sec rates
+RATE_WINDOW_S = 10.0
+# a trader counts as active if a message arrived within this many seconds
+ACTIVE_WINDOW_S = 30.0
+# how many players the outlier table lists
+N_OUTLIERS = 10
+
+
+class _PlayerState:
+    __slots__ = ('round_number', 'cur_day', 'last_action', 'last_seen',
+                 'messages', 'trades', 'peak_value', 'value', 'drawdown')
+
+    def __init__(self):
+        self.round_number = 0
+        self.cur_day = 0
+        self.last_action = ''
+        self.last_seen = 0.0
+        self.messages = 0
+        self.trades = 0
+        self.peak_value = 0.0
+        self.value = 0.0
+        self.drawdown = 0.0
+
+
+class SessionMonitor:
+    """
+    Counters for one session. Rates use deques of recent timestamps,
+    trimmed on every update, so memory is bounded by the rate window.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.players = {}
+        self.message_times = deque()
+        self.trade_times = deque()
+        self.started = {}     # round_number -> participants that sent 'Start'
+        self.completed = {}   # round_number -> participants that sent 'End'
+        self.total_messages = 0
+        self.total_trades = 0
+
+    def _trim(self, now):
+        cutoff = now - RATE_WINDOW_S
+        for times in (self.message_times, self.trade_times):
+            while times and times[0] < cutoff:
+                times.popleft()
+
+    def record(self, participant_code: str, round_number: int, payload: Dict, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        action = payload.get('action', '')
+        with self.lock:
+            state = self.players.get(participant_code)
+            if state is None:
+                state = self.players[participant_code] = _PlayerState()
+            if round_number != state.round_number or action == 'Start':
+                state.round_number = round_number
+                state.peak_value = 0.0
+                state.drawdown = 0.0
+            try:
+                state.cur_day = int(payload.get('cur_day', state.cur_day))
+                state.value = float(payload.get('portfolio_value', state.value))
+            except (TypeError, ValueError):
+                pass
+            if state.value > state.peak_value:
+                state.peak_value = state.value
+            if state.peak_value > 0:
+                state.drawdown = min(state.drawdown, (state.value - state.peak_value) / state.peak_value)
+            state.last_action = action
+            state.last_seen = now
+            state.messages += 1
+            self.total_messages += 1
+            self.message_times.append(now)
+            if action in ('Buy', 'Sell'):
+                state.trades += 1
+                self.total_trades += 1
+                self.trade_times.append(now)
+            elif action == 'Start':
+                self.started.setdefault(round_number, set()).add(participant_code)
+            elif action == 'End':
+                self.completed.setdefault(round_number, set()).add(participant_code)
+            self._trim(now)
+
+    def snapshot(self, now: Optional[float] = None) -> Dict:
+        now = time.time() if now is None else now
+        with self.lock:
+            self._trim(now)
+            window = min(RATE_WINDOW_S, max(now - (self.message_times[0] if self.message_times else now), 1.0))
+            players = [
+                dict(participant=code, round=st.round_number, cur_day=st.cur_day,
+                     last_action=st.last_action, seconds_idle=round(now - st.last_seen, 1),
+                     messages=st.messages, trades=st.trades, drawdown=round(st.drawdown, 6))
+                for code, st in self.players.items()
+            ]
+            rounds = sorted(set(self.started) | set(self.completed))
+            completion = [
+                dict(round=r, started=len(self.started.get(r, ())), completed=len(self.completed.get(r, ())))
+                for r in rounds
+            ]
+            msg_rate = len(self.message_times) / window
+            trade_rate = len(self.trade_times) / window
+            total_messages, total_trades = self.total_messages, self.total_trades
+
+        active = [p for p in players if p['seconds_idle'] <= ACTIVE_WINDOW_S]
+        drawdowns = [p['drawdown'] for p in players]
+        mean_dd = sum(drawdowns) / len(drawdowns) if drawdowns else 0.0
+        std_dd = math.sqrt(sum((d - mean_dd) ** 2 for d in drawdowns) / len(drawdowns)) if drawdowns else 0.0
+        outliers = [p for p in sorted(players, key=lambda p: p['drawdown']) if p['drawdown'] < 0][:N_OUTLIERS]
+        for p in outliers:
+            p['z'] = round((p['drawdown'] - mean_dd) / std_dd, 2) if std_dd > 0 else 0.0
+
+        return dict(
+            time=now,
+            active_traders=len(active),
+            known_traders=len(players),
+            messages_per_sec=round(msg_rate, 2),
+            trades_per_sec=round(trade_rate, 2),
+            total_messages=total_messages,
+            total_trades=total_trades,
+            round_completion=completion,
+            players=sorted(active, key=lambda p: p['participant']),
+            drawdown_outliers=outliers,
+        )
+
+
+_monitors = {}
+_monitors_lock = threading.Lock()
+
+
+def get_monitor(session_code: str) -> SessionMonitor:
+    monitor = _monitors.get(session_code)
+    if monitor is None:
+        with _monitors_lock:
+            monitor = _monitors.setdefault(session_code, SessionMonitor())
+    return monitor
+
+
+def record(session_code: str, participant_code: str, round_number: int, payload: Dict):
+    get_monitor(session_code).record(participant_code, round_number, payload)
+
+
+def snapshot(session_code: str) -> Dict:
+    return get_monitor(session_code).snapshot()
+
@@ -0,0 +1,293 @@
+# ZTS/nudges.py
+# ---------------------------------
+# In-process, rule-based nudge engine.
+# live_trading_report feeds every message into NudgeEngine.process(); the
+# engine keeps a few round features up to date incrementally (drawdown,
+# turnover, anchor deviation, trade count) and, if a rule fires, returns the
+# nudge that is sent back over the live channel. This replaces the HTTP call
+# nudge-gate.js used to make to an external /nudges service on every event.
+#
+# Rules come from the 'nudge_rules' session config (JSON list) or DEFAULT_RULES:
+#   {"id": "drawdown_10", "event": "drawdown", "feature": "drawdown",
+#    "op": "<=", "threshold": -0.10, "min_trades": 0,
+#    "text": "...", "bias_tag": "Loss aversion", "cooldown_s": 120}
+# Events: 'orderFilled' (Buy/Sell), 'drawdown' and 'any' (every message).
+# Rate limits: a per-player cooldown between any two nudges
+# ('nudge_cooldown_s'), a per-rule cooldown and a cap per round
+# ('nudge_max_per_round').
+# The per-player state lives in the live state store (see live_state.py), so
+# with Redis configured any server worker can evaluate any participant.
+
+from typing import Dict, List, Optional
+import json
+import operator
+import time
+
+from .live_state import LocalLiveStore, get_store, state_key
+
+
+DEFAULT_RULES = [
+    dict(
+        id='drawdown_10', event='drawdown', feature='drawdown', op='<=', threshold=-0.10,
+        text='Your portfolio is more than 10% below its peak this round. '
+             'Take a moment before reacting to recent losses.',
+        bias_tag='Loss aversion', cooldown_s=120,
+    ),
+    dict(
+        id='turnover_high', event='orderFilled', feature='turnover', op='>=', threshold=2.0,
+        text='You have traded more than twice your portfolio value this round. '
+             'Frequent trading rarely pays off.',
+        bias_tag='Overtrading', cooldown_s=120,
+    ),
+    dict(
+        id='anchor_close', event='orderFilled', feature='anchor_bp', op='<=', threshold=50.0, min_trades=3,
+        text='Your trades cluster around the numbers mentioned in the news. '
+             'Are those numbers really informative?',
+        bias_tag='Anchoring', cooldown_s=180,
+    ),
+]
+
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+class RoundFeatures:
+    """
+    Round features maintained in O(1) per message (anchor deviation is
+    O(number of anchors) per trade).
+    """
+    __slots__ = ('start_value', 'value', 'peak_value', 'drawdown', 'gross_volume',
+                 'pv_sum', 'pv_count', 'trade_count', 'anchor_bp_sum', 'anchor_bp_count')
+
+    def __init__(self):
+        self.start_value = 0.0
+        self.value = 0.0
+        self.peak_value = 0.0
+        self.drawdown = 0.0
+        self.gross_volume = 0.0
+        self.pv_sum = 0.0
+        self.pv_count = 0
+        self.trade_count = 0
+        self.anchor_bp_sum = 0.0
+        self.anchor_bp_count = 0
+
+    def update(self, payload: Dict, anchors: List[float]):
+        try:
+            value = float(payload.get('portfolio_value', self.value))
+        except (TypeError, ValueError):
+            value = self.value
+        if not self.start_value and value > 0:
+            self.start_value = value
+        self.value = value
+        if value > 0:
+            self.pv_sum += value
+            self.pv_count += 1
+        if value > self.peak_value:
+            self.peak_value = value
+        if self.peak_value > 0:
+            self.drawdown = (value - self.peak_value) / self.peak_value
+
+        if payload.get('action') in ('Buy', 'Sell'):
+            try:
+                qty = abs(float(payload.get('quantity', 0.0)))
+                price = float(payload.get('price_per_share', 0.0))
+            except (TypeError, ValueError):
+                return
+            if qty > 0 and price > 0:
+                self.trade_count += 1
+                self.gross_volume += qty * price
+                valid = [a for a in anchors if a > 0]
+                if valid:
+                    nearest = min(valid, key=lambda a: abs(a - price))
+                    self.anchor_bp_sum += abs(10000.0 * (price - nearest) / nearest)
+                    self.anchor_bp_count += 1
+
+    def to_state(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_state(cls, data: Dict) -> 'RoundFeatures':
+        features = cls()
+        for name in cls.__slots__:
+            if name in data:
+                setattr(features, name, data[name])
+        return features
+
+    def as_dict(self) -> Dict:
+        avg_pv = self.pv_sum / self.pv_count if self.pv_count else 0.0
+        return dict(
+            drawdown=self.drawdown,
+            turnover=self.gross_volume / avg_pv if avg_pv > 0 else 0.0,
+            anchor_bp=self.anchor_bp_sum / self.anchor_bp_count if self.anchor_bp_count else 0.0,
+            trade_count=self.trade_count,
+            roi=(self.value - self.start_value) / self.start_value if self.start_value > 0 else 0.0,
+        )
+
+
+class _PlayerNudgeState:
+    __slots__ = ('round_number', 'features', 'last_nudge', 'last_by_rule', 'n_nudges')
+
+    def __init__(self, round_number):
+        self.round_number = round_number
+        self.features = RoundFeatures()
+        self.last_nudge = None
+        self.last_by_rule = {}
+        self.n_nudges = 0
+
+    def to_state(self) -> Dict:
+        return dict(round_number=self.round_number, features=self.features.to_state(),
+                    last_nudge=self.last_nudge, last_by_rule=self.last_by_rule, n_nudges=self.n_nudges)
+
+    @classmethod
+    def from_state(cls, data: Dict) -> '_PlayerNudgeState':
+        state = cls(data['round_number'])
+        state.features = RoundFeatures.from_state(data.get('features', {}))
+        state.last_nudge = data.get('last_nudge')
+        state.last_by_rule = dict(data.get('last_by_rule', {}))
+        state.n_nudges = data.get('n_nudges', 0)
+        return state
+
+
+class NudgeEngine:
+    """
+    Evaluates the rules against per-player round features. One engine is
+    shared by all sessions of a server process; state is kept in 'store'
+    (default: the shared live state store) under live_state.state_key('nudge', ...).
+    """
+
+    def __init__(self, clock=time.time, store=None):
+        self.clock = clock
+        self.store = store
+
+    def _store(self):
+        return self.store or get_store()
+
+    def process(
+        self,
+        session_code: str,
+        participant_code: str,
+        round_number: int,
+        payload: Dict,
+        anchors: List[float],
+        rules: List[Dict],
+        cooldown_s: float = 30.0,
+        max_per_round: int = 5,
+    ) -> Optional[Dict]:
+        """
+        Update the features with one live message and return the first nudge
+        whose rule matches and is not rate-limited, as
+        {'nudge_text': ..., 'bias_tag': ..., 'rule': ...}, or None.
+        """
+        action = payload.get('action', '')
+        now = self.clock()
+
+        def apply(data):
+            if data.get('round_number') != round_number or action == 'Start':
+                state = _PlayerNudgeState(round_number)
+            else:
+                state = _PlayerNudgeState.from_state(data)
+            nudge = self._evaluate(state, action, payload, anchors, rules, now, cooldown_s, max_per_round)
+            data.clear()
+            data.update(state.to_state())
+            return nudge
+
+        return self._store().update(state_key('nudge', session_code, participant_code), apply)
+
+    @staticmethod
+    def _evaluate(state, action, payload, anchors, rules, now, cooldown_s, max_per_round) -> Optional[Dict]:
+        state.features.update(payload, anchors)
+        if action == 'End' or state.n_nudges >= max_per_round:
+            return None
+        if state.last_nudge is not None and now - state.last_nudge < cooldown_s:
+            return None
+
+        events = {'any', 'drawdown'}
+        if action in ('Buy', 'Sell'):
+            events.add('orderFilled')
+        features = state.features.as_dict()
+        for rule in rules:
+            if rule.get('event', 'any') not in events:
+                continue
+            if features['trade_count'] < rule.get('min_trades', 0):
+                continue
+            last = state.last_by_rule.get(rule['id'])
+            if last is not None and now - last < rule.get('cooldown_s', 0):
+                continue
+            compare = OPERATORS[rule.get('op', '>=')]
+            if compare(features.get(rule['feature'], 0.0), rule['threshold']):
+                state.last_nudge = now
+                state.last_by_rule[rule['id']] = now
+                state.n_nudges += 1
+                return dict(nudge_text=rule['text'], bias_tag=rule.get('bias_tag', 'Nudge'), rule=rule['id'])
+        return None
+
+    def features(self, session_code: str, participant_code: str) -> Dict:
+        data = self._store().get(state_key('nudge', session_code, participant_code))
+        return RoundFeatures.from_state(data.get('features', {})).as_dict() if data else {}
+
+
+engine = NudgeEngine()
+
+
+def in_treatment(cond, arm=None) -> bool:
+    """
+    Nudges are only shown in the treatment arm: cond 1 (from the /assign
+    service) or arm 'treatment'.
+    """
+    return str(cond) == '1' or arm == 'treatment'
+
+
+def arm_of(cond, arm=None) -> str:
+    """
+    Arm of a participant by the rule of in_treatment: 'treatment', else the
+    given arm, else 'control' if a cond was assigned, else '' (unassigned).
+    """
+    if in_treatment(cond, arm):
+        return 'treatment'
+    if arm:
+        return str(arm)
+    return 'control' if cond not in (None, '') else ''
+
+
+def get_rules(config) -> List[Dict]:
+    """
+    Rules from the 'nudge_rules' session config (JSON string or list), else DEFAULT_RULES.
+    """
+    rules = config.get('nudge_rules')
+    if not rules:
+        return DEFAULT_RULES
+    if isinstance(rules, str):
+        rules = json.loads(rules)
+    return rules
+
+
+class LocalNudgeService:
+    """
+    Stand-in for the external /nudges HTTP service, for tests and offline
+    development. Accepts the request body nudge-gate.js used to POST
+    ({pid, cond, event_type, features}) and answers with the same shape
+    ({nudge_text, bias_tag} or {}), evaluated by a private NudgeEngine.
+    """
+
+    def __init__(self, rules: Optional[List[Dict]] = None, clock=time.time, **limits):
+        self.engine = NudgeEngine(clock=clock, store=LocalLiveStore())
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.limits = limits
+        self.requests = []
+
+    def post(self, body: Dict) -> Dict:
+        self.requests.append(body)
+        if not in_treatment(body.get('cond', 0), body.get('arm')):
+            return {}
+        payload = dict(body.get('features') or {})
+        if body.get('event_type') == 'orderFilled':
+            payload.setdefault('action', 'Buy')
+        nudge = self.engine.process(
+            str(body.get('session', '')), str(body.get('pid')), int(body.get('round', 1)), payload,
+            payload.get('anchors', []), self.rules, **self.limits
+        )
+        return nudge or {}
@@ -0,0 +1,215 @@
+# ZTS/order_book.py
+# ---------------------------------
+# In-memory limit order book for the optional group market mode
+# ('group_market' in the session config).
+#
+# Orders of the players of one group (per round) meet in a price-time
+# priority book. Each side is a binary heap of (price key, sequence number,
+# order id); cancelled or filled orders are removed lazily when they reach the
+# top of the heap, so submit and cancel are O(log n). An incoming order trades
+# against the best opposite orders while prices cross, at the price of the
+# resting order, and the rest is added to the book.
+#
+# Cash and shares of open orders are reserved per player, so a player cannot
+# place orders that together exceed their holdings. An order that would trade
+# against an open order of the same player is rejected (self-trade
+# prevention), so every fill moves shares between two players. Each player's
+# open orders are in heaps per side as well, so the check only looks at the
+# player's best opposite order.
+# Books live in the memory of the server process (single worker).
+
+from typing import Dict, List, Optional, Tuple
+import heapq
+import itertools
+import threading
+
+
+BUY, SELL = 'Buy', 'Sell'
+
+
+class Order:
+    __slots__ = ('order_id', 'player_id', 'side', 'price', 'quantity', 'remaining', 'seq', 'active')
+
+    def __init__(self, order_id, player_id, side, price, quantity, seq):
+        self.order_id = order_id
+        self.player_id = player_id
+        self.side = side
+        self.price = price
+        self.quantity = quantity
+        self.remaining = quantity
+        self.seq = seq
+        self.active = True
+
+    def as_dict(self) -> Dict:
+        return dict(order_id=self.order_id, player=self.player_id, side=self.side,
+                    price=self.price, quantity=self.quantity, remaining=self.remaining)
+
+
+class Fill:
+    __slots__ = ('buy_order', 'sell_order', 'buyer', 'seller', 'price', 'quantity', 'aggressor')
+
+    def __init__(self, buy_order, sell_order, price, quantity, aggressor):
+        self.buy_order = buy_order.order_id
+        self.sell_order = sell_order.order_id
+        self.buyer = buy_order.player_id
+        self.seller = sell_order.player_id
+        self.price = price
+        self.quantity = quantity
+        self.aggressor = aggressor
+
+    def as_dict(self) -> Dict:
+        return dict(buy_order=self.buy_order, sell_order=self.sell_order, buyer=self.buyer,
+                    seller=self.seller, price=self.price, quantity=self.quantity, aggressor=self.aggressor)
+
+
+class OrderBook:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bids = []   # (-price, seq, order_id)
+        self.asks = []   # (price, seq, order_id)
+        self.orders = {}
+        self.player_orders = {}     # player -> {order_id: open order}
+        self.player_heaps = {}      # player -> {side: heap like bids/asks}
+        self.reserved_cash = {}     # player -> cash locked in open buy orders
+        self.reserved_shares = {}   # player -> shares locked in open sell orders
+        self.levels = {BUY: {}, SELL: {}}   # side -> {price: open quantity}
+        self._seq = itertools.count(1)
+
+    def available(self, player_id, cash: float, shares: int) -> Tuple[float, int]:
+        """
+        Cash and shares of a player that are not locked in open orders.
+        """
+        return (cash - self.reserved_cash.get(player_id, 0.0),
+                shares - self.reserved_shares.get(player_id, 0))
+
+    def _reserve(self, order: Order, sign: int):
+        levels = self.levels[order.side]
+        qty = levels.get(order.price, 0) + sign * order.remaining
+        if qty > 0:
+            levels[order.price] = qty
+        else:
+            levels.pop(order.price, None)
+        if order.side == BUY:
+            amount = sign * order.remaining * order.price
+            self.reserved_cash[order.player_id] = self.reserved_cash.get(order.player_id, 0.0) + amount
+        else:
+            self.reserved_shares[order.player_id] = self.reserved_shares.get(order.player_id, 0) + sign * order.remaining
+
+    def _best(self, heap) -> Optional[Order]:
+        while heap:
+            order = self.orders.get(heap[0][2])
+            if order is not None and order.active:
+                return order
+            heapq.heappop(heap)
+        return None
+
+    def submit(self, player_id, side: str, price: float, quantity: int,
+               cash: Optional[float] = None, shares: Optional[int] = None) -> Tuple[Order, List[Fill]]:
+        """
+        Match a limit order against the book and rest the remainder.
+        If the player's cash and shares are given, the order must be covered
+        by what is not locked in their open orders. An order that crosses an
+        open order of the same player is rejected before anything is matched.
+        Returns the order and its fills in execution order.
+        """
+        if side not in (BUY, SELL) or quantity <= 0 or price <= 0:
+            raise ValueError('invalid order')
+        if self._crosses_own(player_id, side, price):
+            raise ValueError('order would trade with your own order')
+        if cash is not None and shares is not None:
+            free_cash, free_shares = self.available(player_id, cash, shares)
+            if side == BUY and quantity * price > free_cash + 1e-9:
+                raise ValueError('not enough cash')
+            if side == SELL and quantity > free_shares:
+                raise ValueError('not enough shares')
+        seq = next(self._seq)
+        order = Order(seq, player_id, side, float(price), int(quantity), seq)
+        fills = []
+        opposite = self.asks if side == BUY else self.bids
+        while order.remaining > 0:
+            best = self._best(opposite)
+            if best is None or (best.price > order.price if side == BUY else best.price < order.price):
+                break
+            qty = min(order.remaining, best.remaining)
+            self._reserve(best, -1)
+            best.remaining -= qty
+            order.remaining -= qty
+            if best.remaining == 0:
+                self._remove(best)
+            else:
+                self._reserve(best, 1)
+            buy, sell = (order, best) if side == BUY else (best, order)
+            fills.append(Fill(buy, sell, best.price, qty, player_id))
+
+        if order.remaining > 0:
+            self.orders[order.order_id] = order
+            self.player_orders.setdefault(player_id, {})[order.order_id] = order
+            self._reserve(order, 1)
+            entry = (-order.price if side == BUY else order.price, seq, order.order_id)
+            heapq.heappush(self.bids if side == BUY else self.asks, entry)
+            heapq.heappush(self.player_heaps.setdefault(player_id, {BUY: [], SELL: []})[side], entry)
+        else:
+            order.active = False
+        return order, fills
+
+    def _crosses_own(self, player_id, side: str, price: float) -> bool:
+        heaps = self.player_heaps.get(player_id)
+        if heaps is None:
+            return False
+        best = self._best(heaps[SELL if side == BUY else BUY])
+        if best is None:
+            return False
+        return best.price <= price if side == BUY else best.price >= price
+
+    def _remove(self, order: Order):
+        order.active = False
+        del self.orders[order.order_id]
+        del self.player_orders[order.player_id][order.order_id]
+
+    def cancel(self, order_id, player_id=None) -> Optional[Order]:
+        """
+        Cancel an open order (only the owner's, if player_id is given).
+        The heap entry is dropped lazily.
+        """
+        order = self.orders.get(order_id)
+        if order is None or (player_id is not None and order.player_id != player_id):
+            return None
+        self._reserve(order, -1)
+        self._remove(order)
+        return order
+
+    def cancel_all(self, player_id) -> List[Order]:
+        cancelled = (self.cancel(oid) for oid in list(self.player_orders.get(player_id, {})))
+        return [order for order in cancelled if order is not None]
+
+    def top(self, depth: int = 5) -> Dict:
+        """
+        Open quantity of the best 'depth' price levels per side.
+        """
+        bids, asks = self.levels[BUY], self.levels[SELL]
+        return dict(
+            bids=[[p, bids[p]] for p in heapq.nlargest(depth, bids)],
+            asks=[[p, asks[p]] for p in heapq.nsmallest(depth, asks)],
+        )
+
+
+_books = {}
+_books_lock = threading.Lock()
+
+
+def get_book(session_code: str, group_id: int, round_number: int) -> OrderBook:
+    key = (session_code, group_id, round_number)
+    book = _books.get(key)
+    if book is None:
+        with _books_lock:
+            book = _books.setdefault(key, OrderBook())
+    return book
+
+
+def drop_books(session_code: str, round_number: int):
+    """
+    Forget the books of a finished round.
+    """
+    with _books_lock:
+        for key in [k for k in _books if k[0] == session_code and k[2] == round_number]:
+            del _books[key]
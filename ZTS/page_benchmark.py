@@ -0,0 +1,101 @@
+# ZTS/page_benchmark.py
+# ---------------------------------
+# Page payload and render-time benchmark.
+# The 'zts_page_benchmark' session config (settings.py) runs the ZTS pages for
+# generated scenarios of increasing length; run it with
+#
+#   otree test zts_page_benchmark
+#
+# With 'page_benchmark' enabled in the session config:
+#   - @measured page hooks (vars_for_template, js_vars) record their time and,
+#     for js_vars, the size of the JSON inlined into the page
+#   - the bot (tests.py) records the HTML size of every page it sees and the
+#     time from submitting a page until the next one is loaded
+# Measurements are keyed by page and scenario length. After the last round
+# the bot prints a table and fails if a budget is exceeded:
+#   page_html_budget_bytes, page_js_vars_budget_bytes, page_render_budget_ms
+# (0 disables a budget; render time is the sum of the page hooks).
+
+from typing import Dict, List
+import functools
+import json
+import threading
+import time
+
+
+_results = {}   # session code -> {(page, scenario length): {metric: value}}
+_lock = threading.Lock()
+
+
+def scenario_length(subsession) -> int:
+    _, prices, _ = subsession.get_timeseries_values()
+    return len(prices)
+
+
+def record(session_code: str, page: str, length: int, **metrics):
+    """
+    Store metrics of a page; times add up, sizes keep the maximum.
+    """
+    with _lock:
+        row = _results.setdefault(session_code, {}).setdefault((page, length), {})
+        for name, value in metrics.items():
+            if name.endswith('_ms'):
+                row[name] = row.get(name, 0.0) + value
+            else:
+                row[name] = max(row.get(name, 0), value)
+
+
+def measured(func):
+    """
+    Decorator for page hooks (first argument is the Page). Records the hook's
+    time and, for js_vars, the JSON size of its result.
+    """
+    @functools.wraps(func)
+    def wrapper(page, *args, **kwargs):
+        if not page.session.config.get('page_benchmark'):
+            return func(page, *args, **kwargs)
+        t0 = time.perf_counter()
+        result = func(page, *args, **kwargs)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        metrics = dict(server_ms=elapsed_ms)
+        if func.__name__ == 'js_vars':
+            metrics['js_vars_bytes'] = len(json.dumps(result).encode())
+        record(page.session.code, type(page).__name__, scenario_length(page.subsession), **metrics)
+        return result
+
+    return wrapper
+
+
+def results(session_code: str) -> List[Dict]:
+    with _lock:
+        rows = _results.get(session_code, {}).items()
+        return [dict(page=page, length=length, **metrics) for (page, length), metrics in sorted(rows)]
+
+
+def check_budgets(rows: List[Dict], config) -> List[str]:
+    """
+    Human-readable budget violations of the measured rows.
+    """
+    budgets = [
+        ('html_bytes', config.get('page_html_budget_bytes')),
+        ('js_vars_bytes', config.get('page_js_vars_budget_bytes')),
+        ('server_ms', config.get('page_render_budget_ms')),
+    ]
+    violations = []
+    for row in rows:
+        for metric, budget in budgets:
+            if budget and row.get(metric, 0) > budget:
+                violations.append('{} ({} days): {} = {:.0f} > {}'.format(
+                    row['page'], row['length'], metric, row[metric], budget))
+    return violations
+
+
+def format_table(rows: List[Dict]) -> str:
+    columns = ['page', 'length', 'html_bytes', 'js_vars_bytes', 'server_ms', 'round_trip_ms']
+    lines = ['\t'.join(columns)]
+    for row in rows:
+        lines.append('\t'.join(
+            '{:.1f}'.format(row[c]) if isinstance(row.get(c), float) else str(row.get(c, ''))
+            for c in columns
+        ))
+    return '\n'.join(lines)
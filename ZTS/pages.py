@@ -1,12 +1,19 @@
 from otree.api import Currency as c, currency_range
+from otree.common import participant_start_url
 from ._builtin import Page, WaitPage
-from .models import Constants
+from .models import Constants, save_round_summary, start_trading_action_export
+from . import admin_views, assets, round_series, vars_budget
+from .page_benchmark import measured
+from .profiling import profiled
 import locale
 from urllib.parse import urlencode
 
 # Round-metrics helper (includes Sharpe & Sortino)
 from .utils_metrics import summarize_round
 
+# admin report endpoints (live counters, export, profiler, see admin_views.py)
+admin_views.register()
+
 
 class InstructionPage(Page):
     def is_displayed(self):
@@ -17,27 +24,17 @@ class StartPage(Page):
     def is_displayed(self):
         return self.round_number <= self.session.num_rounds
 
+    @profiled
+    @measured
     def vars_for_template(self):
         is_training_round = self.session.config['training_round'] and self.round_number == 1
         return dict(is_training_round=is_training_round)
         
     # NEW: initialise per-round logs/series at round start
+    @profiled
     def before_next_page(self):
-        p = self.participant
-        pl = self.player
-
-        # Reset logs for this round
-        pl.portfolio_values_series = []
-        pl.trades_log_round = []
-        pl.anchors_round = []
-
-        # Record starting portfolio value if available
-        try:
-            pl.portfolio_value_start = getattr(pl, 'portfolio_value', None)
-            if pl.portfolio_value_start:
-                pl.portfolio_values_series.append(pl.portfolio_value_start)
-        except Exception:
-            pass
+        self.player._ensure_round_logs(reset=True)
+        vars_budget.check(self.player, 'StartPage')
 
 class TradingPage(Page):
     live_method = 'live_trading_report'
@@ -45,6 +42,13 @@ class TradingPage(Page):
     def is_displayed(self):
         return self.round_number <= self.session.num_rounds
 
+    @profiled
+    @measured
+    def vars_for_template(self):
+        return dict(trading_bundle=assets.static_path('trading'))
+
+    @profiled
+    @measured
     def js_vars(self):
         """
         Pass data for trading controller to javascript front-end
@@ -59,8 +63,18 @@ class TradingPage(Page):
             cash=self.subsession.get_config_multivalue('initial_cash'),
             shares=self.subsession.get_config_multivalue('initial_shares'),
             trading_button_values=self.subsession.get_config_multivalue('trading_button_values'),
+            order_coalesce_ms=self.session.config.get('order_coalesce_ms', 0),
+            group_market=bool(self.session.config.get('group_market')),
+            id_in_group=self.player.id_in_group,
         )
 
+    @profiled
+    def before_next_page(self):
+        # store anything still buffered by the write-behind queue
+        if self.session.config.get('trading_action_write_behind'):
+            self.player.flush_trading_actions()
+        vars_budget.check(self.player, 'TradingPage')
+
 
 class ResultsPage(Page):
     def is_displayed(self):
@@ -69,6 +83,8 @@ class ResultsPage(Page):
     def to_human_readable(self, x):
         return '{:,}'.format(int(x))
 
+    @profiled
+    @measured
     def vars_for_template(self):
         return dict(
             cash=self.to_human_readable(self.player.cash),
@@ -79,33 +95,40 @@ class ResultsPage(Page):
         )
 
     # Compute per-round features (incl. Sharpe/Sortino) just before moving on
+    @profiled
     def before_next_page(self):
         p = self.participant
         s = self.session
+        # the TradingPage flush is committed: the write-behind queue can go
+        if s.config.get('trading_action_write_behind'):
+            self.player.finish_trading_actions()
 
         # ---- Gather inputs for metrics (tolerate missing data) ----
-        pv_series = (
-            getattr(self.player, 'portfolio_values_series', None)
-            or p.vars.get('pv_series_round', None)
-            or []
-        )
-        start_value = pv_series[0] if pv_series else getattr(self.player, 'portfolio_value_start', None)
-        end_value = pv_series[-1] if pv_series else getattr(self.player, 'portfolio_value', None)
-
-        trades = (
-            getattr(self.player, 'trades_log_round', None)
-            or p.vars.get('trades_log_round', None)
-            or []
-        )
-
-        anchors = (
-            getattr(self.player, 'anchors_round', None)
-            or p.vars.get('anchors_round', None)
-            or []
-        )
+        # ROI from the values the round started and ended with, as the payoff
+        # (the first and last value of the logged series if no 'Start' arrived)
+        start_value, end_value = self.player.portfolio_value_start, self.player.portfolio_value
+        logged = p.vars.get('pv_series_round', None)
+        if not start_value and logged:
+            start_value, end_value = round_series.first_last(logged)
+        # Risk metrics from the daily equity curve rebuilt on the server from
+        # prices and trades, so they do not depend on how often the browser
+        # reported; the series collected from live messages is only a fallback
+        # (bounded in size, see round_series.py: its metrics come from exact
+        # running aggregates, not from the downsampled values). An ephemeral
+        # round logs no trades; its series already is that daily equity curve.
+        pv_series = self.player.get_equity_curve()
+        if pv_series:
+            logged = None
+        elif logged:
+            pv_series = round_series.values(logged)
+        else:
+            pv_series = []
+        trades_log = p.vars.get('trades_log_round', None)
+        trades = round_series.trades_for_metrics(trades_log)
+        anchors = p.vars.get('anchors_round', None) or []
 
         # Optional annualisation controls from settings (totally optional)
-        periods_per_year = s.config.get('metrics_periods_per_year', None)   # e.g., 252*6 if ~6 updates/day, etc.
+        periods_per_year = s.config.get('metrics_periods_per_year', None)   # e.g., 252 for daily values
         rf_annual = s.config.get('metrics_rf_annual', 0.0)                  # e.g., 0.02 for 2%
 
         # ---- Compute metrics
@@ -117,27 +140,19 @@ class ResultsPage(Page):
             anchors=anchors or [],
             rf_annual=rf_annual,
             periods_per_year=periods_per_year,
+            reference=self.subsession.get_reference_stats(),
         )
+        if logged:
+            summary.update(round_series.series_metrics(logged, trades_log, periods_per_year))
 
-        # Store on player for immediate use by the redirect page
-        self.player.roi_round = summary['roi']
-        self.player.max_dd_round = summary['max_dd']
-        self.player.trade_count_round = summary['trade_count']
-        self.player.turnover_round = summary['turnover']
-        self.player.anchor_dev_bp_round = summary['anchor_bp']
-        self.player.sharpe_round = summary['sharpe']
-        self.player.sortino_round = summary['sortino']
-
-        # Also stash in participant.vars if you prefer reading from there
-        p.vars['last_round_features'] = dict(
-            roi=summary['roi'],
-            max_dd=summary['max_dd'],
-            trades=summary['trade_count'],
-            turnover=summary['turnover'],
-            anchor_bp=summary['anchor_bp'],
-            sharpe=summary['sharpe'],
-            sortino=summary['sortino'],
-        )
+        # Materialize once; later pages, admin reports and exports read the RoundSummary
+        save_round_summary(self.player, summary, start_value, end_value)
+        vars_budget.check(self.player, 'ResultsPage')
+
+        # The last player to finish the session starts the TradingAction export
+        if s.config.get('trading_action_export_on_complete') and self.round_number == s.num_rounds \
+                and self.subsession.session_complete():
+            start_trading_action_export(self.subsession)
 
 
 # === Between-round redirect (both arms) ===
@@ -156,26 +171,23 @@ class BetweenRoundQualtrics(Page):
         has_link = bool(self.session.config.get('nudge_link_round'))  # per-round Qualtrics link
         return not_last_round and has_link
 
+    @profiled
+    @measured
     def vars_for_template(self):
         p = self.participant
         s = self.session
 
         arm = p.vars.get('arm', 'control')  # default to control if not set
 
-        # Use the metrics computed in ResultsPage.before_next_page
-        features = dict(
-            roi=round(getattr(self.player, 'roi_round', 0.0), 6),
-            max_dd=round(getattr(self.player, 'max_dd_round', 0.0), 6),
-            trades=int(getattr(self.player, 'trade_count_round', 0)),
-            turnover=round(getattr(self.player, 'turnover_round', 0.0), 6),
-            anchor_bp=round(getattr(self.player, 'anchor_dev_bp_round', 0.0), 2),
-            sharpe=round(getattr(self.player, 'sharpe_round', 0.0), 6),
-            sortino=round(getattr(self.player, 'sortino_round', 0.0), 6),
+        # Use the metrics materialized in ResultsPage.before_next_page
+        summary = self.player.get_round_summary()
+        features = summary.features() if summary else dict(
+            roi=0.0, max_dd=0.0, trades=0, turnover=0.0, anchor_bp=0.0, sharpe=0.0, sortino=0.0,
         )
-        p.vars['last_round_features'] = features
 
-        # Return URL: the next oTree page in sequence
-        return_url = self._url_next
+        # Return URL: oTree's start link of the participant, which redirects to
+        # the page they should be on (this one has timed out by then)
+        return_url = str(self.request.base_url).rstrip('/') + participant_start_url(p.code)
 
         # Base Qualtrics link for the BETWEEN-ROUND block
         q_base = s.config.get('nudge_link_round')
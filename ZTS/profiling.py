@@ -0,0 +1,146 @@
+# ZTS/profiling.py
+# ---------------------------------
+# On-demand sampling profiler for the ZTS page handlers and live method.
+# A profiling window is opened per session in one of two ways:
+#   - with 'profile_window_s' in the session config (editable when the session
+#     is created): the first 'Start' report of round 'profile_round' opens it;
+#   - from the ZTS admin report at any time (admin_views.ProfileSession), which
+#     can also stop it early.
+# A window closes by itself after its length in seconds (at most MAX_WINDOW_S). While a window is open, a background thread
+# samples the stack of every thread that is inside a @profiled handler of that
+# session every SAMPLE_INTERVAL_S and counts the stacks.
+#
+# Output is the "folded stacks" format ('frame;frame;frame count' per line)
+# read by flamegraph.pl, speedscope and inferno. The ZTS admin report shows
+# the status of the window and downloads the samples.
+#
+# With no window open, @profiled costs one truthiness check of a module-level
+# dict per call; no thread runs and nothing is recorded.
+
+from collections import Counter
+from typing import Dict
+import functools
+import os
+import sys
+import threading
+import time
+
+
+SAMPLE_INTERVAL_S = 0.005
+MAX_WINDOW_S = 600
+
+_windows = {}          # session_code -> deadline (time.monotonic)
+_samples = {}          # session_code -> Counter of folded stacks
+_inside = {}           # thread id -> (session_code, handler name, handler frame)
+_lock = threading.Lock()
+_sampler = None
+
+
+def start(session_code: str, seconds: float) -> float:
+    """
+    Open (or extend) a profiling window for a session; returns its length in seconds.
+    """
+    global _sampler
+    seconds = max(0.0, min(float(seconds), MAX_WINDOW_S))
+    with _lock:
+        _windows[session_code] = time.monotonic() + seconds
+        _samples.setdefault(session_code, Counter())
+        if _sampler is None or not _sampler.is_alive():
+            _sampler = threading.Thread(target=_sample_loop, name='zts-profiler', daemon=True)
+            _sampler.start()
+    return seconds
+
+
+def start_once(session_code: str, seconds: float) -> bool:
+    """
+    Open a window unless the session already had one (or has samples).
+    """
+    with _lock:
+        if session_code in _windows or session_code in _samples:
+            return False
+    start(session_code, seconds)
+    return True
+
+
+def stop(session_code: str):
+    with _lock:
+        _windows.pop(session_code, None)
+
+
+def status(session_code: str) -> Dict:
+    deadline = _windows.get(session_code)
+    remaining = max(0.0, deadline - time.monotonic()) if deadline else 0.0
+    samples = _samples.get(session_code)
+    return dict(
+        active=remaining > 0,
+        remaining_s=round(remaining, 1),
+        samples=sum(samples.values()) if samples else 0,
+        stacks=len(samples) if samples else 0,
+    )
+
+
+def folded(session_code: str) -> str:
+    """
+    Samples collected for a session in folded-stacks format.
+    """
+    samples = _samples.get(session_code) or Counter()
+    return ''.join('{} {}\n'.format(stack, n) for stack, n in samples.most_common())
+
+
+def clear(session_code: str):
+    with _lock:
+        _samples.pop(session_code, None)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return '{}:{}'.format(os.path.basename(code.co_filename), code.co_name)
+
+
+def _sample_loop():
+    while True:
+        now = time.monotonic()
+        with _lock:
+            for code in [c for c, deadline in _windows.items() if deadline <= now]:
+                del _windows[code]
+            if not _windows:
+                return
+            inside = list(_inside.items())
+        frames = sys._current_frames()
+        for thread_id, (session_code, name, root) in inside:
+            frame = frames.get(thread_id)
+            if frame is None or session_code not in _windows:
+                continue
+            stack = []
+            while frame is not None and frame is not root:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(name)
+            _samples.setdefault(session_code, Counter())[';'.join(reversed(stack))] += 1
+        time.sleep(SAMPLE_INTERVAL_S)
+
+
+def profiled(func):
+    """
+    Decorator for ZTS page handlers and live methods (first argument has .session).
+    """
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if not _windows:
+            return func(self, *args, **kwargs)
+        session_code = self.session.code
+        if session_code not in _windows:
+            return func(self, *args, **kwargs)
+        thread_id = threading.get_ident()
+        outer = _inside.get(thread_id)
+        if outer is None:
+            _inside[thread_id] = (session_code, name, sys._getframe())
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            if outer is None:
+                _inside.pop(thread_id, None)
+
+    return wrapper
@@ -0,0 +1,102 @@
+# ZTS/rate_limit.py
+# ---------------------------------
+# Per-player limiter for the live method.
+# Each participant has a token bucket refilled at 'live_rate_limit_per_s' up
+# to 'live_rate_limit_burst' messages. live_trading_report asks admit() for
+# every message:
+#   - Start and End are always processed in full.
+#   - A Buy/Sell (or group market Order) over the limit is still stored (the trade ledger must stay
+#     complete), but the optional work (nudges, vars footprint) is skipped;
+#     it counts as 'throttled'.
+#   - Any other message over the limit is ignored; it counts as 'dropped'.
+# Clicks the browser merged into one order (see 'order_coalesce_ms') are
+# counted as 'merged'. The counters are shown in the ZTS admin report.
+# The buckets live in the live state store (see live_state.py) and are shared
+# by all workers; the counters are per server process.
+
+from typing import Dict, Optional
+import threading
+import time
+
+from .live_state import get_store, state_key
+
+
+FULL, THROTTLED, DROPPED = 'full', 'throttled', 'dropped'
+
+
+def take_token(store, key: str, action: str, rate: float, burst: float, now: Optional[float] = None) -> str:
+    """
+    Take one token from the bucket stored under key (refilled at 'rate' per
+    second up to 'burst') and return FULL, THROTTLED or DROPPED.
+    """
+    now = time.time() if now is None else now
+
+    def apply(state):
+        elapsed = max(now - state.get('updated', now), 0.0)
+        tokens = min(burst, state.get('tokens', burst) + elapsed * rate)
+        state['updated'] = now
+        if action in ('Start', 'End') or tokens >= 1.0:
+            state['tokens'] = max(tokens - 1.0, 0.0)
+            return FULL
+        state['tokens'] = tokens
+        return THROTTLED if action in ('Buy', 'Sell', 'Order') else DROPPED
+
+    return store.update(key, apply)
+
+
+class SessionLimiter:
+    """
+    Counters of the limiter decisions for one session.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {FULL: 0, THROTTLED: 0, DROPPED: 0, 'merged': 0}
+
+    def count(self, decision: str, merged: int = 0):
+        with self.lock:
+            self.counts[decision] += 1
+            self.counts['merged'] += max(merged, 0)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return dict(self.counts)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(session_code: str) -> SessionLimiter:
+    limiter = _limiters.get(session_code)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.setdefault(session_code, SessionLimiter())
+    return limiter
+
+
+def admit(player, payload: Dict) -> str:
+    """
+    FULL, THROTTLED or DROPPED for one live message of a player.
+    Everything is FULL if 'live_rate_limit_per_s' is 0.
+    """
+    config = player.session.config
+    limiter = get_limiter(player.session.code)
+    rate = float(config.get('live_rate_limit_per_s') or 0)
+    if rate > 0:
+        burst = float(config.get('live_rate_limit_burst') or rate)
+        key = state_key('bucket', player.session.code, player.participant.code)
+        decision = take_token(get_store(), key, payload.get('action', ''), rate, burst)
+    else:
+        decision = FULL
+    try:
+        merged = int(payload.get('clicks', 1)) - 1
+    except (TypeError, ValueError):
+        merged = 0
+    limiter.count(decision, merged)
+    return decision
+
+
+def stats(session_code: str) -> Dict:
+    limiter = _limiters.get(session_code)
+    return limiter.stats() if limiter else {FULL: 0, THROTTLED: 0, DROPPED: 0, 'merged': 0}
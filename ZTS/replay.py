@@ -0,0 +1,268 @@
+# ZTS/replay.py
+# ---------------------------------
+# Headless replay of logged trading actions.
+# Recomputes cash, shares and equity from the scenario prices with the same
+# arithmetic as buy_shares/sell_shares/update_portfolio in trade_controller.js,
+# and flags rows where the client-reported values disagree.
+# A buy click without enough cash buys floor(cash / price) shares and sets the
+# cash to 0, dropping the rest of less than one share (as baselines.execute).
+# The log only holds the bought quantity, so such a buy is recognized by its
+# reported cash of 0 together with a replayed rest in [0, price).
+# Trades of the group market settle at the price of the matched order instead
+# of the scenario price; such actions carry it as 'fill_price', and their
+# holdings are still valued at the scenario price of the day.
+# Many player-rounds are replayed at once on flat arrays (no per-action loop).
+# A running replay (new_running / running_step / running_close) applies the
+# same arithmetic one action at a time while the round is played, keeping
+# only the current holdings; it hands out the equity of every day once the
+# day has closed (ephemeral rounds in models.py, which log no actions).
+
+from typing import List, Dict, Optional, Sequence
+
+import numpy as np
+
+
+# Reported columns that are checked against the replay
+CHECKED_FIELDS = ('price_per_share', 'cash', 'owned_shares', 'portfolio_value')
+
+
+def _signed_quantities(actions: np.ndarray, quantities: np.ndarray) -> np.ndarray:
+    """
+    Buy adds shares, Sell removes them; Start/End never change the position.
+    The client already sends sells as negative quantities, but we rely on the
+    action name so a wrongly signed report cannot shift the replay.
+    """
+    q = np.abs(quantities)
+    return np.where(actions == 'Buy', q, np.where(actions == 'Sell', -q, 0.0))
+
+
+def _segment_cumsum(values: np.ndarray, seg_start: np.ndarray, seg_of_row: np.ndarray) -> np.ndarray:
+    """
+    Cumulative sum restarted at every segment (player-round) boundary.
+    """
+    total = np.cumsum(values)
+    offset = np.concatenate(([0.0], total))[seg_start]
+    return total - offset[seg_of_row]
+
+
+def _capped_cash(start_cash: np.ndarray, flow: np.ndarray, seg: np.ndarray, round_start: np.ndarray,
+                 capped: np.ndarray):
+    """
+    Replayed cash after each action when it is set to 0 after the 'capped'
+    rows, and the cash at those rows before it was set to 0 (the dropped rest).
+    """
+    # cash restarts from the start cash of a round and from 0 after a capped buy
+    block_start = round_start.copy()
+    block_start[1:] |= capped[:-1]
+    block = np.cumsum(block_start) - 1
+    starts = np.flatnonzero(block_start)
+    base = np.where(round_start[starts], start_cash[seg[starts]], 0.0)
+    uncapped = base[block] - _segment_cumsum(flow, starts, block)
+    return np.where(capped, 0.0, uncapped), uncapped
+
+
+def replay_batch(rounds: Sequence[Dict], rel_tol: float = 1e-6, abs_tol: float = 0.01) -> List[Dict]:
+    """
+    Replay many player-rounds in one vectorized pass.
+
+    :param rounds: list of dicts with keys
+        - 'key': anything identifying the player-round (returned unchanged)
+        - 'prices': scenario prices, one per day
+        - 'start_cash', 'start_shares': initial portfolio of the round
+        - 'actions': TradingAction-like dicts in the order they were logged
+          (keys: action, quantity, cur_day, optionally the fill_price if it
+          is not the scenario price of the day, and the reported
+          price_per_share, cash, owned_shares, portfolio_value)
+    :param rel_tol: relative tolerance when comparing reported values
+    :param abs_tol: absolute tolerance when comparing reported values
+    :return: one dict per round, in input order, with
+        - 'cash', 'shares', 'equity': replayed state after each action
+        - 'equity_curve': replayed portfolio value for every day
+        - 'notional_curve': gross traded value (sum of |qty| * price) for every day
+        - 'final_value': replayed value on the last day
+        - 'discrepancies': list of {index, cur_day, field, reported, expected}
+    """
+    n_rounds = len(rounds)
+    if n_rounds == 0:
+        return []
+
+    # ---- Flatten prices: one global day index per (round, day)
+    day_counts = np.array([len(r['prices']) for r in rounds], dtype=np.int64)
+    day_start = np.concatenate(([0], np.cumsum(day_counts)[:-1]))
+    prices_flat = np.concatenate([np.asarray(r['prices'], dtype=float) for r in rounds])
+
+    # ---- Flatten actions
+    act_counts = np.array([len(r['actions']) for r in rounds], dtype=np.int64)
+    act_start = np.concatenate(([0], np.cumsum(act_counts)[:-1]))
+    seg = np.repeat(np.arange(n_rounds), act_counts)
+    flat = [a for r in rounds for a in r['actions']]
+
+    start_cash = np.array([float(r['start_cash']) for r in rounds])
+    start_shares = np.array([float(r['start_shares']) for r in rounds])
+
+    actions = np.array([str(a.get('action', '')) for a in flat], dtype=object)
+    quantities = np.array([float(a.get('quantity') or 0.0) for a in flat])
+    days = np.array([int(a.get('cur_day') or 0) for a in flat], dtype=np.int64)
+    days = np.clip(days, 0, np.maximum(day_counts[seg] - 1, 0))
+
+    # ---- Replay: trades fill at the scenario price of their day unless they
+    # carry a fill price; holdings are valued at the day price
+    day_price = prices_flat[day_start[seg] + days]
+    own_price = np.array([float(a['fill_price']) if a.get('fill_price') is not None else np.nan for a in flat])
+    fill_price = np.where(np.isnan(own_price), day_price, own_price)
+    signed_qty = _signed_quantities(actions, quantities)
+    flow = signed_qty * fill_price
+    round_start = np.zeros(len(flat), dtype=bool)
+    round_start[act_start[act_counts > 0]] = True
+    # partial buys: reported cash of 0 and a rest that cannot buy another share;
+    # a second pass drops the candidates whose rest does not fit
+    reported_cash = np.array([float(a['cash']) if a.get('cash') is not None else np.nan for a in flat])
+    capped = (signed_qty > 0) & (reported_cash == 0)
+    if capped.any():
+        _, rest = _capped_cash(start_cash, flow, seg, round_start, capped)
+        capped &= (rest > -abs_tol) & (rest < fill_price)
+    cash, _ = _capped_cash(start_cash, flow, seg, round_start, capped)
+    shares = start_shares[seg] + _segment_cumsum(signed_qty, act_start, seg)
+    equity = cash + shares * day_price
+
+    # ---- Daily equity curve: state after the last action on or before each day
+    grid_seg = np.repeat(np.arange(n_rounds), day_counts)
+    action_pos = day_start[seg] + days
+    notional_day = np.bincount(action_pos, weights=np.abs(signed_qty) * fill_price, minlength=len(prices_flat))
+    cash_day = start_cash[grid_seg]
+    shares_day = start_shares[grid_seg]
+    if len(flat):
+        # a stable sort keeps the logged order for actions on the same day
+        order = np.argsort(action_pos, kind='stable')
+        last = np.searchsorted(action_pos[order], np.arange(len(prices_flat)), side='right') - 1
+        last_row = order[np.clip(last, 0, None)]
+        has_action = (last >= 0) & (seg[last_row] == grid_seg)
+        cash_day = np.where(has_action, cash[last_row], cash_day)
+        shares_day = np.where(has_action, shares[last_row], shares_day)
+    equity_day = cash_day + shares_day * prices_flat
+
+    # ---- Compare against what the client reported
+    expected = dict(price_per_share=fill_price, cash=cash, owned_shares=shares, portfolio_value=equity)
+    mismatch_rows = []
+    for field in CHECKED_FIELDS:
+        reported = np.array([float(a[field]) if a.get(field) is not None else np.nan for a in flat])
+        bad = ~np.isclose(reported, expected[field], rtol=rel_tol, atol=abs_tol) & ~np.isnan(reported)
+        if field == 'portfolio_value':
+            # the client sends 'Start' before its first update_portfolio(),
+            # so that report only contains the cash
+            bad &= actions != 'Start'
+        for i in np.flatnonzero(bad):
+            mismatch_rows.append((int(i), field, float(reported[i]), float(expected[field][i])))
+    # overdrafts and short positions are impossible through the UI
+    for i in np.flatnonzero(cash < -abs_tol):
+        mismatch_rows.append((int(i), 'negative_cash', float(cash[i]), 0.0))
+    for i in np.flatnonzero(shares < 0):
+        mismatch_rows.append((int(i), 'negative_shares', float(shares[i]), 0.0))
+
+    # ---- Split the flat arrays back into rounds
+    discrepancies = [[] for _ in range(n_rounds)]
+    for i, field, reported, exp in sorted(mismatch_rows):
+        r = int(seg[i])
+        discrepancies[r].append(dict(
+            index=i - int(act_start[r]),
+            cur_day=int(days[i]),
+            action=actions[i],
+            field=field,
+            reported=reported,
+            expected=exp,
+        ))
+
+    results = []
+    for r, rnd in enumerate(rounds):
+        a0, a1 = act_start[r], act_start[r] + act_counts[r]
+        d0, d1 = day_start[r], day_start[r] + day_counts[r]
+        curve = equity_day[d0:d1]
+        results.append(dict(
+            key=rnd.get('key'),
+            cash=cash[a0:a1],
+            shares=shares[a0:a1],
+            equity=equity[a0:a1],
+            equity_curve=curve,
+            notional_curve=notional_day[d0:d1],
+            final_value=float(curve[-1]) if len(curve) else float(start_cash[r]),
+            discrepancies=discrepancies[r],
+        ))
+    return results
+
+
+def replay_round(
+    prices: Sequence[float],
+    actions: List[Dict],
+    start_cash: float,
+    start_shares: float,
+    rel_tol: float = 1e-6,
+    abs_tol: float = 0.01,
+) -> Dict:
+    """
+    Replay a single player-round. See replay_batch for the returned keys.
+    """
+    return replay_batch(
+        [dict(prices=prices, actions=actions, start_cash=start_cash, start_shares=start_shares)],
+        rel_tol=rel_tol,
+        abs_tol=abs_tol,
+    )[0]
+
+
+def new_running(start_cash: float, start_shares: float) -> Dict:
+    """
+    State of a running replay: holdings and the first day not handed out yet.
+    Plain JSON-compatible dict.
+    """
+    return dict(cash=float(start_cash), shares=float(start_shares), day=0)
+
+
+def _close_days(running: Dict, prices: Sequence[float], until: int) -> List[float]:
+    day = running['day']
+    values = [running['cash'] + running['shares'] * float(prices[d]) for d in range(day, until)]
+    running['day'] = max(day, until)
+    return values
+
+
+def running_step(running: Dict, prices: Sequence[float], action: Dict, abs_tol: float = 0.01) -> List[float]:
+    """
+    Apply one action (keys as in replay_batch) to a running replay.
+    :return: the equity of the days that closed before the action's day
+    """
+    if not len(prices):
+        return []
+    day = min(max(int(action.get('cur_day') or 0), 0), len(prices) - 1)
+    closed = _close_days(running, prices, day)
+    name = str(action.get('action', ''))
+    if name in ('Buy', 'Sell'):
+        qty = abs(float(action.get('quantity') or 0.0))
+        qty = qty if name == 'Buy' else -qty
+        price = float(action['fill_price']) if action.get('fill_price') is not None else float(prices[day])
+        running['cash'] -= qty * price
+        running['shares'] += qty
+        reported_cash = action.get('cash')
+        if qty > 0 and reported_cash is not None and float(reported_cash) == 0 \
+                and -abs_tol < running['cash'] < price:
+            running['cash'] = 0.0
+    return closed
+
+
+def running_close(running: Dict, prices: Sequence[float]) -> List[float]:
+    """
+    End a running replay: the equity of the remaining days, valued with the
+    final holdings (the tail of replay_round's equity_curve).
+    """
+    return _close_days(running, prices, len(prices))
+
+
+def summarize_discrepancies(results: List[Dict], limit: Optional[int] = None) -> List[Dict]:
+    """
+    Flatten the discrepancies of many replayed rounds into one list of rows
+    (key + discrepancy), e.g. for an audit report.
+    """
+    rows = []
+    for res in results:
+        for d in res['discrepancies']:
+            rows.append(dict(key=res['key'], **d))
+            if limit is not None and len(rows) >= limit:
+                return rows
+    return rows
@@ -0,0 +1,269 @@
+# ZTS/round_series.py
+# ---------------------------------
+# Bounded-size round logs kept in participant.vars ('pv_series_round',
+# 'trades_log_round'). Their size no longer grows with the number of live
+# messages, so the pickled participant.vars stays small for long rounds and
+# frequent reports.
+#
+# Portfolio value series (new_series / append / points / series_metrics):
+#   - the last 'capacity' values are kept exactly
+#   - older values are folded into buckets of (first, min, max, last) points
+#     with their indices; when there are more than 'max_buckets' buckets,
+#     neighbouring buckets are merged, so older history gets coarser
+#   - the metrics are running aggregates over all values: first and last
+#     value, running peak and max drawdown, Welford moments of the returns
+#     (and of the returns below the risk-free rate), sum and count of the
+#     positive values
+# Error bounds: points() returns every value of the recent window and, per
+# bucket, its first, last, minimum and maximum value at their original
+# indices. A dropped value lies between its bucket's minimum and maximum, so a
+# chart drawn from points() is off by at most the range of one bucket, and
+# the extremes of the round are always drawn. series_metrics() gives the same
+# max_dd, sharpe, sortino and turnover as summarize_round on the full series
+# (up to floating-point rounding).
+#
+# Trade log (new_trades / add_trade / trades_for_metrics): the last
+# 'capacity' trades exactly, plus trade count, absolute quantity and notional
+# (quantity times price) per trade price. Trades execute at the price of the
+# day, so a long scenario, or the group market where orders set the price,
+# can see many prices: when there are more than 'max_prices', neighbouring
+# prices are merged pairwise into one entry at their quantity-weighted price.
+# trades_for_metrics() returns one weighted trade per entry, from which
+# summarize_round computes the exact trade_count and turnover; anchor_bp is
+# exact until prices get merged, then each merged trade is counted at its
+# entry's average price, which lies between the merged prices.
+#
+# Both structures are plain JSON-compatible dicts and lists.
+# Plain lists (logs written before this module) are accepted everywhere.
+
+from typing import Dict, List, Optional, Sequence, Union
+import math
+
+from .utils_metrics import compute_turnover
+
+
+DEFAULT_CAPACITY = 500
+DEFAULT_MAX_BUCKETS = 250
+DEFAULT_MAX_PRICES = 250
+# values per bucket when they leave the recent window
+BUCKET_SIZE = 4
+
+
+def rf_per_period(rf_annual: float = 0.0, periods_per_year: Optional[int] = None) -> float:
+    """
+    Per-period risk-free rate as used by compute_sharpe_sortino.
+    """
+    if periods_per_year and periods_per_year > 0:
+        try:
+            return (1.0 + float(rf_annual)) ** (1.0 / float(periods_per_year)) - 1.0
+        except Exception:
+            return 0.0
+    return 0.0
+
+
+def new_series(capacity: int = DEFAULT_CAPACITY, max_buckets: int = DEFAULT_MAX_BUCKETS, rf_per: float = 0.0) -> Dict:
+    return dict(
+        capacity=max(int(capacity), BUCKET_SIZE), max_buckets=max(int(max_buckets), 2), rf_per=rf_per,
+        recent=[], buckets=[], n=0,
+        first=None, last=None, peak=None, max_dd=0.0,
+        ret_n=0, ret_mean=0.0, ret_m2=0.0,
+        down_n=0, down_mean=0.0, down_m2=0.0,
+        pos_sum=0.0, pos_n=0,
+    )
+
+
+def _bucket(start: int, values: Sequence[float]) -> List:
+    i_min = min(range(len(values)), key=values.__getitem__)
+    i_max = max(range(len(values)), key=values.__getitem__)
+    # [i_first, first, i_min, min, i_max, max, i_last, last]
+    return [start, values[0], start + i_min, values[i_min], start + i_max, values[i_max],
+            start + len(values) - 1, values[-1]]
+
+
+def _merge(a: List, b: List) -> List:
+    low = a[2:4] if a[3] <= b[3] else b[2:4]
+    high = a[4:6] if a[5] >= b[5] else b[4:6]
+    return a[0:2] + low + high + b[6:8]
+
+
+def append(series: Union[Dict, List], value: float):
+    """
+    Add one portfolio value.
+    """
+    if isinstance(series, list):
+        series.append(value)
+        return
+    v = float(value)
+    prev = series['last']
+    if series['first'] is None:
+        series['first'] = series['peak'] = v
+    # returns as in returns_from_values: skipped around non-positive values
+    if prev is not None and v > 0 and prev > 0:
+        r = v / prev - 1.0
+        series['ret_n'] += 1
+        delta = r - series['ret_mean']
+        series['ret_mean'] += delta / series['ret_n']
+        series['ret_m2'] += delta * (r - series['ret_mean'])
+        ex = r - series['rf_per']
+        if ex < 0:
+            series['down_n'] += 1
+            delta = ex - series['down_mean']
+            series['down_mean'] += delta / series['down_n']
+            series['down_m2'] += delta * (ex - series['down_mean'])
+    if v > series['peak']:
+        series['peak'] = v
+    if series['peak']:
+        series['max_dd'] = min(series['max_dd'], (v - series['peak']) / series['peak'])
+    if v > 0:
+        series['pos_sum'] += v
+        series['pos_n'] += 1
+    series['last'] = v
+    series['n'] += 1
+
+    recent = series['recent']
+    recent.append(v)
+    if len(recent) >= series['capacity'] + BUCKET_SIZE:
+        start = series['n'] - len(recent)
+        series['buckets'].append(_bucket(start, recent[:BUCKET_SIZE]))
+        del recent[:BUCKET_SIZE]
+        buckets = series['buckets']
+        if len(buckets) > series['max_buckets']:
+            merged = [_merge(buckets[i], buckets[i + 1]) for i in range(0, len(buckets) - 1, 2)]
+            if len(buckets) % 2:
+                merged.append(buckets[-1])
+            series['buckets'] = merged
+
+
+def points(series: Union[Dict, List]) -> List[List]:
+    """
+    [index, value] points for a chart: bucket points of the older history,
+    then the recent values.
+    """
+    if isinstance(series, list):
+        return [[i, v] for i, v in enumerate(series)]
+    out = []
+    for b in series['buckets']:
+        seen = set()
+        for i, v in sorted([(b[0], b[1]), (b[2], b[3]), (b[4], b[5]), (b[6], b[7])]):
+            if i not in seen:
+                seen.add(i)
+                out.append([i, v])
+    start = series['n'] - len(series['recent'])
+    out.extend([start + i, v] for i, v in enumerate(series['recent']))
+    return out
+
+
+def values(series: Union[Dict, List]) -> List[float]:
+    return [v for _, v in points(series)]
+
+
+def first_last(series: Union[Dict, List]):
+    if isinstance(series, list):
+        return (series[0], series[-1]) if series else (None, None)
+    return series['first'], series['last']
+
+
+def series_metrics(series: Union[Dict, List], trades=None, periods_per_year: Optional[int] = None) -> Dict:
+    """
+    max_dd, sharpe, sortino and turnover of the whole series from the running
+    aggregates, computed like summarize_round (rf as given to new_series).
+    """
+    if isinstance(series, list):
+        return {}
+    max_dd = series['max_dd'] if series['n'] >= 2 else 0.0
+    sharpe = sortino = 0.0
+    if series['ret_n'] >= 2:
+        mean_ex = series['ret_mean'] - series['rf_per']
+        var = series['ret_m2'] / (series['ret_n'] - 1)
+        std = math.sqrt(var) if var > 0 else 0.0
+        d_var = series['down_m2'] / (series['down_n'] - 1) if series['down_n'] > 1 else 0.0
+        d_std = math.sqrt(d_var) if d_var > 0 else 0.0
+        sharpe = mean_ex / std if std > 0 else 0.0
+        sortino = mean_ex / d_std if d_std > 0 else 0.0
+        if periods_per_year and periods_per_year > 0:
+            sharpe *= math.sqrt(float(periods_per_year))
+            sortino *= math.sqrt(float(periods_per_year))
+    avg_value = series['pos_sum'] / series['pos_n'] if series['pos_n'] else 0.0
+    return dict(
+        max_dd=round(max_dd, 6),
+        sharpe=round(sharpe if math.isfinite(sharpe) else 0.0, 6),
+        sortino=round(sortino if math.isfinite(sortino) else 0.0, 6),
+        turnover=round(compute_turnover(trades_for_metrics(trades), [avg_value]), 6),
+    )
+
+
+def new_trades(capacity: int = DEFAULT_CAPACITY, max_prices: int = DEFAULT_MAX_PRICES) -> Dict:
+    return dict(capacity=max(int(capacity), 0), max_prices=max(int(max_prices), 1), recent=[], by_price={}, n=0)
+
+
+def _price_entry(price: str, acc: List) -> List:
+    # [count, abs_qty, notional]; logs written before the notional was kept have two items
+    if len(acc) < 3:
+        acc = [acc[0], acc[1], acc[1] * float(price)]
+    return acc
+
+
+def _merge_prices(by_price: Dict) -> Dict:
+    """
+    Halve the number of price entries: merge each pair of neighbouring
+    prices into one entry at their quantity-weighted price.
+    """
+    entries = sorted((float(price), _price_entry(price, acc)) for price, acc in by_price.items())
+    merged = {}
+    for i in range(0, len(entries), 2):
+        pair = [acc for _, acc in entries[i:i + 2]]
+        count, qty, notional = (sum(values) for values in zip(*pair))
+        price = notional / qty if qty else entries[i][0]
+        acc = merged.setdefault(repr(round(price, 6)), [0, 0.0, 0.0])
+        acc[0] += count
+        acc[1] += qty
+        acc[2] += notional
+    return merged
+
+
+def add_trade(trades: Union[Dict, List], qty: float, price: float, side: str, ts):
+    """
+    Log one executed trade.
+    """
+    trade = {'qty': qty, 'price': price, 'side': side, 'ts': ts}
+    if isinstance(trades, list):
+        trades.append(trade)
+        return
+    if not qty:
+        return
+    # text keys, so the log survives JSON (see the ephemeral rounds in models.py)
+    key = repr(round(float(price), 6))
+    by_price = trades['by_price']
+    acc = by_price[key] = _price_entry(key, by_price.get(key, [0, 0.0, 0.0]))
+    acc[0] += 1
+    acc[1] += abs(float(qty))
+    acc[2] += abs(float(qty)) * float(price)
+    if len(by_price) > trades.get('max_prices', DEFAULT_MAX_PRICES):
+        trades['by_price'] = _merge_prices(by_price)
+    trades['n'] += 1
+    trades['recent'].append(trade)
+    if len(trades['recent']) > trades['capacity']:
+        del trades['recent'][0]
+
+
+def recent_trades(trades: Union[Dict, List, None]) -> List[Dict]:
+    if not trades:
+        return []
+    return trades if isinstance(trades, list) else list(trades['recent'])
+
+
+def trades_for_metrics(trades: Union[Dict, List, None]) -> List[Dict]:
+    """
+    Trades for summarize_round: the list itself, or one trade per price entry
+    with the total quantity, its average price and the number of trades
+    ('count').
+    """
+    if not trades:
+        return []
+    if isinstance(trades, list):
+        return trades
+    rows = []
+    for price, acc in trades['by_price'].items():
+        count, qty, notional = _price_entry(price, acc)
+        rows.append({'qty': qty, 'price': notional / qty if qty else float(price), 'count': count})
+    return rows
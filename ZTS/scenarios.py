@@ -0,0 +1,196 @@
+# ZTS/scenarios.py
+# ---------------------------------
+# Seeded procedural price paths for ZTS rounds.
+# An entry of the 'timeseries_filename' session config list may be a spec
+# (JSON object) instead of a CSV filename, e.g.
+#
+#   timeseries_filename='["demo_1.csv",
+#                         {"model": "gbm", "length": 250, "seed": 7,
+#                          "params": {"mu": 0.05, "sigma": 0.3}},
+#                         {"model": "jump_diffusion", "length": 250, "seed": 7,
+#                          "paths": 500, "path": 12}]'
+#
+# Supported models:
+#   - gbm:              mu, sigma
+#   - jump_diffusion:   mu, sigma, jump_intensity, jump_mean, jump_std (Merton)
+#   - regime_switching: regimes=[{mu, sigma}, ...], switch_prob or transition matrix
+# Common keys: length (days), seed, start (first price), dt (default 1/252),
+# decimals (default 2), name (asset name), paths/path (pick one path of a batch).
+#
+# Paths of a spec are generated together (vectorized over paths) and cached by
+# the content hash of the normalised spec, so any number of rounds referencing
+# the same batch cost one generation and no disk access.
+
+from functools import lru_cache
+from typing import Dict, List, Tuple
+import hashlib
+import json
+
+import numpy as np
+
+from .utils_metrics import reference_stats
+
+
+MODELS = ('gbm', 'jump_diffusion', 'regime_switching')
+
+DEFAULT_PARAMS = {
+    'gbm': dict(mu=0.0, sigma=0.2),
+    'jump_diffusion': dict(mu=0.0, sigma=0.2, jump_intensity=5.0, jump_mean=-0.02, jump_std=0.05),
+    'regime_switching': dict(
+        regimes=[dict(mu=0.1, sigma=0.15), dict(mu=-0.2, sigma=0.4)],
+        switch_prob=0.02,
+    ),
+}
+
+# how many generated batches are kept in memory
+CACHE_SIZE = 256
+
+
+def is_spec(entry) -> bool:
+    """
+    True if a 'timeseries_filename' entry is a generator spec rather than a file name.
+    """
+    return isinstance(entry, dict)
+
+
+def normalize_spec(spec: Dict) -> Dict:
+    """
+    Validate a spec and fill in defaults, so equal scenarios hash equally.
+    The 'path' selector is kept apart: it picks a row of the batch, it does not
+    change the batch itself.
+    """
+    model = spec.get('model', 'gbm')
+    if model not in MODELS:
+        raise ValueError('Unknown scenario model {!r}, expected one of {}'.format(model, MODELS))
+    length = int(spec.get('length', 250))
+    if length < 2:
+        raise ValueError('Scenario length must be at least 2 days!')
+    n_paths = int(spec.get('paths', 1))
+    path = int(spec.get('path', 0))
+    if not 0 <= path < n_paths:
+        raise ValueError('Scenario path {} out of range for {} paths'.format(path, n_paths))
+
+    params = dict(DEFAULT_PARAMS[model])
+    params.update(spec.get('params', {}))
+    return dict(
+        model=model,
+        params=params,
+        length=length,
+        seed=int(spec.get('seed', 0)),
+        start=float(spec.get('start', 100.0)),
+        dt=float(spec.get('dt', 1.0 / 252)),
+        decimals=int(spec.get('decimals', 2)),
+        paths=n_paths,
+    )
+
+
+def _canonical(spec: Dict) -> str:
+    return json.dumps(normalize_spec(spec), sort_keys=True, separators=(',', ':'))
+
+
+def spec_hash(spec: Dict) -> str:
+    """
+    Content hash of the normalised spec (without the 'path' selector).
+    """
+    return hashlib.sha256(_canonical(spec).encode()).hexdigest()
+
+
+def _log_returns_gbm(rng, n_paths, n_steps, dt, mu, sigma):
+    z = rng.standard_normal((n_paths, n_steps))
+    return (mu - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * z
+
+
+def _log_returns_jump_diffusion(rng, n_paths, n_steps, dt, mu, sigma, jump_intensity, jump_mean, jump_std):
+    diffusion = _log_returns_gbm(rng, n_paths, n_steps, dt, mu, sigma)
+    n_jumps = rng.poisson(jump_intensity * dt, size=(n_paths, n_steps))
+    # sum of n iid normal jumps ~ N(n * mean, n * std^2)
+    jumps = n_jumps * jump_mean + np.sqrt(n_jumps) * jump_std * rng.standard_normal((n_paths, n_steps))
+    return diffusion + jumps
+
+
+def _log_returns_regime_switching(rng, n_paths, n_steps, dt, regimes, switch_prob=None, transition=None):
+    mus = np.array([float(r['mu']) for r in regimes])
+    sigmas = np.array([float(r['sigma']) for r in regimes])
+    k = len(regimes)
+    if transition is None:
+        p = float(switch_prob)
+        transition = np.full((k, k), p / (k - 1) if k > 1 else 0.0)
+        np.fill_diagonal(transition, 1.0 - p if k > 1 else 1.0)
+    cum_transition = np.cumsum(np.asarray(transition, dtype=float), axis=1)
+
+    # the regime chain is sequential in time, but every step is vectorized over paths
+    u = rng.random((n_paths, n_steps))
+    states = np.empty((n_paths, n_steps), dtype=np.int64)
+    state = np.zeros(n_paths, dtype=np.int64)
+    for t in range(n_steps):
+        state = np.minimum((u[:, t, None] > cum_transition[state]).sum(axis=1), k - 1)
+        states[:, t] = state
+
+    z = rng.standard_normal((n_paths, n_steps))
+    mu, sigma = mus[states], sigmas[states]
+    return (mu - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * z
+
+
+_GENERATORS = {
+    'gbm': _log_returns_gbm,
+    'jump_diffusion': _log_returns_jump_diffusion,
+    'regime_switching': _log_returns_regime_switching,
+}
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _generate_cached(canonical: str) -> np.ndarray:
+    spec = json.loads(canonical)
+    rng = np.random.default_rng(spec['seed'])
+    log_returns = _GENERATORS[spec['model']](
+        rng, spec['paths'], spec['length'] - 1, spec['dt'], **spec['params']
+    )
+    paths = np.empty((spec['paths'], spec['length']))
+    paths[:, 0] = 0.0
+    np.cumsum(log_returns, axis=1, out=paths[:, 1:])
+    paths = np.round(spec['start'] * np.exp(paths), spec['decimals'])
+    paths.flags.writeable = False
+    return paths
+
+
+def generate_paths(spec: Dict) -> np.ndarray:
+    """
+    All price paths of a spec as a read-only (paths, length) array.
+    Generated once per content hash and served from memory afterwards.
+    """
+    return _generate_cached(_canonical(spec))
+
+
+@lru_cache(maxsize=CACHE_SIZE * 16)
+def _scenario_cached(canonical: str, path: int, name: str) -> Tuple[str, List[float], List[str]]:
+    prices = _generate_cached(canonical)[path].tolist()
+    return name, prices, [''] * len(prices)
+
+
+def load_scenario(spec: Dict) -> Tuple[str, List[float], List[str]]:
+    """
+    Scenario of a spec in the shape of Subsession.get_timeseries_values():
+    (asset_name, prices, news). Generated scenarios have no news.
+    The returned lists are cached and shared; do not modify them.
+    """
+    canonical = _canonical(spec)
+    path = int(spec.get('path', 0))
+    name = spec.get('name')
+    if not name:
+        name = '{}_{}'.format(spec.get('model', 'gbm'), hashlib.sha256(canonical.encode()).hexdigest()[:8])
+        if int(spec.get('paths', 1)) > 1:
+            name += '_{}'.format(path)
+    return _scenario_cached(canonical, path, name)
+
+
+@lru_cache(maxsize=CACHE_SIZE * 16)
+def _reference_cached(canonical: str, path: int) -> Dict:
+    return reference_stats(_generate_cached(canonical)[path].tolist())
+
+
+def scenario_reference_stats(spec: Dict) -> Dict:
+    """
+    Reference statistics (utils_metrics.reference_stats) of the selected path,
+    computed once and cached with the generated batch. Do not modify the result.
+    """
+    return _reference_cached(_canonical(spec), int(spec.get('path', 0)))
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from . import analysis
+from .analysis import bootstrap_difference, compare_arms, format_results, participant_means
+
+
+def summary(arm, code, roi, training=False):
+    return dict(arm=arm, participant=code, is_training_round=training, roi=roi)
+
+
+def test_participant_means():
+    rows = [
+        summary('treatment', 'a', 0.2), summary('treatment', 'a', 0.4), summary('treatment', 'a', 9.0, training=True),
+        summary('treatment', 'b', float('nan')), summary('control', 'c', None), summary('control', 'd', -0.1),
+        # RoundSummary rows work as well
+        SimpleNamespace(arm='control', participant=SimpleNamespace(code='d'), is_training_round=False, roi=0.3),
+    ]
+    assert participant_means(rows, 'roi') == {'treatment': {'a': pytest.approx(0.3)}, 'control': {'d': pytest.approx(0.1)}}
+    assert participant_means(rows, 'roi', include_training=True)['treatment']['a'] == pytest.approx(3.2)
+
+
+def test_bootstrap_interval():
+    rng = np.random.default_rng(1)
+    treatment = rng.normal(1.0, 1.0, 60)
+    control = rng.normal(0.0, 1.0, 60)
+    r = bootstrap_difference(treatment, control, n_resamples=4000, seed=3)
+    assert r['estimate'] == pytest.approx(treatment.mean() - control.mean())
+    assert 0 < r['ci_low'] < r['estimate'] < r['ci_high']
+    assert r['p_value'] < 0.01
+    # close to the normal approximation of the standard error
+    assert r['se'] == pytest.approx(np.sqrt(treatment.var() / 60 + control.var() / 60), rel=0.1)
+
+    same = bootstrap_difference(control, control, n_resamples=4000, seed=3)
+    assert same['ci_low'] < 0 < same['ci_high'] and same['p_value'] > 0.5
+
+
+def test_bootstrap_is_reproducible_for_any_number_of_workers(monkeypatch):
+    # small chunks, so the two workers really split the resamples
+    monkeypatch.setattr(analysis, 'CHUNK_RESAMPLES', 500)
+    treatment, control = [0.1, 0.4, 0.3, 0.8], [0.0, 0.2, -0.1]
+    one = bootstrap_difference(treatment, control, n_resamples=1200, seed=7, workers=1)
+    two = bootstrap_difference(treatment, control, n_resamples=1200, seed=7, workers=2)
+    assert one == two
+    assert bootstrap_difference(treatment, control, n_resamples=1200, seed=8, workers=1) != one
+
+
+def test_empty_arm_and_results_table():
+    r = bootstrap_difference([], [1.0, 2.0])
+    assert (r['n_treatment'], r['n_control'], r['estimate'], r['ci_low']) == (0, 2, None, None)
+
+    rows = [summary('treatment', 'a', 0.2), summary('treatment', 'b', 0.3), summary('control', 'c', 0.1)]
+    results = compare_arms(rows, metrics=('roi',), n_resamples=100)
+    table = format_results(results)
+    assert table[0][0] == 'metric' and table[1][:3] == ['roi', 2, 1]
+    assert table[1][3] == pytest.approx(0.15)
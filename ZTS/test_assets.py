@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from . import assets
+
+
+@pytest.fixture(autouse=True)
+def static_dir(tmp_path, monkeypatch):
+    (tmp_path / 'ZTS').mkdir()
+    for name, text in (('a.js', 'var a = 1;'), ('b.js', 'var b = 2;')):
+        (tmp_path / 'ZTS' / name).write_text(text)
+    monkeypatch.setattr(assets, 'STATIC_DIR', str(tmp_path))
+    monkeypatch.setattr(assets, 'BUNDLES', {'test': ('ZTS/a.js', 'ZTS/b.js')})
+    assets._build.cache_clear()
+    assets._failed.clear()
+    yield tmp_path
+    assets._build.cache_clear()
+
+
+def change(static_dir, text, mtime):
+    path = static_dir / 'ZTS' / 'b.js'
+    path.write_text(text)
+    os.utime(str(path), (mtime, mtime))
+
+
+def bundle_files(static_dir):
+    return sorted(os.listdir(str(static_dir / 'ZTS' / 'bundles')))
+
+
+def test_bundle_concatenates_in_order_and_fingerprints_the_content(static_dir):
+    fingerprint, content = assets.bundle('test')
+    assert content.index(b'var a = 1;') < content.index(b'var b = 2;')
+    assert assets.bundle('test') == (fingerprint, content)
+    change(static_dir, 'var b = 3;', 1000)
+    assert assets.bundle('test')[0] != fingerprint
+
+
+def test_emit_keeps_the_previous_version(static_dir):
+    first = assets.emit('test')
+    assert (static_dir / first).read_bytes() == assets.bundle('test')[1]
+    assert assets.emit('test') == first
+    os.utime(str(static_dir / first), (1000, 1000))
+
+    change(static_dir, 'var b = 3;', 2000)
+    second = assets.emit('test')
+    os.utime(str(static_dir / second), (2000, 2000))
+    assert bundle_files(static_dir) == sorted(os.path.basename(p) for p in (first, second))
+
+    change(static_dir, 'var b = 4;', 3000)
+    third = assets.emit('test')
+    # the previous version stays for pages rendered before the change, older ones go
+    assert bundle_files(static_dir) == sorted(os.path.basename(p) for p in (second, third))
+
+
+def test_static_path_falls_back_to_the_single_scripts(static_dir, caplog):
+    (static_dir / 'ZTS' / 'b.js').unlink()
+    with caplog.at_level('ERROR', logger='ZTS.assets'):
+        assert assets.static_path('test') is None
+        assert assets.static_path('test') is None
+    # logged once
+    assert len(caplog.records) == 1
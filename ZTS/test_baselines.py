@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from . import baselines
+
+
+def test_execute_partial_buy_spends_all_cash():
+    # agents: can afford 2 of 3 clicks, cannot afford one click, exact cash, no cash
+    cash = np.array([50.0, 100.0, 60.0, 0.0])
+    shares = np.zeros(4)
+    traded = baselines.execute(cash, shares, 10.0, np.array([3.0, 1.0, 3.0, 1.0]), np.array([2.0, 20.0, 2.0, 2.0]))
+    # 2 full clicks + 1 share with the rest; 10 of the 20 shares of the click; all 3 clicks
+    assert traded.tolist() == [5.0, 10.0, 6.0, 0.0]
+    assert shares.tolist() == [5.0, 10.0, 6.0, 0.0]
+    assert cash.tolist() == [0.0, 0.0, 0.0, 0.0]
+
+
+def test_execute_partial_buy_leaves_cash_zero_not_the_remainder():
+    # 100 buys 3 shares at 30; the 10 left are dropped, as in buy_shares
+    cash, shares = np.array([100.0]), np.array([0.0])
+    baselines.execute(cash, shares, 30.0, np.array([1.0]), 5)
+    assert (cash[0], shares[0]) == (0.0, 3.0)
+
+
+def test_execute_sell_over_holdings_sells_the_rest():
+    cash = np.zeros(4)
+    shares = np.array([3.0, 5.0, 5.0, 0.0])
+    traded = baselines.execute(cash, shares, 10.0, np.array([-1.0, -2.0, -3.0, -1.0]), 2)
+    # one click of 2 over 3 shares: 2; two clicks of 2 over 5: 4; three clicks over 5: all 5
+    assert traded.tolist() == [-2.0, -4.0, -5.0, 0.0]
+    assert shares.tolist() == [1.0, 1.0, 0.0, 0.0]
+    assert cash.tolist() == [20.0, 40.0, 50.0, 0.0]
+
+    cash, shares = np.array([0.0]), np.array([3.0])
+    assert baselines.execute(cash, shares, 10.0, np.array([-1.0]), 10).tolist() == [-3.0]
+    assert (cash[0], shares[0]) == (30.0, 0.0)
+
+
+@pytest.fixture
+def scenario_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    for i in range(2):
+        prices = np.round(20 * np.cumprod(1 + rng.normal(0, 0.03, 40)), 2)
+        lines = ['date,price,news'] + ['{},{},{}'.format(d, p, 'Target 21.5' if d == 5 else '')
+                                       for d, p in enumerate(prices)]
+        (tmp_path / 'scenario_{}.csv'.format(i)).write_text('\n'.join(lines) + '\n')
+    return str(tmp_path)
+
+
+def test_sweep_does_not_depend_on_the_workers(scenario_dir):
+    kwargs = dict(cash=1000, shares=10, agents=12, seed=3)
+    serial = baselines.sweep(scenario_dir, workers=1, **kwargs)
+    assert len(serial) == 2 * len(baselines.STRATEGIES)
+    assert baselines.sweep(scenario_dir, workers=2, **kwargs) == serial
+    # the random strategy follows the seed
+    random_payoffs = lambda results: [r['payoff'] for r in results if r['strategy'] == 'random']
+    assert random_payoffs(baselines.sweep(scenario_dir, workers=1, **dict(kwargs, seed=4))) != \
+        random_payoffs(serial)
+
+
+def test_buy_and_hold_spends_all_cash_on_day_1(scenario_dir):
+    prices, news = baselines.read_scenario(scenario_dir + '/scenario_0.csv')
+    played = baselines.play('buy_and_hold', prices, news, 1000, 10, (1, 10, 20), 1)
+    held = 10 + int(1000 // prices[1])
+    assert played['traded'][1, 0] == held - 10
+    assert played['values'][-1, 0] == pytest.approx(held * prices[-1])
+
+
+def test_expected_payouts():
+    def row(scenario, strategy, mean):
+        return dict(scenario=scenario, strategy=strategy, payoff=dict(mean=mean))
+
+    results = [row('a.csv', 'momentum', 1000.0), row('b.csv', 'momentum', 1200.0), row('a.csv', 'random', 900.0)]
+    payouts = baselines.expected_payouts(results, real_world_currency_per_point=0.01, participation_fee=2.0)
+    assert payouts['momentum'] == dict(points=1100.0, currency=pytest.approx(13.0),
+                                       per_scenario={'a.csv': 1000.0, 'b.csv': 1200.0})
+    assert payouts['random']['points'] == 900.0
+    assert payouts['random']['currency'] == pytest.approx(11.0)
+    assert baselines.expected_payouts([]) == {}
@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+
+import pytest
+
+from . import exports
+
+
+@pytest.fixture(autouse=True)
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, 'EXPORT_DIR', str(tmp_path))
+    # small chunks, so a task writes its part file in several chunks
+    monkeypatch.setattr(exports, 'CHUNK_ROWS', 3)
+    return tmp_path
+
+
+def wait(name):
+    deadline = time.monotonic() + 10
+    while exports.status(name)['status'] not in (exports.DONE, exports.FAILED) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return exports.status(name)
+
+
+def round_rows(task):
+    round_number, n = task
+    for i in range(n):
+        yield [round_number, i, 0.5 * i, '' if i % 2 else 'x', None]
+
+
+def test_parts_are_joined_in_task_order(export_dir):
+    tasks = [(1, 7), (2, 0), (3, 4)]
+    exports.start('ok', ['round', 'i', 'value', 'text', 'empty'], tasks, round_rows)
+    st = wait('ok')
+    assert (st['status'], st['rows'], st['tasks_done'], st['progress']) == (exports.DONE, 11, 3, 1.0)
+
+    expected = [row for task in tasks for row in round_rows(task)]
+    path = exports.finished_artifact('ok')
+    assert list(exports.read_rows(path, [int, int, float, str, float])) == expected
+    # untyped: the csv text
+    assert next(exports.read_rows(path)) == ['1', '0', '0.0', 'x', '']
+    # only the artifact is left, no part files or work directories
+    assert os.listdir(str(export_dir)) == ['ok.csv']
+
+
+def test_a_failed_task_keeps_the_previous_artifact(export_dir):
+    exports.start('job', ['round', 'i', 'value', 'text', 'empty'], [(1, 2)], round_rows)
+    assert wait('job')['status'] == exports.DONE
+    before = (export_dir / 'job.csv').read_text()
+
+    def failing(task):
+        if task[0] == 2:
+            raise RuntimeError('lost connection')
+        return round_rows(task)
+
+    exports.start('job', ['round', 'i', 'value', 'text', 'empty'], [(1, 5), (2, 5)], failing)
+    st = wait('job')
+    assert st['status'] == exports.FAILED and 'lost connection' in st['error']
+    assert (export_dir / 'job.csv').read_text() == before
+    assert exports.finished_artifact('job') is None
+    assert os.listdir(str(export_dir)) == ['job.csv']
+
+
+def test_artifact_is_replaced_only_when_complete(export_dir):
+    exports.start('swap', ['round', 'i', 'value', 'text', 'empty'], [(1, 1)], round_rows)
+    wait('swap')
+    release = threading.Event()
+
+    def slow(task):
+        yield from round_rows(task)
+        release.wait(10)
+
+    exports.start('swap', ['round', 'i', 'value', 'text', 'empty'], [(1, 6)], slow)
+    # while the job runs the old file is untouched, and custom_export does not read it
+    assert len(list(exports.read_rows(str(export_dir / 'swap.csv')))) == 1
+    assert exports.finished_artifact('swap') is None
+    # a second start joins the running job
+    assert exports.start('swap', [], [], round_rows) is exports.get_job('swap')
+    release.set()
+    assert wait('swap')['status'] == exports.DONE
+    assert len(list(exports.read_rows(exports.finished_artifact('swap')))) == 6
+
+
+def test_cacheable_job_reuses_the_artifact():
+    exports.start('cached', ['round', 'i', 'value', 'text', 'empty'], [(1, 2)], round_rows)
+    wait('cached')
+
+    def never(task):
+        raise AssertionError('exported again')
+
+    job = exports.start('cached', ['round', 'i', 'value', 'text', 'empty'], [(1, 2)], never, cacheable=True)
+    assert job.status == exports.DONE and job.cached
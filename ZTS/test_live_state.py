@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+
+from .live_state import LocalLiveStore, get_report_state, record_report, state_key
+
+
+def player(round_number=1):
+    return SimpleNamespace(round_number=round_number, session=SimpleNamespace(code='ls_test'),
+                           participant=SimpleNamespace(code='p1'))
+
+
+def report(seq, action='Update', cash=100.0, shares=2, ts=None):
+    return dict(action=action, client_seq=seq, client_ts_ms=1000 + seq if ts is None else ts,
+                cash=cash, owned_shares=shares)
+
+
+def test_update_returns_the_result_and_stores_json():
+    store = LocalLiveStore()
+    assert store.get('k') is None
+
+    def apply(state):
+        state['n'] = state.get('n', 0) + 1
+        return 'ok'
+
+    assert store.update('k', apply) == 'ok'
+    store.update('k', apply)
+    assert store.get('k') == {'n': 2}
+    # get() hands out a copy
+    store.get('k')['n'] = 99
+    assert store.get('k') == {'n': 2}
+    # stored as JSON like in Redis: number keys come back as text
+    store.update('k', lambda state: state.update({7: 'day'}))
+    assert store.get('k') == {'n': 2, '7': 'day'}
+    store.delete('k')
+    store.delete('k')
+    assert store.get('k') is None
+
+
+def test_record_report_ignores_resent_messages():
+    store = LocalLiveStore()
+    p = player()
+    assert record_report(p, report(1, 'Start'), store)
+    assert record_report(p, report(2, cash=90.0, shares=3), store)
+    # a resend after a reconnect repeats a seen client_seq and send time
+    assert not record_report(p, report(2, cash=0.0), store)
+    assert not record_report(p, report(1, 'Start'), store)
+    # messages without a client_seq are always taken
+    assert record_report(p, dict(action='Update'), store)
+
+    state = get_report_state(p, store)
+    assert (state['last_seq'], state['messages'], state['cash'], state['shares']) == (2, 3, 90.0, 3.0)
+    assert store.get(state_key('report', 'ls_test', 'p1')) == state
+
+
+def test_record_report_takes_a_restarted_counter(caplog):
+    store = LocalLiveStore()
+    p = player()
+    for seq in range(1, 6):
+        record_report(p, report(seq, 'Start' if seq == 1 else 'Update'), store)
+    # the participant continues in a new tab: its counter starts at 1 again
+    with caplog.at_level('WARNING', logger='ZTS.live_state'):
+        assert record_report(p, report(1, cash=50.0, ts=9001), store)
+    assert 'went back from 5 to 1' in caplog.text
+    assert record_report(p, report(2, ts=9002), store)
+    assert record_report(p, report(3, 'End', cash=70.0, ts=9003), store)
+    # and its resends are still recognized
+    assert not record_report(p, report(3, 'End', ts=9003), store)
+
+    state = get_report_state(p, store)
+    assert (state['last_seq'], state['messages'], state['restarts'], state['cash']) == (3, 8, 1, 70.0)
+
+
+def test_record_report_starts_over_each_round():
+    store = LocalLiveStore()
+    record_report(player(1), report(5, 'Start'), store)
+    record_report(player(1), report(6), store)
+    # the browser numbers the reports of a new round from 1 again
+    assert record_report(player(2), report(1, 'Start'), store)
+    state = get_report_state(player(2), store)
+    assert (state['round'], state['last_seq'], state['messages']) == (2, 1, 1)
+    # and so does a reload that sends 'Start' again
+    assert record_report(player(2), report(1, 'Start', ts=5000), store)
+    assert get_report_state(player(2), store)['messages'] == 1
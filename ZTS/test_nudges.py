@@ -0,0 +1,95 @@
+from .nudges import DEFAULT_RULES, LocalNudgeService, arm_of, in_treatment
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+ALWAYS = dict(id='always', event='any', feature='roi', op='>=', threshold=-1.0, text='always', bias_tag='Test')
+
+
+def body(cond=1, round_number=1, event_type='update', pid='p1', **features):
+    features.setdefault('portfolio_value', 1000.0)
+    return dict(pid=pid, cond=cond, round=round_number, event_type=event_type, features=features)
+
+
+def test_state_is_kept_per_session():
+    service = LocalNudgeService(rules=[ALWAYS], cooldown_s=60)
+    assert service.post(dict(body(), session='s1'))
+    assert service.post(dict(body(), session='s1')) == {}
+    # the same participant code in another session has a state of its own
+    assert service.post(dict(body(), session='s2'))
+    assert service.engine.store.get('nudge:s1:p1')['n_nudges'] == 1
+    assert service.engine.features('s2', 'p1')['trade_count'] == 0
+
+
+def test_arm_gating():
+    assert in_treatment(1) and in_treatment('1')
+    assert in_treatment('', arm='treatment')
+    assert not in_treatment(0) and not in_treatment('', arm='control') and not in_treatment(None)
+
+    # the arm stored with the round summaries follows the same rule
+    assert arm_of(1) == arm_of('1', arm='control') == arm_of('', arm='treatment') == 'treatment'
+    assert arm_of('0') == arm_of(0) == arm_of(None, arm='control') == 'control'
+    assert arm_of(None) == arm_of('', arm='') == ''
+
+    service = LocalNudgeService(rules=[ALWAYS], cooldown_s=0)
+    assert service.post(body(cond=0)) == {}
+    assert service.post(dict(body(cond=0), arm='treatment'))['nudge_text'] == 'always'
+    assert service.post(body(cond=1, pid='p2'))['rule'] == 'always'
+    assert len(service.requests) == 3
+
+
+def test_player_cooldown():
+    clock = Clock()
+    service = LocalNudgeService(rules=[ALWAYS], clock=clock, cooldown_s=30, max_per_round=10)
+    assert service.post(body())
+    clock.now += 29
+    assert service.post(body()) == {}
+    clock.now += 1
+    assert service.post(body())
+    # the cooldown is per participant
+    assert service.post(body(pid='p2'))
+
+
+def test_rule_cooldown():
+    clock = Clock()
+    other = dict(ALWAYS, id='other', text='other')
+    service = LocalNudgeService(rules=[dict(ALWAYS, cooldown_s=100), other], clock=clock, cooldown_s=0)
+    assert service.post(body())['rule'] == 'always'
+    # the first rule waits for its own cooldown, the next one fires instead
+    clock.now += 10
+    assert service.post(body())['rule'] == 'other'
+    clock.now += 90
+    assert service.post(body())['rule'] == 'always'
+
+
+def test_max_per_round():
+    service = LocalNudgeService(rules=[ALWAYS], clock=Clock(), cooldown_s=0, max_per_round=2)
+    assert service.post(body())
+    assert service.post(body())
+    assert service.post(body()) == {}
+    # the cap starts over in the next round
+    assert service.post(body(round_number=2))
+
+
+def test_rule_evaluation():
+    service = LocalNudgeService(clock=Clock(), cooldown_s=0)
+    # a 10% drawdown from the peak fires the drawdown rule
+    assert service.post(body(portfolio_value=1000.0)) == {}
+    assert service.post(body(portfolio_value=950.0)) == {}
+    nudge = service.post(body(portfolio_value=890.0))
+    assert nudge['rule'] == 'drawdown_10' and nudge['bias_tag'] == 'Loss aversion'
+
+    # trade rules only fire on fills, and 'anchor_close' only after min_trades
+    service = LocalNudgeService(rules=[r for r in DEFAULT_RULES if r['id'] == 'anchor_close'],
+                                clock=Clock(), cooldown_s=0)
+    trade = dict(quantity=1, price_per_share=100.0, anchors=[100.0])
+    assert service.post(body(**trade)) == {}
+    assert service.post(body(event_type='orderFilled', **trade)) == {}
+    assert service.post(body(event_type='orderFilled', **trade)) == {}
+    assert service.post(body(event_type='orderFilled', **trade))['rule'] == 'anchor_close'
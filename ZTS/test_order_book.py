@@ -0,0 +1,99 @@
+import pytest
+
+from .order_book import BUY, SELL, OrderBook
+
+
+def test_price_time_priority_at_the_resting_price():
+    book = OrderBook()
+    book.submit(1, SELL, 11.0, 5)
+    book.submit(2, SELL, 10.0, 5)
+    book.submit(3, SELL, 10.0, 5)
+    order, fills = book.submit(4, BUY, 11.0, 12)
+    # best price first, then the older order of that price
+    assert [(f.seller, f.price, f.quantity) for f in fills] == [(2, 10.0, 5), (3, 10.0, 5), (1, 11.0, 2)]
+    assert all(f.buyer == 4 and f.aggressor == 4 for f in fills)
+    assert order.remaining == 0 and not order.active
+    assert book.top() == dict(bids=[], asks=[[11.0, 3]])
+
+
+def test_partial_fill_rests_the_remainder():
+    book = OrderBook()
+    book.submit(1, BUY, 9.0, 4)
+    order, fills = book.submit(2, SELL, 8.0, 10)
+    assert [(f.buyer, f.seller, f.price, f.quantity) for f in fills] == [(1, 2, 9.0, 4)]
+    assert order.active and order.remaining == 6
+    assert book.top() == dict(bids=[], asks=[[8.0, 6]])
+    # only the open rest stays reserved
+    assert book.available(2, 0.0, 10) == (0.0, 4)
+    assert book.available(1, 100.0, 0) == (100.0, 0)
+
+
+def test_no_match_when_prices_do_not_cross():
+    book = OrderBook()
+    book.submit(1, BUY, 9.0, 4)
+    _, fills = book.submit(2, SELL, 9.5, 4)
+    assert fills == []
+    assert book.top() == dict(bids=[[9.0, 4]], asks=[[9.5, 4]])
+
+
+def test_cancel_releases_the_reservation():
+    book = OrderBook()
+    order, _ = book.submit(1, BUY, 10.0, 5, cash=100.0, shares=0)
+    assert book.available(1, 100.0, 0) == (50.0, 0)
+    # another player cannot cancel it
+    assert book.cancel(order.order_id, player_id=2) is None
+    assert book.cancel(order.order_id, player_id=1) is order
+    assert book.available(1, 100.0, 0) == (100.0, 0)
+    assert book.top() == dict(bids=[], asks=[])
+    assert book.cancel(order.order_id) is None
+    # the cancelled order is skipped lazily when matching
+    _, fills = book.submit(2, SELL, 5.0, 1)
+    assert fills == []
+
+
+def test_orders_must_be_covered():
+    book = OrderBook()
+    book.submit(1, BUY, 10.0, 5, cash=100.0, shares=0)
+    with pytest.raises(ValueError):
+        book.submit(1, BUY, 10.0, 6, cash=100.0, shares=0)
+    with pytest.raises(ValueError):
+        book.submit(1, SELL, 10.0, 1, cash=100.0, shares=0)
+    with pytest.raises(ValueError):
+        book.submit(1, BUY, 0.0, 1)
+
+
+def test_self_trade_is_rejected():
+    book = OrderBook()
+    book.submit(1, SELL, 10.0, 5)
+    book.submit(2, SELL, 10.5, 5)
+    with pytest.raises(ValueError):
+        book.submit(1, BUY, 11.0, 8)
+    # nothing was matched or rested by the rejected order
+    assert book.top() == dict(bids=[], asks=[[10.0, 5], [10.5, 5]])
+    # below the own ask the player can still bid
+    _, fills = book.submit(1, BUY, 9.0, 1)
+    assert fills == []
+    # and trade with others once the own order is gone
+    book.cancel_all(1)
+    _, fills = book.submit(1, BUY, 11.0, 5)
+    assert [(f.seller, f.price, f.quantity) for f in fills] == [(2, 10.5, 5)]
+
+
+def test_self_trade_check_follows_the_best_own_order():
+    book = OrderBook()
+    low, _ = book.submit(1, SELL, 10.0, 2)
+    book.submit(1, SELL, 12.0, 2)
+    with pytest.raises(ValueError):
+        book.submit(1, BUY, 10.5, 1)
+    # the best own ask is filled by another player: the next one counts
+    book.submit(2, BUY, 10.0, 2)
+    assert not low.active
+    _, fills = book.submit(1, BUY, 11.0, 1)
+    assert fills == []
+    with pytest.raises(ValueError):
+        book.submit(1, SELL, 11.0, 1)
+    # cancelled orders do not count either
+    assert [o.price for o in book.cancel_all(1)] == [12.0, 11.0]
+    assert book.cancel_all(1) == []
+    _, fills = book.submit(1, SELL, 9.0, 1)
+    assert fills == []
@@ -0,0 +1,81 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from . import profiling
+
+
+class Handler:
+    def __init__(self, session_code):
+        self.session = SimpleNamespace(code=session_code)
+        self.calls = 0
+
+    @profiling.profiled
+    def work(self, seconds):
+        self.calls += 1
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            _busy()
+        return 'done'
+
+
+def _busy():
+    return sum(range(100))
+
+
+@pytest.fixture(autouse=True)
+def clean_session():
+    yield
+    profiling.stop('prof_test')
+    profiling.clear('prof_test')
+
+
+def test_no_window_records_nothing():
+    handler = Handler('prof_test')
+    assert handler.work(0.02) == 'done'
+    assert profiling.folded('prof_test') == ''
+    assert profiling.status('prof_test') == dict(active=False, remaining_s=0.0, samples=0, stacks=0)
+
+
+def test_folded_output():
+    handler = Handler('prof_test')
+    assert profiling.start_once('prof_test', 5)
+    assert not profiling.start_once('prof_test', 5)
+    handler.work(0.3)
+
+    lines = profiling.folded('prof_test').splitlines()
+    assert lines
+    counts = []
+    for line in lines:
+        stack, count = line.rsplit(' ', 1)
+        frames = stack.split(';')
+        # rooted at the handler, then the frames below it as 'file:function'
+        assert frames[0] == 'Handler.work'
+        assert all(':' in frame for frame in frames[1:])
+        counts.append(int(count))
+    # most frequent stack first; the counts add up to the status
+    assert counts == sorted(counts, reverse=True)
+    assert sum(counts) == profiling.status('prof_test')['samples']
+    assert any(line.startswith('Handler.work;test_profiling.py:work') for line in lines)
+
+
+def test_other_sessions_are_not_sampled():
+    profiling.start('prof_test', 5)
+    Handler('prof_other').work(0.1)
+    assert profiling.folded('prof_other') == ''
+    assert profiling.folded('prof_test') == ''
+
+
+def test_stopped_window_records_nothing_more():
+    # opened and stopped from the admin report
+    handler = Handler('prof_test')
+    profiling.start('prof_test', 60)
+    handler.work(0.1)
+    profiling.stop('prof_test')
+    # let a sampling pass that was running finish
+    time.sleep(5 * profiling.SAMPLE_INTERVAL_S)
+    samples = profiling.status('prof_test')['samples']
+    assert samples > 0 and not profiling.status('prof_test')['active']
+    handler.work(0.1)
+    assert profiling.status('prof_test')['samples'] == samples
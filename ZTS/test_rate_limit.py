@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from . import rate_limit
+from .baselines import browser_reports
+from .live_state import LocalLiveStore
+from .rate_limit import DROPPED, FULL, THROTTLED, take_token
+from .replay import replay_round
+
+
+PRICES = [10.0, 12.5, 11.0, 13.7, 9.0, 9.5]
+
+
+def test_bucket_allows_a_burst_then_the_rate():
+    store = LocalLiveStore()
+    decisions = [take_token(store, 'k', 'Update', rate=2, burst=3, now=100.0) for _ in range(4)]
+    assert decisions == [FULL, FULL, FULL, DROPPED]
+    # half a second refills one token at 2 per second
+    assert take_token(store, 'k', 'Update', rate=2, burst=3, now=100.5) == FULL
+    assert take_token(store, 'k', 'Update', rate=2, burst=3, now=100.5) == DROPPED
+    # a long pause refills up to the burst only
+    assert [take_token(store, 'k', 'Update', rate=2, burst=3, now=200.0) for _ in range(4)] == \
+        [FULL, FULL, FULL, DROPPED]
+
+
+def test_trades_are_throttled_and_start_end_always_pass():
+    store = LocalLiveStore()
+    assert take_token(store, 'k', 'Buy', rate=1, burst=1, now=0.0) == FULL
+    assert take_token(store, 'k', 'Buy', rate=1, burst=1, now=0.0) == THROTTLED
+    assert take_token(store, 'k', 'Order', rate=1, burst=1, now=0.0) == THROTTLED
+    assert take_token(store, 'k', 'Update', rate=1, burst=1, now=0.0) == DROPPED
+    assert take_token(store, 'k', 'End', rate=1, burst=1, now=0.0) == FULL
+    assert take_token(store, 'k', 'Start', rate=1, burst=1, now=0.0) == FULL
+    # every key has its own bucket
+    assert take_token(store, 'other', 'Update', rate=1, burst=1, now=0.0) == FULL
+
+
+def test_admit_counts_merged_clicks():
+    player = SimpleNamespace(session=SimpleNamespace(code='rl_test', config=dict(live_rate_limit_per_s=0)),
+                             participant=SimpleNamespace(code='p1'))
+    assert rate_limit.admit(player, dict(action='Buy', clicks=3)) == FULL
+    assert rate_limit.admit(player, dict(action='Sell')) == FULL
+    assert rate_limit.stats('rl_test') == {FULL: 2, THROTTLED: 0, DROPPED: 0, 'merged': 2}
+
+
+def test_coalesced_orders_replay_like_single_clicks():
+    # day 2 ends with a partial buy followed by sells of the same day
+    clicks = [(1, 10), (1, 10), (1, -5), (2, 20), (2, 100), (2, -10), (2, -10), (3, 1), (3, -1), (4, -20)]
+    single = browser_reports(PRICES, 1000, 0, clicks)
+    merged = browser_reports(PRICES, 1000, 0, clicks, coalesce=True)
+
+    assert [(r['action'], r['cur_day'], r['quantity'], r.get('clicks')) for r in merged[1:-1]] == [
+        ('Buy', 1, 15, 3), ('Buy', 2, 73, 2), ('Sell', 2, -20, 2), ('Sell', 4, -20, 1),
+    ]
+    # every trading click is counted, the net zero order of day 3 is not sent
+    assert sum(r.get('clicks', 0) for r in merged) == len(single) - 2 - 2
+
+    res_single = replay_round(PRICES, single, 1000, 0)
+    res_merged = replay_round(PRICES, merged, 1000, 0)
+    assert res_single['discrepancies'] == [] and res_merged['discrepancies'] == []
+    np.testing.assert_allclose(res_merged['equity_curve'], res_single['equity_curve'])
+    assert merged[-1]['portfolio_value'] == single[-1]['portfolio_value']
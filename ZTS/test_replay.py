@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from .baselines import browser_reports
+from .replay import new_running, replay_batch, replay_round, running_close, running_step
+
+
+PRICES = [10.0, 12.5, 11.0, 13.7, 9.0, 9.5]
+
+
+def test_partial_buy_matches_browser():
+    # day 2: 750 cash buys 68 of 100 shares, the rest of 2 is dropped;
+    # day 4: 137 cash buys 15 of 20 shares, the rest of 2 is dropped
+    reports = browser_reports(PRICES, 1000, 0, [(1, 20), (2, 100), (3, -10), (4, 20)])
+    assert [(r['action'], r['quantity'], r['cash']) for r in reports[1:-1]] == [
+        ('Buy', 20, 750.0), ('Buy', 68, 0.0), ('Sell', -10, 137.0), ('Buy', 15, 0.0),
+    ]
+    res = replay_round(PRICES, reports, 1000, 0)
+    assert res['discrepancies'] == []
+    np.testing.assert_allclose(res['cash'], [r['cash'] for r in reports])
+    np.testing.assert_allclose(res['shares'], [r['owned_shares'] for r in reports])
+    assert res['final_value'] == pytest.approx(reports[-1]['portfolio_value'])
+    np.testing.assert_allclose(res['equity_curve'], [1000, 1000, 968, 1205.6, 837, 883.5])
+
+
+def test_buy_that_spends_all_cash_is_not_partial():
+    reports = browser_reports([10.0, 10.0, 8.0], 100, 0, [(1, 10), (2, 1)])
+    assert [r['cash'] for r in reports] == [100.0, 0.0, 0.0]
+    res = replay_round([10.0, 10.0, 8.0], reports, 100, 0)
+    assert res['discrepancies'] == []
+    assert res['final_value'] == pytest.approx(80.0)
+
+
+def test_zero_cash_report_without_a_fitting_rest_is_flagged():
+    reports = browser_reports(PRICES, 1000, 0, [(1, 20)])
+    # the browser reported no cash although 750 should be left
+    reports[1]['cash'] = 0.0
+    res = replay_round(PRICES, reports, 1000, 0)
+    fields = {d['field'] for d in res['discrepancies']}
+    assert 'cash' in fields
+    assert res['cash'][1] == pytest.approx(750.0)
+
+
+def test_batch_matches_single_rounds():
+    rounds = [
+        dict(key='a', prices=PRICES, start_cash=1000, start_shares=0,
+             actions=browser_reports(PRICES, 1000, 0, [(1, 100), (2, -5), (5, 100)])),
+        dict(key='b', prices=PRICES[:4], start_cash=50, start_shares=3,
+             actions=browser_reports(PRICES[:4], 50, 3, [(1, 10), (3, -10)])),
+        dict(key='c', prices=PRICES, start_cash=10, start_shares=0, actions=[]),
+    ]
+    batch = replay_batch(rounds)
+    for rnd, res in zip(rounds, batch):
+        single = replay_round(rnd['prices'], rnd['actions'], rnd['start_cash'], rnd['start_shares'])
+        assert res['key'] == rnd['key']
+        assert res['discrepancies'] == single['discrepancies'] == []
+        np.testing.assert_allclose(res['cash'], single['cash'])
+        np.testing.assert_allclose(res['equity_curve'], single['equity_curve'])
+
+
+def test_fill_price_settles_the_trade_and_the_day_price_values_it():
+    prices = [10.0, 12.0, 11.0]
+    # bought 10 at 11.5 on day 1 from another player, sold 4 at 11.2 on day 2
+    actions = [
+        dict(action='Start', quantity=0, cur_day=0, price_per_share=10.0, cash=200.0, owned_shares=0),
+        dict(action='Buy', quantity=10, cur_day=1, fill_price=11.5, price_per_share=11.5,
+             cash=85.0, owned_shares=10, portfolio_value=205.0),
+        dict(action='Sell', quantity=-4, cur_day=2, fill_price=11.2, price_per_share=11.2,
+             cash=129.8, owned_shares=6, portfolio_value=195.8),
+    ]
+    res = replay_round(prices, actions, 200, 0)
+    assert res['discrepancies'] == []
+    np.testing.assert_allclose(res['cash'], [200.0, 85.0, 129.8])
+    np.testing.assert_allclose(res['equity_curve'], [200.0, 205.0, 195.8])
+    np.testing.assert_allclose(res['notional_curve'], [0.0, 115.0, 44.8])
+
+
+@pytest.mark.parametrize('clicks', [
+    [(1, 20), (2, 100), (3, -10), (4, 20)],
+    [(2, 5), (2, 5), (2, -3), (5, 100)],
+    [],
+])
+def test_running_replay_matches_the_equity_curve(clicks):
+    reports = browser_reports(PRICES, 1000, 0, clicks)
+    running = new_running(1000, 0)
+    curve = []
+    for report in reports:
+        curve += running_step(running, PRICES, report)
+    curve += running_close(running, PRICES)
+    np.testing.assert_allclose(curve, replay_round(PRICES, reports, 1000, 0)['equity_curve'])
+    assert running_close(running, PRICES) == []
@@ -0,0 +1,119 @@
+import json
+
+import numpy as np
+import pytest
+
+from . import round_series
+from .utils_metrics import summarize_round
+
+
+def random_walk(n, seed=0):
+    rng = np.random.default_rng(seed)
+    values = (1000.0 * np.cumprod(1.0 + rng.normal(0.0005, 0.02, n))).tolist()
+    # a crash to zero and back (skipped by the returns) and a new peak
+    values[n // 3] = 0.0
+    values[n // 2] = max(values) * 1.5
+    return values
+
+
+def trade_log(n, seed=0):
+    rng = np.random.default_rng(seed)
+    trades = []
+    for i in range(n):
+        qty = int(rng.integers(1, 20)) * (1 if rng.random() < 0.5 else -1)
+        price = float(rng.choice([9.5, 10.0, 10.25, 11.0]))
+        trades.append(dict(qty=qty, price=price, side='Buy' if qty > 0 else 'Sell', ts=i))
+    return trades
+
+
+@pytest.mark.parametrize('periods_per_year', [None, 252])
+def test_series_metrics_equal_summarize_round(periods_per_year):
+    values = random_walk(5000)
+    trades = trade_log(300)
+    rf_per = round_series.rf_per_period(0.02, periods_per_year)
+    series = round_series.new_series(capacity=100, max_buckets=20, rf_per=rf_per)
+    log = round_series.new_trades(capacity=50)
+    for v in values:
+        round_series.append(series, v)
+    for t in trades:
+        round_series.add_trade(log, t['qty'], t['price'], t['side'], t['ts'])
+
+    full = summarize_round(start_value=values[0], end_value=values[-1], portfolio_values=values, trades=trades,
+                           anchors=[10.0], rf_annual=0.02, periods_per_year=periods_per_year)
+    bounded = summarize_round(start_value=values[0], end_value=values[-1],
+                              portfolio_values=round_series.values(series),
+                              trades=round_series.trades_for_metrics(log), anchors=[10.0],
+                              rf_annual=0.02, periods_per_year=periods_per_year)
+    bounded.update(round_series.series_metrics(series, log, periods_per_year))
+
+    assert set(bounded) == set(full)
+    for key, value in full.items():
+        assert bounded[key] == pytest.approx(value, abs=1e-6), key
+    assert round_series.first_last(series) == (values[0], values[-1])
+
+
+def test_size_is_bounded_and_the_extremes_are_kept():
+    values = random_walk(20000, seed=1)
+    series = round_series.new_series(capacity=100, max_buckets=20)
+    for v in values:
+        round_series.append(series, v)
+    assert series['n'] == len(values)
+    assert len(series['recent']) < 100 + round_series.BUCKET_SIZE
+    assert len(series['buckets']) <= 20
+
+    points = round_series.points(series)
+    indices = [i for i, _ in points]
+    assert indices == sorted(set(indices))
+    # every point is a value at its original index
+    assert all(values[i] == v for i, v in points)
+    kept = [v for _, v in points]
+    assert min(kept) == min(values) and max(kept) == max(values)
+    assert points[0] == [0, values[0]] and points[-1] == [len(values) - 1, values[-1]]
+    # the recent window is exact
+    assert kept[-len(series['recent']):] == values[-len(series['recent']):]
+
+
+def test_prices_are_bounded_and_turnover_stays_exact():
+    # group market prices: a new price for almost every trade
+    rng = np.random.default_rng(3)
+    trades = [dict(qty=int(rng.integers(1, 20)), price=round(float(rng.uniform(9.0, 11.0)), 3), side='Buy', ts=i)
+              for i in range(3000)]
+    log = round_series.new_trades(capacity=50, max_prices=40)
+    for t in trades:
+        round_series.add_trade(log, t['qty'], t['price'], t['side'], t['ts'])
+    assert len(log['by_price']) <= 40
+
+    values = [1000.0, 1010.0, 990.0]
+    full = summarize_round(start_value=1000.0, end_value=990.0, portfolio_values=values, trades=trades,
+                           anchors=[10.0])
+    bounded = summarize_round(start_value=1000.0, end_value=990.0, portfolio_values=values,
+                              trades=round_series.trades_for_metrics(log), anchors=[10.0])
+    assert bounded['trade_count'] == full['trade_count'] == 3000
+    assert bounded['turnover'] == pytest.approx(full['turnover'], rel=1e-9)
+    # merged trades count at their average price, which is no further from the anchor
+    assert 0 < bounded['anchor_bp'] <= full['anchor_bp']
+
+
+def test_logs_survive_json():
+    series = round_series.new_series(capacity=8, max_buckets=2)
+    log = round_series.new_trades(capacity=2)
+    for i, v in enumerate(random_walk(50, seed=2)):
+        round_series.append(series, v)
+        round_series.add_trade(log, 1 + i % 3, 10.0 + i % 2, 'Buy', i)
+    series, log = json.loads(json.dumps(series)), json.loads(json.dumps(log))
+    round_series.append(series, 1234.0)
+    round_series.add_trade(log, 5, 10.0, 'Buy', 50)
+    assert round_series.first_last(series)[1] == 1234.0
+    assert len(round_series.recent_trades(log)) == 2
+    assert sorted((t['price'], t['count']) for t in round_series.trades_for_metrics(log)) == [(10.0, 26), (11.0, 25)]
+
+
+def test_plain_lists_are_accepted():
+    series, trades = [100.0, 110.0], []
+    round_series.append(series, 99.0)
+    round_series.add_trade(trades, 2, 10.0, 'Buy', 1)
+    assert series == [100.0, 110.0, 99.0]
+    assert round_series.points(series) == [[0, 100.0], [1, 110.0], [2, 99.0]]
+    assert round_series.first_last(series) == (100.0, 99.0)
+    assert round_series.series_metrics(series, trades) == {}
+    assert round_series.trades_for_metrics(trades) == trades
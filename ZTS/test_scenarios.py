@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from . import scenarios
+from .utils_metrics import reference_stats
+
+
+def log_returns(spec):
+    return np.diff(np.log(scenarios.generate_paths(spec)), axis=1)
+
+
+def test_gbm_paths():
+    spec = dict(model='gbm', length=250, seed=1, start=50.0, paths=400, params=dict(mu=0.1, sigma=0.3))
+    paths = scenarios.generate_paths(spec)
+    assert paths.shape == (400, 250)
+    assert (paths[:, 0] == 50.0).all() and (paths > 0).all()
+    # rounded to 'decimals'
+    assert np.array_equal(paths, np.round(paths, 2))
+    # log returns ~ N((mu - sigma^2 / 2) dt, sigma^2 dt), up to the rounding of the prices
+    dt = 1 / 252
+    rets = log_returns(dict(spec, decimals=8))
+    assert rets.mean() == pytest.approx((0.1 - 0.5 * 0.3 ** 2) * dt, abs=3e-4)
+    assert rets.std() == pytest.approx(0.3 * np.sqrt(dt), rel=0.02)
+
+
+def test_jump_diffusion_without_jumps_is_gbm():
+    base = dict(length=100, seed=3, paths=5, decimals=8)
+    gbm = scenarios.generate_paths(dict(base, model='gbm', params=dict(mu=0.05, sigma=0.2)))
+    no_jumps = scenarios.generate_paths(dict(base, model='jump_diffusion',
+                                             params=dict(mu=0.05, sigma=0.2, jump_intensity=0.0)))
+    assert np.allclose(gbm, no_jumps)
+
+
+def test_jump_diffusion_jumps_add_variance():
+    base = dict(model='jump_diffusion', length=250, seed=4, paths=200, decimals=8)
+    calm = log_returns(dict(base, params=dict(sigma=0.2, jump_intensity=0.0)))
+    jumpy = log_returns(dict(base, params=dict(sigma=0.2, jump_intensity=50.0, jump_mean=-0.05, jump_std=0.1)))
+    # compound Poisson: variance adds lambda dt (mean^2 + std^2), the mean shifts by lambda dt mean
+    dt = 1 / 252
+    assert jumpy.var() - calm.var() == pytest.approx(50 * dt * (0.05 ** 2 + 0.1 ** 2), rel=0.1)
+    assert jumpy.mean() - calm.mean() == pytest.approx(50 * dt * -0.05, rel=0.15)
+
+
+def test_regime_switching():
+    regimes = [dict(mu=0.0, sigma=0.1), dict(mu=0.0, sigma=0.6)]
+    base = dict(model='regime_switching', length=201, seed=5, paths=300, decimals=8)
+    dt = 1 / 252
+    # never switching stays in the first regime
+    stay = log_returns(dict(base, params=dict(regimes=regimes, switch_prob=0.0)))
+    assert stay.std() == pytest.approx(0.1 * np.sqrt(dt), rel=0.03)
+    # always switching alternates, starting with a switch to the second regime
+    alternate = log_returns(dict(base, params=dict(regimes=regimes, switch_prob=1.0)))
+    assert alternate[:, 0::2].std() == pytest.approx(0.6 * np.sqrt(dt), rel=0.03)
+    assert alternate[:, 1::2].std() == pytest.approx(0.1 * np.sqrt(dt), rel=0.03)
+    # an explicit transition matrix instead of switch_prob
+    absorbing = log_returns(dict(base, params=dict(regimes=regimes, transition=[[0.0, 1.0], [0.0, 1.0]])))
+    assert absorbing.std() == pytest.approx(0.6 * np.sqrt(dt), rel=0.03)
+
+
+@pytest.mark.parametrize('model', scenarios.MODELS)
+def test_same_seed_same_paths(model):
+    spec = dict(model=model, length=60, seed=11, paths=8)
+    first = scenarios.generate_paths(spec)
+    scenarios._generate_cached.cache_clear()
+    assert np.array_equal(scenarios.generate_paths(spec), first)
+    assert not np.array_equal(scenarios.generate_paths(dict(spec, seed=12)), first)
+    # a path of a batch is the same row whichever path a round selects
+    name, prices, news = scenarios.load_scenario(dict(spec, path=5))
+    assert prices == first[5].tolist() and news == [''] * 60
+    assert name.startswith(model + '_') and name.endswith('_5')
+
+
+def test_cache_key_is_the_normalised_spec():
+    explicit = dict(model='gbm', length=250, seed=0, start=100.0, dt=1 / 252, decimals=2, paths=1,
+                    params=dict(mu=0.0, sigma=0.2))
+    # defaults filled in, key order, the path selector and the name do not change the batch
+    assert scenarios.spec_hash({}) == scenarios.spec_hash(explicit)
+    assert scenarios.spec_hash(dict(reversed(list(explicit.items())))) == scenarios.spec_hash(explicit)
+    assert scenarios.spec_hash(dict(explicit, paths=3, path=2, name='X')) == \
+        scenarios.spec_hash(dict(explicit, paths=3))
+    assert scenarios.spec_hash(dict(explicit, params=dict(sigma=0.3))) != scenarios.spec_hash(explicit)
+
+    scenarios._generate_cached.cache_clear()
+    paths = scenarios.generate_paths({})
+    assert scenarios.generate_paths(explicit) is paths
+    assert scenarios._generate_cached.cache_info().misses == 1
+    # shared, so read-only
+    with pytest.raises(ValueError):
+        paths[0, 0] = 1.0
+
+
+def test_invalid_specs():
+    with pytest.raises(ValueError, match='Unknown scenario model'):
+        scenarios.normalize_spec(dict(model='heston'))
+    with pytest.raises(ValueError, match='at least 2 days'):
+        scenarios.normalize_spec(dict(length=1))
+    with pytest.raises(ValueError, match='out of range'):
+        scenarios.normalize_spec(dict(paths=2, path=2))
+
+
+def test_reference_stats_of_the_selected_path():
+    spec = dict(model='gbm', length=120, seed=2, paths=4, path=1, params=dict(mu=0.2, sigma=0.4))
+    _, prices, _ = scenarios.load_scenario(spec)
+    assert scenarios.scenario_reference_stats(spec) == reference_stats(prices)
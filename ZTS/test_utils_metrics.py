@@ -0,0 +1,189 @@
+import math
+import random
+import statistics
+
+import pytest
+
+from .utils_metrics import (
+    aligned_returns, benchmark_relative, reference_stats, rolling_drawdown, rolling_sharpe, rolling_turnover,
+    rolling_volatility, summarize_rolling, summarize_rolling_batch,
+)
+
+
+def window_of(xs, i, window, start=0):
+    return xs[max(start, i - window + 1):i + 1]
+
+
+def sample_std(xs):
+    if len(xs) < 2:
+        return 0.0
+    mean = sum(xs) / len(xs)
+    var = sum((x - mean) ** 2 for x in xs) / (len(xs) - 1)
+    return math.sqrt(var) if var > 1e-18 else 0.0
+
+
+def naive_volatility(values, window, periods_per_year=None):
+    rets = aligned_returns(values)
+    scale = math.sqrt(periods_per_year) if periods_per_year else 1.0
+    return [0.0] + [sample_std(window_of(rets, i, window, start=1)) * scale for i in range(1, len(rets))]
+
+
+def naive_sharpe(values, window, rf_per=0.0, periods_per_year=None):
+    rets = aligned_returns(values)
+    scale = math.sqrt(periods_per_year) if periods_per_year else 1.0
+    out = [0.0]
+    for i in range(1, len(rets)):
+        xs = [r - rf_per for r in window_of(rets, i, window, start=1)]
+        std = sample_std(xs)
+        out.append(sum(xs) / len(xs) / std * scale if std > 0 else 0.0)
+    return out
+
+
+def naive_drawdown(values, window):
+    out = []
+    for i, v in enumerate(values):
+        peak = max(window_of(values, i, window))
+        out.append((v - peak) / peak if peak > 0 else 0.0)
+    return out
+
+
+def naive_turnover(values, notional, window):
+    out = []
+    for i in range(len(values)):
+        pv = [v for v in window_of(values, i, window) if v > 0]
+        avg_pv = sum(pv) / len(pv) if pv else 0.0
+        out.append(sum(window_of(notional, i, window)) / avg_pv if avg_pv > 0 else 0.0)
+    return out
+
+
+def random_round(seed, days=60):
+    rng = random.Random(seed)
+    values = [1000.0]
+    for _ in range(days - 1):
+        values.append(values[-1] * (1 + rng.gauss(0.0005, 0.02)))
+    notional = [rng.choice([0.0, 0.0, rng.uniform(10, 200)]) for _ in range(days)]
+    return values, notional
+
+
+@pytest.mark.parametrize('window', [1, 2, 5, 20, 59, 60, 200])
+def test_rolling_metrics_match_the_naive_windows(window):
+    values, notional = random_round(window)
+    approx = lambda xs: pytest.approx(xs, rel=1e-9, abs=1e-12)
+    assert rolling_volatility(values, window) == approx(naive_volatility(values, window))
+    assert rolling_volatility(values, window, periods_per_year=252) == \
+        approx(naive_volatility(values, window, periods_per_year=252))
+    assert rolling_sharpe(values, window) == approx(naive_sharpe(values, window))
+    rf_per = 1.02 ** (1 / 252) - 1
+    assert rolling_sharpe(values, window, rf_annual=0.02, periods_per_year=252) == \
+        approx(naive_sharpe(values, window, rf_per=rf_per, periods_per_year=252))
+    assert rolling_drawdown(values, window) == approx(naive_drawdown(values, window))
+    assert rolling_turnover(values, notional, window) == approx(naive_turnover(values, notional, window))
+
+
+def test_window_longer_than_the_round_is_the_expanding_window():
+    values, notional = random_round(7, days=10)
+    summary = summarize_rolling(values=values, notional=notional, window=50)
+    expanding = summarize_rolling(values=values, notional=notional, window=len(values))
+    assert summary['volatility'] == expanding['volatility']
+    assert summary['drawdown'] == expanding['drawdown']
+    assert summary['turnover'] == expanding['turnover']
+    assert summary['worst_drawdown'] == round(min(naive_drawdown(values, len(values))), 6)
+    assert all(len(summary[key]) == len(values) for key in ('volatility', 'sharpe', 'drawdown', 'turnover'))
+
+
+def test_constant_series_has_no_risk():
+    summary = summarize_rolling(values=[500.0] * 30, window=5)
+    assert summary['volatility'] == [0.0] * 30
+    assert summary['sharpe'] == [0.0] * 30
+    assert summary['drawdown'] == [0.0] * 30
+    assert summary['turnover'] == [0.0] * 30
+    assert (summary['max_volatility'], summary['min_sharpe'], summary['worst_drawdown'],
+            summary['max_turnover']) == (0.0, 0.0, 0.0, 0.0)
+
+
+def test_zero_volatility_window_after_volatile_days():
+    # volatile days, then a steady 1% a day: the running sums still carry the
+    # earlier returns, but once the window only holds the steady days the
+    # volatility is 0 and the Sharpe ratio is 0 instead of exploding
+    values, _ = random_round(3, days=20)
+    for _ in range(15):
+        values.append(values[-1] * 1.01)
+    window = 5
+    vol = rolling_volatility(values, window)
+    sharpe = rolling_sharpe(values, window)
+    steady = range(20 + window, len(values))
+    assert [vol[i] for i in steady] == [0.0] * len(steady)
+    assert [sharpe[i] for i in steady] == [0.0] * len(steady)
+    assert vol[19] > 0 and sharpe[19] != 0.0
+
+
+def test_empty_and_short_inputs():
+    assert summarize_rolling(values=[], window=5)['volatility'] == []
+    summary = summarize_rolling(values=[100.0], window=5)
+    assert (summary['volatility'], summary['sharpe'], summary['drawdown']) == ([0.0], [0.0], [0.0])
+    # a missing notional counts as no trading
+    assert rolling_turnover([100.0, 101.0], [], 5) == [0.0, 0.0]
+
+
+def test_batch_is_the_single_summaries():
+    rounds = [dict(zip(('values', 'notional'), random_round(seed, days=15)), key=seed) for seed in (1, 2)]
+    batch = summarize_rolling_batch(rounds, window=4)
+    for rnd, res in zip(rounds, batch):
+        assert res.pop('key') == rnd['key']
+        assert res == summarize_rolling(values=rnd['values'], notional=rnd['notional'], window=4)
+
+
+def test_reference_stats_of_a_flat_series():
+    flat = dict(buy_hold_return=0.0, volatility=0.0, max_drawdown=0.0, oracle_return=0.0)
+    assert reference_stats([50.0] * 20, periods_per_year=252) == flat
+    # fewer than 2 valid prices
+    assert reference_stats([]) == flat
+    assert reference_stats([0.0, 'x', 50.0]) == flat
+    assert benchmark_relative(0.1, reference_stats([50.0] * 20)) == dict(excess_return=0.1, oracle_capture=0.0)
+    assert benchmark_relative(0.1, None) == dict(excess_return=0.0, oracle_capture=0.0)
+
+
+def test_reference_stats_of_monotone_series():
+    rising = [100.0 * 1.01 ** i for i in range(30)]
+    stats = reference_stats(rising)
+    # every day rises: the oracle holds throughout, as buy-and-hold does
+    assert stats['oracle_return'] == stats['buy_hold_return'] == round(1.01 ** 29 - 1, 6)
+    assert stats['max_drawdown'] == 0.0
+    assert stats['volatility'] == 0.0
+    assert benchmark_relative(stats['buy_hold_return'], stats) == dict(excess_return=0.0, oracle_capture=1.0)
+
+    falling = rising[::-1]
+    stats = reference_stats(falling)
+    # no rising day: the oracle stays in cash, the drawdown is the whole fall
+    assert stats['oracle_return'] == 0.0
+    assert stats['buy_hold_return'] == stats['max_drawdown'] == round(falling[-1] / falling[0] - 1, 6)
+    # without an oracle return there is nothing to capture
+    assert benchmark_relative(-0.05, stats)['oracle_capture'] == 0.0
+
+
+def test_reference_stats_against_direct_computation():
+    prices, _ = random_round(11, days=100)
+    rets = [b / a - 1 for a, b in zip(prices, prices[1:])]
+    stats = reference_stats(prices, periods_per_year=252)
+    assert stats['volatility'] == round(statistics.stdev(rets) * math.sqrt(252), 6)
+    assert stats['max_drawdown'] == round(min(naive_drawdown(prices, len(prices))), 6)
+    assert stats['buy_hold_return'] == round(prices[-1] / prices[0] - 1, 6)
+    assert stats['oracle_return'] == round(math.prod(1 + r for r in rets if r > 0) - 1, 6)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_oracle_capture_is_at_most_one_for_long_only_trading(seed):
+    prices, _ = random_round(seed, days=80)
+    stats = reference_stats(prices)
+    assert stats['oracle_return'] >= max(stats['buy_hold_return'], 0.0)
+    rng = random.Random(seed)
+    for _ in range(50):
+        # any long-only strategy: a fraction of the wealth in the asset each day
+        wealth = 1.0
+        for a, b in zip(prices, prices[1:]):
+            wealth *= 1 + rng.random() * (b / a - 1)
+        capture = benchmark_relative(wealth - 1, stats)['oracle_capture']
+        assert capture <= 1.0 + 1e-5
+    # all in on the rising days only is the oracle itself
+    wealth = math.prod(max(b / a, 1.0) for a, b in zip(prices, prices[1:]))
+    assert benchmark_relative(wealth - 1, stats)['oracle_capture'] == pytest.approx(1.0, abs=1e-5)
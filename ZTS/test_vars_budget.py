@@ -0,0 +1,91 @@
+import base64
+import pickle
+from types import SimpleNamespace
+
+import pytest
+
+from . import vars_budget
+
+
+@pytest.fixture(autouse=True)
+def footprints(monkeypatch):
+    monkeypatch.setattr(vars_budget, '_footprints', {})
+
+
+def make_session(**config):
+    return SimpleNamespace(code='vb_test', config=dict(vars_footprint=True, **config), vars={'info': 'x' * 10})
+
+
+def make_player(session, code, **participant_vars):
+    return SimpleNamespace(session=session, participant=SimpleNamespace(code=code, vars=participant_vars))
+
+
+def test_serialized_size_is_the_stored_text():
+    data = {'round_to_pay': 3, 'history': list(range(100))}
+    # as oTree's vars column stores it: base64 of the pickle and a newline
+    assert vars_budget.serialized_size(data) == len(base64.b64encode(pickle.dumps(data))) + 1
+    total, seconds, keys = vars_budget.measure(data)
+    assert total == vars_budget.serialized_size(data)
+    assert seconds >= 0
+    assert keys == {'round_to_pay': len(pickle.dumps(3)), 'history': len(pickle.dumps(list(range(100))))}
+    # grows with the content
+    assert vars_budget.serialized_size(dict(data, history=list(range(1000)))) > total
+
+
+def test_disabled_does_nothing():
+    session = make_session()
+    session.config['vars_footprint'] = False
+    assert vars_budget.check(make_player(session, 'p1', a=1), 'StartPage') is None
+    assert vars_budget.report('vb_test')['enabled'] is False
+
+
+def test_live_messages_are_sampled_every_n_calls():
+    session = make_session(vars_footprint_sample_every=3)
+    player = make_player(session, 'p1', a=1)
+    measured = [vars_budget.check(player, 'live:Update', live=True) is not None for _ in range(7)]
+    assert measured == [False, False, True, False, False, True, False]
+    # page handlers are always measured, and count towards the sampling
+    assert vars_budget.check(player, 'TradingPage') is not None
+    assert vars_budget.check(player, 'live:Update', live=True) is not None
+    sites = {s['where']: s['count'] for s in vars_budget.report('vb_test')['sites']}
+    assert sites == {'live:Update': 3, 'TradingPage': 1}
+
+
+def test_budgets_warn_once(caplog):
+    session = make_session(participant_vars_budget_bytes=200, participant_vars_key_budget_bytes=100,
+                           session_vars_budget_bytes=10)
+    small = make_player(session, 'small', a=1)
+    big = make_player(session, 'big', history=list(range(100)), a=1)
+    with caplog.at_level('WARNING', logger='ZTS.vars_budget'):
+        vars_budget.check(small, 'StartPage')
+        # only the session budget is exceeded
+        assert [r.getMessage() for r in caplog.records] == [
+            'session.vars of vb_test is {} bytes (budget 10)'.format(vars_budget.serialized_size(session.vars))]
+        caplog.clear()
+        for _ in range(3):
+            vars_budget.check(big, 'TradingPage')
+    messages = [r.getMessage() for r in caplog.records]
+    assert len(messages) == 2
+    assert messages[0].startswith('participant.vars of big is ') and messages[0].endswith('(budget 200)')
+    assert messages[1].startswith("participant.vars['history'] of big is ")
+
+
+def test_report_lists_the_largest():
+    session = make_session()
+    vars_budget.check(make_player(session, 'p1', a=1), 'StartPage')
+    result = vars_budget.check(make_player(session, 'p2', a=1, history=list(range(500))), 'TradingPage')
+    assert set(result) == {'participant', 'where', 'bytes', 'serialize_s', 'keys', 'session_bytes',
+                           'session_serialize_s'}
+    vars_budget.check(make_player(session, 'p3', a=list(range(50))), 'TradingPage')
+
+    rep = vars_budget.report('vb_test')
+    assert rep['enabled'] is True
+    assert [p['participant'] for p in rep['top_participants']] == ['p2', 'p3', 'p1']
+    top = rep['top_participants'][0]
+    assert (top['where'], top['bytes'], top['largest_key']) == ('TradingPage', result['bytes'], 'history')
+    assert top['serialize_ms'] == round(result['serialize_s'] * 1000, 3)
+    assert [k['key'] for k in rep['top_keys']] == ['history', 'a']
+    trading = [s for s in rep['sites'] if s['where'] == 'TradingPage'][0]
+    assert trading['count'] == 2 and trading['max_bytes'] == result['bytes']
+    assert trading['avg_serialize_ms'] >= 0
+    assert rep['session_bytes'] == vars_budget.serialized_size(session.vars)
@@ -0,0 +1,110 @@
+import os
+import threading
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from .write_behind import FINISHED_TTL_S, Flusher, LocalActionQueue, RedisActionQueue, flush_rows, get_redis, \
+    player_id_of, queue_key
+
+
+def test_rows_stay_queued_until_a_cursor_passes_them():
+    queue = LocalActionQueue()
+    for i in range(3):
+        queue.append('a', dict(i=i))
+    queue.append('b', dict(i=9))
+
+    rows, cursor = flush_rows(queue, 'a', '')
+    assert rows == [dict(i=0), dict(i=1), dict(i=2)] and cursor == '3'
+    # not committed: the same rows are handed out again
+    assert flush_rows(queue, 'a', '') == (rows, '3')
+    # committed: only later rows
+    queue.append('a', dict(i=3))
+    assert flush_rows(queue, 'a', cursor) == ([dict(i=3)], '4')
+    assert flush_rows(queue, 'a', '4') == ([], None)
+    assert queue.keys() == ['b']
+
+
+def test_queue_key_holds_the_player_id():
+    player = SimpleNamespace(id=42, session=SimpleNamespace(code='abc'))
+    assert queue_key(player) == 'abc:42'
+    assert player_id_of(queue_key(player)) == 42
+
+
+def test_flusher_flushes_every_key_and_survives_errors():
+    queue = LocalActionQueue()
+    queue.append('ok', dict(i=1))
+    queue.append('bad', dict(i=2))
+    stored = {}
+    cursors = {}
+
+    def flush_key(key):
+        if key == 'bad':
+            raise RuntimeError('db down')
+        rows, cursor = flush_rows(queue, key, cursors.get(key, ''))
+        if cursor is None:
+            return 0
+        stored.setdefault(key, []).extend(rows)
+        cursors[key] = cursor
+        return len(rows)
+
+    flusher = Flusher(queue, flush_key, interval_s=60)
+    assert flusher.run_once() == 1
+    assert flusher.run_once() == 0
+    assert stored == {'ok': [dict(i=1)]}
+    # the failed key keeps its rows for the next run
+    assert 'bad' in queue.keys()
+
+
+def test_flusher_thread_runs_until_stopped():
+    queue = LocalActionQueue()
+    queue.append('k', dict(i=1))
+    flushed = threading.Event()
+
+    def flush_key(key):
+        rows, cursor = flush_rows(queue, key, '')
+        queue.pending(key, cursor or '')
+        flushed.set()
+        return len(rows)
+
+    flusher = Flusher(queue, flush_key, interval_s=0.01)
+    flusher.start()
+    assert flushed.wait(5)
+    flusher.stop(timeout=5)
+    assert flusher.rows == 1
+    assert queue.keys() == []
+
+
+def flush_and_finish(queue, key):
+    rows, cursor = flush_rows(queue, key, '')
+    # committed: acknowledged by the flusher, then the round ends
+    queue.ack(key, cursor)
+    assert not queue.has_rows(key)
+    queue.finish(key)
+    return rows
+
+
+def test_flushed_finished_queue_is_dropped():
+    queue = LocalActionQueue()
+    queue.append('done', dict(i=1))
+    queue.append('late', dict(i=2))
+    queue.append('open', dict(i=3))
+    assert flush_and_finish(queue, 'done') == [dict(i=1)]
+    # a round that ends with unflushed rows keeps them for the flusher
+    queue.finish('late')
+    assert sorted(queue.keys()) == ['late', 'open']
+    assert 'done' not in queue._next_id
+
+
+@pytest.mark.skipif(not os.environ.get('REDIS_URL'), reason='needs a Redis server (REDIS_URL)')
+def test_flushed_finished_stream_is_deleted():
+    pytest.importorskip('redis')
+    queue = RedisActionQueue(get_redis(), prefix='zts:test:{}:'.format(uuid.uuid4().hex))
+    for key in ('done', 'late'):
+        queue.append(key, dict(key=key))
+    assert flush_and_finish(queue, 'done') == [dict(key='done')]
+    queue.finish('late')
+    assert queue.keys() == ['late']
+    assert 0 < queue.client.ttl(queue.prefix + 'late') <= FINISHED_TTL_S
+    queue.client.delete(queue.prefix + 'late')
@@ -1,9 +1,228 @@
-from otree.api import Currency as c, currency_range
-from . import pages
+from otree.api import Currency as c, currency_range, expect, Submission
+from otree.common import participant_start_url
+from otree.database import db
+from . import exports, pages, page_benchmark
 from ._builtin import Bot
-from .models import Constants
+from .baselines import browser_reports
+from .models import Constants, TradingAction, _trading_action_rows, custom_export, trading_action_export_name
+from .replay import replay_round
+from urllib.parse import parse_qsl, urlparse
+import html
+import re
+import time
+
+
+def bot_clicks(prices, cash, buttons):
+    """
+    Button clicks of a bot round: a small buy and sell, then on day 3 more
+    clicks of the largest button than the cash covers, so one of them is a
+    partial buy, and a sell on day 4.
+    """
+    small, large = buttons[0], buttons[-1]
+    n_large = int(cash // (large * prices[3])) + 2
+    return [(1, small), (2, -small)] + [(3, large)] * n_large + [(4, -large)]
+
+
+def round_reports(subsession):
+    """
+    The live reports a browser sends in this round for bot_clicks
+    (merged per day if the session coalesces orders).
+    """
+    asset, prices, _ = subsession.get_timeseries_values()
+    cash = float(subsession.get_config_multivalue('initial_cash'))
+    shares = int(subsession.get_config_multivalue('initial_shares'))
+    buttons = subsession.get_config_multivalue('trading_button_values')
+    coalesce = bool(subsession.session.config.get('order_coalesce_ms'))
+    return browser_reports(prices, cash, shares, bot_clicks(prices, cash, buttons), asset, coalesce=coalesce)
+
+
+# shares player 1 buys from player 2 in play_market
+MARKET_FILL = 3
+
+
+def market_order(player, side, quantity, limit_price, day_price):
+    return player.live_trading_report(dict(action='Order', side=side, quantity=quantity, limit_price=limit_price,
+                                           cur_day=1, price_per_share=day_price))
+
+
+def play_market(group):
+    """
+    Group market mode: every player starts and ends the round like the
+    browser; in between, on day 1, player 1 buys MARKET_FILL shares from an
+    ask of player 2, rests a bid, is refused an order against that bid and
+    cancels it. The rest of the ask is cancelled at 'End'.
+    """
+    reports = round_reports(group.subsession)
+    _, prices, _ = group.subsession.get_timeseries_values()
+    price = float(prices[1])
+    buyer, seller = group.get_player_by_id(1), group.get_player_by_id(2)
+    for player in group.get_players():
+        player.live_trading_report(dict(reports[0]))
+
+    ask = market_order(seller, 'Sell', MARKET_FILL + 2, price, price)[0]['market']
+    expect(ask['fills'], [])
+    bought = market_order(buyer, 'Buy', MARKET_FILL, price + 1, price)[0]['market']
+    expect([(f['buyer'], f['seller'], f['price'], f['quantity']) for f in bought['fills']],
+           [(1, 2, price, MARKET_FILL)])
+    bid = market_order(buyer, 'Buy', 10, round(price / 2, 2), price)[0]['market']
+    expect(bid['book']['bids'], [[round(price / 2, 2), 10]])
+    refused = market_order(buyer, 'Sell', 1, round(price / 4, 2), price)[1]['market']
+    expect('own order' in refused['error'], True)
+    cancel = buyer.live_trading_report(dict(action='Cancel', order_id=bid['order']['order_id'], cur_day=1,
+                                            price_per_share=price))[0]['market']
+    expect((cancel['cancelled'], cancel['book']), (True, dict(bids=[], asks=[[price, 2]])))
+
+    for player in group.get_players():
+        player.live_trading_report(dict(reports[-1]))
+    expect(buyer._market_book().top(), dict(bids=[], asks=[]))
+
+
+def call_live_method(method, group, **kwargs):
+    """
+    TradingPage: every player sends the reports of round_reports to
+    live_trading_report, as the browser does through liveSend; in the group
+    market mode they trade through the book instead (play_market).
+    Not in page benchmark runs (the live method would count as page time).
+    """
+    config = group.session.config
+    if config.get('page_benchmark'):
+        return
+    if config.get('group_market'):
+        play_market(group)
+        return
+    reports = round_reports(group.subsession)
+    for player in group.get_players():
+        for report in reports:
+            player.live_trading_report(dict(report))
 
 
 class PlayerBot(Bot):
     def play_round(self):
-        pass
+        config = self.session.config
+        if self.round_number > self.session.num_rounds:
+            return
+        sequence = [pages.StartPage, pages.TradingPage, pages.ResultsPage]
+        if self.round_number == 1:
+            sequence.insert(0, pages.InstructionPage)
+        if self.round_number < self.session.num_rounds and config.get('nudge_link_round'):
+            sequence.append(pages.BetweenRoundQualtrics)
+
+        benchmark = config.get('page_benchmark')
+        for page in sequence:
+            if benchmark:
+                yield from self.benchmark_page(page)
+            elif page is pages.BetweenRoundQualtrics:
+                # a redirect to Qualtrics without a button; it moves on by its timeout
+                self.check_qualtrics_url()
+                yield Submission(page, check_html=False)
+            else:
+                yield page
+            self.check_page(page)
+
+        if benchmark and self.round_number == self.session.num_rounds:
+            rows = page_benchmark.results(self.session.code)
+            print(page_benchmark.format_table(rows))
+            violations = page_benchmark.check_budgets(rows, config)
+            assert not violations, 'Page budgets exceeded:\n' + '\n'.join(violations)
+
+    def benchmark_page(self, page):
+        """
+        Page benchmark (see page_benchmark.py): HTML size of the page and the
+        time from submitting it until the next page is loaded.
+        """
+        length = page_benchmark.scenario_length(self.subsession)
+        page_benchmark.record(self.session.code, page.__name__, length, html_bytes=len(self.html.encode()))
+        t0 = time.perf_counter()
+        yield page
+        page_benchmark.record(self.session.code, page.__name__, length,
+                              round_trip_ms=(time.perf_counter() - t0) * 1000)
+
+    def check_qualtrics_url(self):
+        """
+        The between-round link carries the rounded round features and a
+        return link to this participant.
+        """
+        url = html.unescape(re.search(r'https?://[^"\'\s]+\?[^"\'\s]+', self.html).group(0))
+        params = dict(parse_qsl(urlparse(url).query))
+        expect(params['return_to'].endswith(participant_start_url(self.participant.code)), True)
+        summary = self.player.get_round_summary()
+        for name, value in summary.features().items():
+            expect(params[name], str(value))
+
+    def check_page(self, page):
+        """
+        Checks after a page was submitted.
+        """
+        config = self.session.config
+        traded = not (config.get('page_benchmark') or config.get('group_market'))
+        if page is pages.TradingPage and traded and not self.player.is_ephemeral():
+            # every report is stored and agrees with the server-side replay
+            reports = round_reports(self.subsession)
+            expect(len(TradingAction.filter(player=self.player)), len(reports))
+            rnd = self.player.get_replay_input()
+            res = replay_round(rnd['prices'], rnd['actions'], rnd['start_cash'], rnd['start_shares'])
+            expect(res['discrepancies'], [])
+            expect(self.player.portfolio_value, reports[-1]['portfolio_value'])
+
+        if page is pages.TradingPage and config.get('group_market'):
+            self.check_market_position()
+
+        if page is pages.ResultsPage:
+            # the stored ROI is the one of the payoff
+            summary = self.player.get_round_summary()
+            start = self.player.portfolio_value_start
+            expect(self.player.payoff, c(self.player.portfolio_value))
+            expect(summary.roi, round(self.player.portfolio_value / start - 1, 6) if start else 0.0)
+            if self.round_number > 1:
+                self.check_same_as_ephemeral(self.player.in_round(self.round_number - 1))
+
+        if page is pages.ResultsPage and config.get('trading_action_export_on_complete') \
+                and self.round_number == self.session.num_rounds and self.subsession.session_complete():
+            # the last player started the export; the custom export then reads its file
+            name = trading_action_export_name(self.session.code)
+            deadline = time.monotonic() + 30
+            while exports.status(name)['status'] != exports.DONE and time.monotonic() < deadline:
+                time.sleep(0.05)
+            expect(exports.status(name)['status'], exports.DONE)
+            players = [p for s in self.subsession.in_all_rounds() for p in s.get_players()]
+            rows = list(custom_export(players))[1:]
+            expect(len(rows), sum(len(TradingAction.filter(player=p)) for p in players))
+            # with the values and types of the rows read from the database
+            expect(rows, [row for r in range(1, self.session.num_rounds + 1)
+                          for row in _trading_action_rows(db, self.session.id, self.session.code, r)])
+
+    def check_market_position(self):
+        """
+        After play_market: player 1 holds MARKET_FILL shares more, bought from
+        player 2 at the day-1 price, and the replay of the fills agrees.
+        """
+        _, prices, _ = self.subsession.get_timeseries_values()
+        cash = float(self.subsession.get_config_multivalue('initial_cash'))
+        shares = int(self.subsession.get_config_multivalue('initial_shares'))
+        traded = {1: MARKET_FILL, 2: -MARKET_FILL}.get(self.player.id_in_group, 0)
+        expect(self.player.shares, shares + traded)
+        expect(abs(self.player.cash - (cash - traded * float(prices[1]))) < 1e-6, True)
+        expect(len([ta for ta in TradingAction.filter(player=self.player) if ta.action in ('Buy', 'Sell')]),
+               1 if traded else 0)
+        rnd = self.player.get_replay_input()
+        res = replay_round(rnd['prices'], rnd['actions'], rnd['start_cash'], rnd['start_shares'])
+        expect(res['discrepancies'], [])
+
+    def check_same_as_ephemeral(self, previous):
+        """
+        The persisted round ends with the same result as the previous round if
+        that one was ephemeral on the same scenario (zts_ephemeral_check), as
+        the bots send the same reports in both.
+        """
+        if not previous.is_ephemeral() or self.player.is_ephemeral():
+            return
+        config_names = ('timeseries_filename', 'initial_cash', 'initial_shares', 'trading_button_values')
+        if any(previous.subsession.get_config_multivalue(name) != self.subsession.get_config_multivalue(name)
+               for name in config_names):
+            return
+        for field in ('cash', 'shares', 'share_value', 'portfolio_value', 'portfolio_value_start', 'pandl', 'payoff'):
+            expect(getattr(self.player, field), getattr(previous, field))
+        ephemeral, persisted = previous.get_round_summary(), self.player.get_round_summary()
+        for field in ('start_value', 'end_value', 'roi', 'max_dd', 'trade_count', 'turnover', 'anchor_bp',
+                      'sharpe', 'sortino', 'excess_return', 'oracle_capture'):
+            expect(getattr(persisted, field), getattr(ephemeral, field))
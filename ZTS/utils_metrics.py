@@ -3,7 +3,8 @@
 # Robust helpers for per-round metrics.
 # All functions are pure and tolerate missing/empty inputs.
 
-from typing import List, Dict, Tuple, Optional
+from collections import deque
+from typing import List, Dict, Tuple, Optional, Sequence
 import math
 
 
@@ -48,7 +49,7 @@ def compute_max_drawdown(values: List[float]) -> float:
 def compute_trade_count(trades: List[Dict]) -> int:
     """
     Count executed trades. A trade dict can be minimal: {'qty': int/float, 'price': float, 'side': 'BUY'/'SELL', 'ts': <any>}
-    Entries with qty==0 are ignored.
+    Entries with qty==0 are ignored; an entry with 'count' stands for that many trades (see round_series.py).
     """
     if not trades:
         return 0
@@ -56,7 +57,7 @@ def compute_trade_count(trades: List[Dict]) -> int:
     for t in trades:
         try:
             if abs(float(t.get('qty', 0))) > 0:
-                n += 1
+                n += int(t.get('count', 1))
         except Exception:
             pass
     return n
@@ -183,6 +184,7 @@ def compute_anchor_deviation_bp(trades: List[Dict], anchors: List[float]) -> flo
     """
     Anchoring deviation (basis points): average over trades of 10,000 * (exec_price - nearest_anchor) / nearest_anchor.
     If no anchors or no valid prices -> 0.0. Uses mean absolute deviation for robustness.
+    Trades with a 'count' are weighted by it.
     """
     if not trades or not anchors:
         return 0.0
@@ -207,7 +209,8 @@ def compute_anchor_deviation_bp(trades: List[Dict], anchors: List[float]) -> flo
         except Exception:
             return None
 
-    diffs = []
+    total = 0.0
+    n = 0
     for t in trades:
         try:
             p = float(t.get('price', None))
@@ -216,12 +219,69 @@ def compute_anchor_deviation_bp(trades: List[Dict], anchors: List[float]) -> flo
             a = nearest_anchor(p)
             if a and a > 0:
                 bps = 10000.0 * (p - a) / a
-                diffs.append(abs(bps))
+                w = int(t.get('count', 1))
+                total += w * abs(bps)
+                n += w
         except Exception:
             continue
-    if not diffs:
+    if not n:
         return 0.0
-    return float(sum(diffs) / len(diffs))
+    return float(total / n)
+
+
+def reference_stats(prices: Sequence[float], periods_per_year: Optional[int] = None) -> Dict:
+    """
+    Benchmarks of a price series, computed in one pass:
+    - buy_hold_return: return of holding the asset from the first to the last day
+    - volatility: std of the daily returns (annualised if periods_per_year is given)
+    - max_drawdown: max drawdown of the price itself (<= 0)
+    - oracle_return: best long-only return with perfect foresight
+      (invested on every rising day, in cash otherwise)
+    """
+    px = [safe_float(p) for p in (prices or [])]
+    px = [p for p in px if p > 0]
+    if len(px) < 2:
+        return dict(buy_hold_return=0.0, volatility=0.0, max_drawdown=0.0, oracle_return=0.0)
+    peak = px[0]
+    max_dd = 0.0
+    growth = 1.0
+    n = 0
+    mean = m2 = 0.0
+    for prev, cur in zip(px, px[1:]):
+        r = cur / prev - 1.0
+        if r > 0:
+            growth *= 1.0 + r
+        # Welford update of the return variance
+        n += 1
+        delta = r - mean
+        mean += delta / n
+        m2 += delta * (r - mean)
+        if cur > peak:
+            peak = cur
+        max_dd = min(max_dd, (cur - peak) / peak)
+    vol = math.sqrt(m2 / (n - 1)) if n > 1 else 0.0
+    if periods_per_year and periods_per_year > 0:
+        vol *= math.sqrt(float(periods_per_year))
+    return dict(
+        buy_hold_return=round(px[-1] / px[0] - 1.0, 6),
+        volatility=round(vol, 6),
+        max_drawdown=round(max_dd, 6),
+        oracle_return=round(growth - 1.0, 6),
+    )
+
+
+def benchmark_relative(roi: float, reference: Optional[Dict]) -> Dict:
+    """
+    ROI relative to the scenario benchmarks of reference_stats:
+    excess_return over buy-and-hold and the captured fraction of the oracle return.
+    """
+    if not reference:
+        return dict(excess_return=0.0, oracle_capture=0.0)
+    oracle = safe_float(reference.get('oracle_return'))
+    return dict(
+        excess_return=round(roi - safe_float(reference.get('buy_hold_return')), 6),
+        oracle_capture=round(roi / oracle, 6) if oracle > 0 else 0.0,
+    )
 
 
 def summarize_round(
@@ -233,10 +293,12 @@ def summarize_round(
     anchors: List[float],
     rf_annual: float = 0.0,
     periods_per_year: Optional[int] = None,
+    reference: Optional[Dict] = None,
 ) -> Dict:
     """
     One-call summary helper that returns all round-level metrics.
     If 'periods_per_year' is provided, Sharpe/Sortino are annualised; otherwise left in raw (per-period) units.
+    'reference' are the scenario's reference_stats; they add the benchmark-relative metrics.
     """
     pv = [safe_float(v) for v in (portfolio_values or [])]
     roi = compute_roi(safe_float(start_value), safe_float(end_value))
@@ -248,7 +310,7 @@ def summarize_round(
     rets = returns_from_values(pv)
     sharpe, sortino = compute_sharpe_sortino(rets, rf_annual=rf_annual, periods_per_year=periods_per_year)
 
-    return dict(
+    summary = dict(
         roi=round(roi, 6),
         max_dd=round(max_dd, 6),             # negative or 0 (e.g., -0.1234 = -12.34%)
         trade_count=int(n_trades),
@@ -257,3 +319,190 @@ def summarize_round(
         sharpe=round(sharpe, 6),
         sortino=round(sortino, 6),
     )
+    summary.update(benchmark_relative(roi, reference))
+    return summary
+
+
+# ---------------------------------
+# Rolling-window metrics over a daily series.
+# Each function makes one O(n) pass (running sums or a monotonic deque) and
+# returns a list aligned with the input days; element i covers the window
+# of 'window' days ending at day i (shorter at the start of the round).
+
+
+def _per_period_rf(rf_annual: float, periods_per_year: Optional[int]) -> float:
+    if periods_per_year and periods_per_year > 0:
+        try:
+            return (1.0 + float(rf_annual)) ** (1.0 / float(periods_per_year)) - 1.0
+        except Exception:
+            pass
+    return 0.0
+
+
+def aligned_returns(values: Sequence[float]) -> List[float]:
+    """
+    Simple returns aligned with the values: r[0] = 0 and r[i] = v[i] / v[i-1] - 1.
+    Invalid or non-positive neighbours give a 0.0 return, so indices stay aligned.
+    """
+    vals = [safe_float(v) for v in (values if values is not None else [])]
+    rets = [0.0] * len(vals)
+    for i in range(1, len(vals)):
+        if vals[i] > 0 and vals[i - 1] > 0:
+            rets[i] = vals[i] / vals[i - 1] - 1.0
+    return rets
+
+
+def _rolling_mean_std(xs: List[float], window: int) -> Tuple[List[float], List[float]]:
+    """
+    Rolling mean and sample std (ddof=1) from running sums of x and x^2.
+    """
+    means, stds = [], []
+    s1 = s2 = 0.0
+    for i, x in enumerate(xs):
+        s1 += x
+        s2 += x * x
+        if i >= window:
+            old = xs[i - window]
+            s1 -= old
+            s2 -= old * old
+        n = min(i + 1, window)
+        mean = s1 / n
+        var = (s2 - n * mean * mean) / (n - 1) if n > 1 else 0.0
+        means.append(mean)
+        stds.append(math.sqrt(var) if var > 1e-18 else 0.0)
+    return means, stds
+
+
+def rolling_volatility(
+    values: Sequence[float],
+    window: int,
+    periods_per_year: Optional[int] = None,
+) -> List[float]:
+    """
+    Rolling std of the daily returns (annualised if periods_per_year is given).
+    The return of day 0 is excluded, so the first value is 0.0.
+    """
+    rets = aligned_returns(values)
+    if not rets:
+        return []
+    window = max(int(window), 1)
+    _, stds = _rolling_mean_std(rets[1:], window)
+    scale = math.sqrt(float(periods_per_year)) if periods_per_year and periods_per_year > 0 else 1.0
+    return [0.0] + [s * scale for s in stds]
+
+
+def rolling_sharpe(
+    values: Sequence[float],
+    window: int,
+    rf_annual: float = 0.0,
+    periods_per_year: Optional[int] = None,
+) -> List[float]:
+    """
+    Rolling Sharpe ratio of the daily returns, with the same conventions as
+    compute_sharpe_sortino (rf per period, sqrt(T) annualisation).
+    Windows with fewer than 2 returns or zero volatility give 0.0.
+    """
+    rets = aligned_returns(values)
+    if not rets:
+        return []
+    window = max(int(window), 1)
+    rf_per = _per_period_rf(rf_annual, periods_per_year)
+    means, stds = _rolling_mean_std([r - rf_per for r in rets[1:]], window)
+    scale = math.sqrt(float(periods_per_year)) if periods_per_year and periods_per_year > 0 else 1.0
+    out = [0.0]
+    for i, (m, s) in enumerate(zip(means, stds)):
+        n = min(i + 1, window)
+        out.append(m / s * scale if n > 1 and s > 0 else 0.0)
+    return out
+
+
+def rolling_drawdown(values: Sequence[float], window: int) -> List[float]:
+    """
+    Drawdown (<= 0) of each day from the highest value of the window ending
+    that day. A monotonic deque keeps the window maximum in O(1) amortised.
+    """
+    vals = [safe_float(v) for v in (values if values is not None else [])]
+    window = max(int(window), 1)
+    peaks = deque()  # indices with decreasing values
+    out = []
+    for i, v in enumerate(vals):
+        while peaks and vals[peaks[-1]] <= v:
+            peaks.pop()
+        peaks.append(i)
+        if peaks[0] <= i - window:
+            peaks.popleft()
+        peak = vals[peaks[0]]
+        out.append((v - peak) / peak if peak > 0 else 0.0)
+    return out
+
+
+def rolling_turnover(values: Sequence[float], notional: Sequence[float], window: int) -> List[float]:
+    """
+    Traded value over the window divided by the average portfolio value of
+    the window, i.e. compute_turnover restricted to each window.
+    'notional' holds the gross traded value (sum of |qty| * price) per day.
+    """
+    vals = [safe_float(v) for v in (values if values is not None else [])]
+    traded = [abs(safe_float(x)) for x in (notional if notional is not None else [])]
+    traded += [0.0] * (len(vals) - len(traded))
+    window = max(int(window), 1)
+    sum_traded = sum_pv = 0.0
+    n_pv = 0
+    out = []
+    for i, v in enumerate(vals):
+        sum_traded += traded[i]
+        if v > 0:
+            sum_pv += v
+            n_pv += 1
+        if i >= window:
+            sum_traded -= traded[i - window]
+            old = vals[i - window]
+            if old > 0:
+                sum_pv -= old
+                n_pv -= 1
+        avg_pv = sum_pv / n_pv if n_pv else 0.0
+        out.append(sum_traded / avg_pv if avg_pv > 0 else 0.0)
+    return out
+
+
+def summarize_rolling(
+    *,
+    values: Sequence[float],
+    notional: Optional[Sequence[float]] = None,
+    window: int = 20,
+    rf_annual: float = 0.0,
+    periods_per_year: Optional[int] = None,
+) -> Dict:
+    """
+    All rolling metrics of one player-round plus their extremes.
+    'values' is the daily equity curve, 'notional' the gross traded value per day.
+    """
+    vol = rolling_volatility(values, window, periods_per_year=periods_per_year)
+    sharpe = rolling_sharpe(values, window, rf_annual=rf_annual, periods_per_year=periods_per_year)
+    dd = rolling_drawdown(values, window)
+    turnover = rolling_turnover(values, notional or [], window)
+    return dict(
+        window=int(window),
+        volatility=vol,
+        sharpe=sharpe,
+        drawdown=dd,
+        turnover=turnover,
+        max_volatility=round(max(vol), 6) if vol else 0.0,
+        min_sharpe=round(min(sharpe), 6) if sharpe else 0.0,
+        worst_drawdown=round(min(dd), 6) if dd else 0.0,
+        max_turnover=round(max(turnover), 6) if turnover else 0.0,
+    )
+
+
+def summarize_rolling_batch(rounds: List[Dict], **kwargs) -> List[Dict]:
+    """
+    summarize_rolling for many player-rounds, e.g. a whole session.
+    Each entry needs 'values' (and optionally 'notional' and 'key');
+    keyword arguments (window, rf_annual, periods_per_year) apply to all.
+    """
+    out = []
+    for rnd in rounds:
+        res = summarize_rolling(values=rnd['values'], notional=rnd.get('notional'), **kwargs)
+        res['key'] = rnd.get('key')
+        out.append(res)
+    return out
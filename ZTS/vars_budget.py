@@ -0,0 +1,162 @@
+# ZTS/vars_budget.py
+# ---------------------------------
+# Footprint monitoring for participant.vars and session.vars.
+# oTree stores both as base64-encoded pickles that are rewritten on every save,
+# so their serialized size is what each page submission and live message pays.
+#
+# With 'vars_footprint' enabled in the session config, check() serializes the
+# vars the same way oTree does, records size and serialization time per
+# participant and per call site (page handler or live message), and logs a
+# warning when a configured budget is exceeded. The time is that of the
+# pickle and base64 encoding only, a lower bound of the save: the database
+# write that follows at the end of the request is not timed here.
+# Budgets:
+#   - participant_vars_budget_bytes: whole participant.vars
+#   - participant_vars_key_budget_bytes: any single key of participant.vars
+#   - session_vars_budget_bytes: whole session.vars
+# 'vars_footprint_sample_every' measures only every n-th live message.
+# The ZTS admin report lists the largest participants and keys.
+
+from typing import Dict, Optional
+import binascii
+import logging
+import pickle
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# how many participants the admin report lists
+N_TOP = 10
+
+
+def serialized_size(data: Dict) -> int:
+    """
+    Bytes oTree writes for a vars dict (base64 of the pickle).
+    """
+    return len(binascii.b2a_base64(pickle.dumps(dict(data))))
+
+
+def measure(data: Dict):
+    """
+    (total bytes, pickle + base64 seconds, {key: bytes}) of a vars dict.
+    """
+    t0 = time.perf_counter()
+    total = serialized_size(data)
+    seconds = time.perf_counter() - t0
+    key_sizes = {}
+    for key, value in data.items():
+        try:
+            key_sizes[key] = len(pickle.dumps(value))
+        except Exception:
+            key_sizes[key] = -1
+    return total, seconds, key_sizes
+
+
+class _SessionFootprint:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.participants = {}   # participant code -> latest measurement
+        self.sites = {}          # call site -> [count, total bytes, max bytes, total serialization seconds]
+        self.key_max = {}        # key -> max bytes seen
+        self.session_vars = None
+        self.warned = set()
+        self.calls = 0
+
+
+_footprints = {}
+_footprints_lock = threading.Lock()
+
+
+def _get(session_code: str) -> _SessionFootprint:
+    fp = _footprints.get(session_code)
+    if fp is None:
+        with _footprints_lock:
+            fp = _footprints.setdefault(session_code, _SessionFootprint())
+    return fp
+
+
+def _warn_once(fp, key, msg, *args):
+    if key not in fp.warned:
+        fp.warned.add(key)
+        logger.warning(msg, *args)
+
+
+def check(player, where: str, live: bool = False) -> Optional[Dict]:
+    """
+    Measure participant.vars (and session.vars) of a player at a call site.
+    Does nothing unless 'vars_footprint' is enabled for the session.
+    """
+    session = player.session
+    config = session.config
+    if not config.get('vars_footprint'):
+        return None
+    fp = _get(session.code)
+    with fp.lock:
+        fp.calls += 1
+        calls = fp.calls
+    if live and calls % max(int(config.get('vars_footprint_sample_every', 1)), 1):
+        return None
+
+    participant = player.participant
+    total, serialize_s, key_sizes = measure(participant.vars)
+    session_total, session_serialize_s, _ = measure(session.vars)
+    result = dict(participant=participant.code, where=where, bytes=total, serialize_s=serialize_s,
+                  keys=key_sizes, session_bytes=session_total, session_serialize_s=session_serialize_s)
+
+    with fp.lock:
+        fp.participants[participant.code] = result
+        site = fp.sites.setdefault(where, [0, 0, 0, 0.0])
+        site[0] += 1
+        site[1] += total
+        site[2] = max(site[2], total)
+        site[3] += serialize_s
+        for key, size in key_sizes.items():
+            if size > fp.key_max.get(key, 0):
+                fp.key_max[key] = size
+        fp.session_vars = (session_total, session_serialize_s)
+
+    budget = config.get('participant_vars_budget_bytes')
+    if budget and total > budget:
+        _warn_once(fp, ('participant', participant.code),
+                   'participant.vars of %s is %d bytes at %s (budget %d)', participant.code, total, where, budget)
+    key_budget = config.get('participant_vars_key_budget_bytes')
+    if key_budget:
+        for key, size in key_sizes.items():
+            if size > key_budget:
+                _warn_once(fp, ('key', participant.code, key),
+                           'participant.vars[%r] of %s is %d bytes at %s (budget %d)',
+                           key, participant.code, size, where, key_budget)
+    session_budget = config.get('session_vars_budget_bytes')
+    if session_budget and session_total > session_budget:
+        _warn_once(fp, ('session',), 'session.vars of %s is %d bytes (budget %d)',
+                   session.code, session_total, session_budget)
+    return result
+
+
+def report(session_code: str) -> Dict:
+    """
+    Summary for the admin report: largest participants, keys and call sites.
+    """
+    fp = _footprints.get(session_code)
+    if fp is None:
+        return dict(enabled=False, top_participants=[], top_keys=[], sites=[], session_bytes=0)
+    with fp.lock:
+        participants = sorted(fp.participants.values(), key=lambda r: r['bytes'], reverse=True)[:N_TOP]
+        top = [dict(participant=r['participant'], where=r['where'], bytes=r['bytes'],
+                    serialize_ms=round(r['serialize_s'] * 1000, 3),
+                    largest_key=max(r['keys'], key=r['keys'].get) if r['keys'] else '')
+               for r in participants]
+        keys = sorted(fp.key_max.items(), key=lambda kv: kv[1], reverse=True)[:N_TOP]
+        sites = [dict(where=w, count=s[0], avg_bytes=s[1] // s[0], max_bytes=s[2],
+                      avg_serialize_ms=round(s[3] / s[0] * 1000, 3))
+                 for w, s in sorted(fp.sites.items())]
+        session_bytes = fp.session_vars[0] if fp.session_vars else 0
+    return dict(
+        enabled=True,
+        top_participants=top,
+        top_keys=[dict(key=k, max_bytes=v) for k, v in keys],
+        sites=sites,
+        session_bytes=session_bytes,
+    )
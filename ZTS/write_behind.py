@@ -0,0 +1,273 @@
+# ZTS/write_behind.py
+# ---------------------------------
+# Optional write-behind buffer for TradingAction rows.
+# With 'trading_action_write_behind' enabled in the session config,
+# live_trading_report appends each row to a per player-round queue instead of
+# inserting it, which costs no database write in the live method. The rows
+# reach the database in bulk inserts (one executemany per flush):
+#
+#   - by a background flusher thread every FLUSH_INTERVAL_S seconds, through a
+#     DB connection of its own. oTree runs its requests on one connection, and
+#     SQLite allows one writer at a time, so the thread only runs with a
+#     server database (e.g. PostgreSQL via DATABASE_URL);
+#   - by the request at round 'End' (before set_payoff) and when the player
+#     leaves the TradingPage, for whatever the thread has not written yet.
+#
+# Backends:
+#   - RedisActionQueue: one Redis stream per player-round (used when REDIS_URL
+#     is set and the redis package is installed). Rows survive a restart of
+#     the server and are flushed by the next flusher or round end.
+#   - LocalActionQueue: in-process stand-in with the same interface, for
+#     development and single-process servers. Rows not yet flushed are lost
+#     when the process exits: up to FLUSH_INTERVAL_S seconds of rows with the
+#     flusher thread, the round so far without it (SQLite).
+#
+# Durability: the queue never deletes rows on read. Each flush returns the id
+# of the last row it handed out, and the flusher stores that cursor on the
+# Player in the same DB transaction as the inserted rows, after locking the
+# Player row (SELECT ... FOR UPDATE), so concurrent flushes of one player-round
+# (thread, request, other workers) never insert a row twice. A flush whose
+# transaction is rolled back leaves the cursor unchanged and the rows are
+# handed out again; rows at or below a committed cursor are trimmed on the
+# next flush, or acknowledged right after the flusher's commit (ack).
+#
+# Cleanup: once a player-round is over and its last flush is committed (the
+# ResultsPage, see Player.finish_trading_actions), finish() removes its queue:
+# the Redis stream is deleted if it is empty after the ack, otherwise it gets
+# a TTL of FINISHED_TTL_S seconds, which leaves the flusher time for rows that
+# arrived late. The flusher skips empty queues without opening a transaction.
+
+from typing import Callable, Dict, List, Optional, Tuple
+import json
+import logging
+import os
+import threading
+
+try:
+    import redis
+except ImportError:  # redis is only listed in requirements.txt (production)
+    redis = None
+
+
+logger = logging.getLogger(__name__)
+
+# seconds between two runs of the background flusher
+FLUSH_INTERVAL_S = float(os.environ.get('ZTS_WRITE_BEHIND_INTERVAL_S', 1.0))
+# lifetime of a finished player-round's stream that still holds rows
+FINISHED_TTL_S = 24 * 3600
+
+_redis_client = None
+
+
+def get_redis():
+    """
+    Shared Redis client from the REDIS_URL environment variable, or None if
+    Redis is not configured or not installed.
+    """
+    global _redis_client
+    url = os.environ.get('REDIS_URL')
+    if not url or redis is None:
+        return None
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(url)
+    return _redis_client
+
+
+class LocalActionQueue:
+    """
+    In-process stand-in for the Redis stream queue.
+    Row ids are increasing integers (as strings) per queue key.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._next_id = {}
+
+    def append(self, key: str, row: Dict) -> str:
+        with self._lock:
+            row_id = self._next_id.get(key, 1)
+            self._next_id[key] = row_id + 1
+            self._rows.setdefault(key, []).append((row_id, row))
+            return str(row_id)
+
+    def pending(self, key: str, cursor: str = '') -> List[Tuple[str, Dict]]:
+        after = int(cursor or 0)
+        with self._lock:
+            # rows at or below the committed cursor are no longer needed
+            rows = [(i, r) for i, r in self._rows.get(key, []) if i > after]
+            self._rows[key] = rows
+        return [(str(i), r) for i, r in rows]
+
+    def ack(self, key: str, cursor: str):
+        """
+        Drop the rows at or below a committed cursor.
+        """
+        with self._lock:
+            if key in self._rows:
+                self._rows[key] = [(i, r) for i, r in self._rows[key] if i > int(cursor)]
+
+    def has_rows(self, key: str) -> bool:
+        with self._lock:
+            return bool(self._rows.get(key))
+
+    def finish(self, key: str):
+        """
+        The player-round is over: forget the key unless rows are left.
+        """
+        with self._lock:
+            if not self._rows.get(key):
+                self._rows.pop(key, None)
+                self._next_id.pop(key, None)
+
+    def keys(self) -> List[str]:
+        """
+        Keys that still hold rows.
+        """
+        with self._lock:
+            return [key for key, rows in self._rows.items() if rows]
+
+
+class RedisActionQueue:
+    """
+    One Redis stream per player-round; rows are stored as JSON.
+    Redis stream ids ('<ms>-<seq>') are ordered, so the cursor is the last id.
+    """
+
+    def __init__(self, client, prefix: str = 'zts:actions:'):
+        self.client = client
+        self.prefix = prefix
+
+    def append(self, key: str, row: Dict) -> str:
+        row_id = self.client.xadd(self.prefix + key, {'row': json.dumps(row)})
+        return row_id.decode() if isinstance(row_id, bytes) else row_id
+
+    def pending(self, key: str, cursor: str = '') -> List[Tuple[str, Dict]]:
+        stream = self.prefix + key
+        if cursor:
+            # MINID keeps ids >= the given one; the cursor itself goes with the next trim
+            self.client.xtrim(stream, minid=cursor)
+        start = '(' + cursor if cursor else '-'
+        rows = []
+        for row_id, fields in self.client.xrange(stream, min=start, max='+'):
+            row_id = row_id.decode() if isinstance(row_id, bytes) else row_id
+            data = fields.get(b'row', fields.get('row'))
+            rows.append((row_id, json.loads(data)))
+        return rows
+
+    def ack(self, key: str, cursor: str):
+        """
+        Drop the rows at or below a committed cursor.
+        """
+        stream = self.prefix + key
+        self.client.xtrim(stream, minid=cursor)
+        self.client.xdel(stream, cursor)
+
+    def has_rows(self, key: str) -> bool:
+        return bool(self.client.xlen(self.prefix + key))
+
+    def finish(self, key: str):
+        """
+        The player-round is over: delete its stream if it is empty, otherwise
+        let it expire after FINISHED_TTL_S.
+        """
+        stream = self.prefix + key
+        if self.client.xlen(stream):
+            self.client.expire(stream, FINISHED_TTL_S)
+        else:
+            self.client.delete(stream)
+
+    def keys(self) -> List[str]:
+        """
+        Keys of the existing streams (a stream may be empty once trimmed).
+        """
+        keys = []
+        for stream in self.client.scan_iter(match=self.prefix + '*'):
+            stream = stream.decode() if isinstance(stream, bytes) else stream
+            keys.append(stream[len(self.prefix):])
+        return keys
+
+
+_local_queue = LocalActionQueue()
+
+
+def get_action_queue():
+    """
+    Redis-backed queue if REDIS_URL is configured, otherwise the in-process one.
+    """
+    client = get_redis()
+    if client is not None:
+        return RedisActionQueue(client)
+    return _local_queue
+
+
+def queue_key(player) -> str:
+    return '{}:{}'.format(player.session.code, player.id)
+
+
+def player_id_of(key: str) -> int:
+    return int(key.rsplit(':', 1)[1])
+
+
+def flush_rows(queue, key: str, cursor: str) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Rows queued after 'cursor' and the new cursor to store with them
+    (None if there was nothing to flush).
+    """
+    pending = queue.pending(key, cursor)
+    if not pending:
+        return [], None
+    return [row for _, row in pending], pending[-1][0]
+
+
+class Flusher:
+    """
+    Daemon thread that calls flush_key(key) for every key of the queue, every
+    interval_s seconds. flush_key does the DB transaction and returns the
+    number of inserted rows; errors are logged and retried on the next run.
+    """
+
+    def __init__(self, queue, flush_key: Callable[[str], int], interval_s: float = FLUSH_INTERVAL_S):
+        self.queue = queue
+        self.flush_key = flush_key
+        self.interval_s = interval_s
+        self.rows = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='zts-write-behind', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def run_once(self) -> int:
+        inserted = 0
+        for key in self.queue.keys():
+            try:
+                inserted += self.flush_key(key)
+            except Exception:
+                logger.exception('write-behind flush of %s failed', key)
+        self.rows += inserted
+        return inserted
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.run_once()
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def start_flusher(flush_key: Callable[[str], int]) -> Flusher:
+    """
+    Start the background flusher of this process unless it is running.
+    """
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = Flusher(get_action_queue(), flush_key)
+            _flusher.start()
+    return _flusher
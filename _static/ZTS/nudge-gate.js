@@ -5,36 +5,23 @@
 
   window.NUDGE_STATE = { pid: PID, cond: COND };
 
-  function enableNudges() {
+  // Nudges are decided on the server (ZTS/nudges.py) while it processes the
+  // live trading reports, and arrive as the reply to liveSend; trade_controller.js
+  // hands them to receive(). No separate HTTP round trip per event.
+  function receive(msg) {
     const p = window.NUDGE_STATE;
-    // hook your existing event emitters here
-    window.ZTS.on('orderFilled',  (e)=> maybeNudge('orderFilled', e));
-    window.ZTS.on('drawdown',     (e)=> maybeNudge('drawdown', e));
-    window.ZTS.on('heartbeat5s',  (e)=> maybeNudge('heartbeat', e));
+    if (p.cond !== 1) return; // hard gate (the server gates on cond as well)
+    if (msg?.nudge_text) {
+      window.ChatPane?.push(msg.nudge_text, { badge: msg.bias_tag || 'Nudge' });
+    }
+  }
+  function enableNudges() {
+    window.ZTSNudge = { receive: receive };
     document.getElementById('nudge-chat')?.classList.remove('hidden');
   }
   function disableNudges() {
     document.getElementById('nudge-chat')?.classList.add('hidden');
-    window.ZTS?.offAll?.(); // or remove the specific listeners
-  }
-  async function maybeNudge(eventType, payload){
-    const p = window.NUDGE_STATE;
-    if (p.cond !== 1) return; // hard gate
-    try{
-      const res = await fetch(`${window.NUDGE_API || ''}/nudges`, {
-        method:'POST',
-        headers:{'Content-Type':'application/json'},
-        body:JSON.stringify({
-          pid:p.pid, cond:p.cond, event_type:eventType,
-          features:payload || {}
-        })
-      });
-      if(!res.ok) return;
-      const msg = await res.json();
-      if(msg?.nudge_text){
-        window.ChatPane?.push(msg.nudge_text, { badge: msg.bias_tag || 'Nudge' });
-      }
-    }catch(e){}
+    window.ZTSNudge = { receive: function(){} };
   }
 
   if (COND === 1) enableNudges(); else disableNudges();
@@ -14,6 +14,9 @@ const asset = js_vars.asset;                            // name of the asset (na
 const start_cash = parseFloat(js_vars.cash);            // amount of initial cash
 const start_shares = parseInt(js_vars.shares);          // amount of initial shares
 const restore = localStorage.cur_day ? true : false;    // check if page was refreshed and we continue where we left off
+const order_coalesce_ms = parseInt(js_vars.order_coalesce_ms) || 0; // merge clicks of a day for this long (0 = send each click)
+const group_market = js_vars.group_market;                  // trade with the group through the order book
+const id_in_group = js_vars.id_in_group;                    // own id in the order book
 
 // dynamic portfolio variables 
 // NOTE: store relevant vars in localStorage, so they are not lost if page is refreshed, or session restarted
@@ -22,12 +25,41 @@ if (!restore) {
     localStorage.cash = start_cash;                             // amount of cash
     localStorage.shares = start_shares;                         // amount of initial shares a player holds
     localStorage.y_axis_offset = Math.min(1, 0.25 * prices[0]); // initial length of y axis from center
+    localStorage.report_seq = 0;                                // sequence number of the last trade report
 }
 var y = prices[parseInt(localStorage.cur_day)]              // current share price
 var share_value = 0.0                                       // value of shares at current day
 var total = parseFloat(localStorage.cash);                  // current cash + value of share in possession
 var roi_percent = 0.0;                                      // return of Investment in percents
 var pandl = 0.0;                                            // profit & Loss
+var pending_order = null;                                   // net order of merged clicks not yet sent
+var pending_timer = null;                                   // timer that sends the pending order
+
+var chart = null;                                           // Highcharts chart, created by start_round
+var interval_func = null;                                   // day clock, started by start_round
+var ready_ms = null;                                        // ms from the page request until the round started
+
+// setup that does not need the chart library
+set_buy_sell_amounts();
+
+// the round clock starts once the chart library is loaded (all scripts are deferred)
+if (window.Highcharts) {
+    start_round();
+} else {
+    window.addEventListener('load', start_round);
+}
+
+function start_round() {
+    chart = init_chart(prices.slice(0, parseInt(localStorage.cur_day) + 1));
+    update_y_axis(y);
+    ready_ms = Math.round(performance.now());
+    if (!restore) {
+        var report = get_trade_report('Start', prices[0], 0);
+        report.ready_ms = ready_ms;
+        liveSend(report);
+    }
+    interval_func = setInterval(next_day, refresh_rate);
+}
 
 /*------------------------------------------------------------------
 Function that simulates a day in the market:
@@ -36,25 +68,16 @@ Function that simulates a day in the market:
     - updates portfolio table
 ------------------------------------------------------------------*/
 
-// setup and first iteration
-set_buy_sell_amounts();
-var chart = init_chart(prices.slice(0, parseInt(localStorage.cur_day) + 1));
-update_y_axis(y);
-if (!restore) {
-    liveSend(get_trade_report('Start', prices[0], 0));
-}
-
-// wait until first interval is over before continuing
-setTimeout(function () {
-}, refresh_rate);
-
-var interval_func = setInterval(function () {
+function next_day() {
     // As function is called only at beginning of interval
     // any cleanup of previous interval has to be done at
     // beginning of current interval!
 
     //----------- clean up of last interval ----------
 
+    // orders are merged within one day only
+    flush_order();
+
     // end interval and send 'END' report if no days left
     if(parseInt(localStorage.cur_day) >= length - 1) {
         clearInterval(interval_func);
@@ -79,8 +102,7 @@ var interval_func = setInterval(function () {
         $_('trade_price').innerHTML = prices[parseInt(localStorage.cur_day)].toFixed(2);
         $_('trade_news').innerHTML = news[parseInt(localStorage.cur_day)];
     }
-
-}, refresh_rate);
+}
 
 /*------------------------------------------------------------------
 Trading Logic:
@@ -106,6 +128,10 @@ function set_buy_sell_amounts() {
 
 function buy_shares(amount) {
     amount = parseInt(amount);
+    if(group_market) {
+        send_market_order('Buy', amount);
+        return;
+    }
     if(parseInt(localStorage.cur_day)) {
         var cur_price = prices[parseInt(localStorage.cur_day)];
         var cur_total = amount * cur_price;
@@ -116,7 +142,7 @@ function buy_shares(amount) {
             update_portfolio();
 
             // send report to server
-            liveSend(get_trade_report('Buy', cur_price, amount));
+            send_order(cur_price, amount);
             toastr.remove(); toastr.success('Success!');
         }
         else if(parseFloat(localStorage.cash) > 0) {
@@ -125,8 +151,10 @@ function buy_shares(amount) {
             localStorage.cash = 0;
             localStorage.shares = parseInt(localStorage.shares) + available_amount;
             update_portfolio();
-            // send report to server
-            liveSend(get_trade_report('Buy', cur_price, available_amount));
+            // send report to server; the dropped rest of the cash is only
+            // recognizable in a report of its own (see ZTS/replay.py)
+            send_order(cur_price, available_amount);
+            flush_order();
             toastr.remove(); toastr.success('Bought '+available_amount+' shares!');
         }
         else {
@@ -138,6 +166,10 @@ function buy_shares(amount) {
 
 function sell_shares(amount) {
     amount = parseInt(amount);
+    if(group_market) {
+        send_market_order('Sell', amount);
+        return;
+    }
     if(parseInt(localStorage.cur_day) > 0) {
         var cur_price = prices[parseInt(localStorage.cur_day)];
         var cur_shares = parseInt(localStorage.shares);
@@ -148,7 +180,7 @@ function sell_shares(amount) {
             localStorage.shares = parseInt(localStorage.shares) - amount;
             update_portfolio();
             // send report to server
-            liveSend(get_trade_report('Sell', cur_price, -amount));
+            send_order(cur_price, -amount);
             toastr.remove(); toastr.success('Success!');
         }
          else if(cur_shares > 0) {
@@ -158,7 +190,7 @@ function sell_shares(amount) {
             localStorage.cash = parseFloat(localStorage.cash) + available_amount * cur_price;
             update_portfolio();
             // send report to server
-            liveSend(get_trade_report('Sell', cur_price, -available_amount));
+            send_order(cur_price, -available_amount);
             toastr.remove(); toastr.success('Sold remaining '+available_amount+' shares!',);
          }
         else {
@@ -168,6 +200,102 @@ function sell_shares(amount) {
     }
 }
 
+/*------------------------------------------------------------------
+Order coalescing:
+    - clicks within order_coalesce_ms of the first one on the same day
+      are sent as one net order; cash and shares are already updated
+      per click, and all clicks of a day trade at the same price, so
+      the net order has the same effect as the single clicks
+    - a buy that spends the last cash (partial buy) ends the order
+    - a net order of zero shares is not sent
+------------------------------------------------------------------*/
+function send_order(cur_price, amount) {
+    if (order_coalesce_ms <= 0) {
+        liveSend(get_trade_report(amount > 0 ? 'Buy' : 'Sell', cur_price, amount));
+        return;
+    }
+    var day = parseInt(localStorage.cur_day);
+    if (pending_order && pending_order.day !== day) {
+        flush_order();
+    }
+    if (!pending_order) {
+        pending_order = {day: day, price: cur_price, quantity: 0, clicks: 0};
+        pending_timer = setTimeout(flush_order, order_coalesce_ms);
+    }
+    pending_order.quantity += amount;
+    pending_order.clicks += 1;
+}
+
+function flush_order() {
+    if (pending_timer) {
+        clearTimeout(pending_timer);
+        pending_timer = null;
+    }
+    var order = pending_order;
+    pending_order = null;
+    if (!order || order.quantity === 0) {
+        return;
+    }
+    var report = get_trade_report(order.quantity > 0 ? 'Buy' : 'Sell', order.price, order.quantity);
+    report.clicks = order.clicks;
+    liveSend(report);
+}
+
+window.addEventListener('pagehide', flush_order);
+
+/*------------------------------------------------------------------
+Group market:
+    - buttons place limit orders at the current price in the group's
+      order book; cash and shares only change when the server reports
+      a fill (see liveRecv)
+    - window.ZTSMarket.cancel(order_id) cancels an own open order,
+      window.ZTSMarket.onBook(book) is called with the best price levels
+------------------------------------------------------------------*/
+function send_market_order(side, amount) {
+    if(parseInt(localStorage.cur_day) > 0) {
+        var report = get_trade_report('Order', prices[parseInt(localStorage.cur_day)], amount);
+        report.side = side;
+        report.limit_price = report.price_per_share;
+        liveSend(report);
+    }
+}
+
+function receive_market(market) {
+    if (market.error) {
+        toastr.remove(); toastr.error(market.error);
+        return;
+    }
+    market.fills.forEach(function (fill) {
+        var quantity = 0;
+        if (fill.buyer === id_in_group) quantity += fill.quantity;
+        if (fill.seller === id_in_group) quantity -= fill.quantity;
+        if (quantity !== 0) {
+            localStorage.cash = parseFloat(localStorage.cash) - quantity * fill.price;
+            localStorage.shares = parseInt(localStorage.shares) + quantity;
+            toastr.success((quantity > 0 ? 'Bought ' : 'Sold ') + Math.abs(quantity) + ' shares at ' + fill.price.toFixed(2));
+        }
+    });
+    update_portfolio();
+    var order = market.order;
+    if (order.player === id_in_group && order.remaining > 0) {
+        if (market.cancelled) {
+            toastr.info('Order cancelled');
+        } else {
+            toastr.info(order.side + ' order for ' + order.remaining + ' shares placed at ' + order.price.toFixed(2));
+        }
+    }
+    if (window.ZTSMarket.onBook) {
+        window.ZTSMarket.onBook(market.book);
+    }
+}
+
+window.ZTSMarket = window.ZTSMarket || {};
+window.ZTSMarket.cancel = function (order_id) {
+    var report = get_trade_report('Cancel', y, 0);
+    report.order_id = order_id;
+    liveSend(report);
+};
+
 /*------------------------------------------------------------------
 Portfolio Logic:
     - update portfolio
@@ -199,11 +327,30 @@ function update_y_axis(y) {
     }
 }
 
+/*------------------------------------------------------------------
+Live channel:
+    - nudges computed on the server come back as the reply to a report
+    - group market results are sent to every player of the group
+------------------------------------------------------------------*/
+function liveRecv(data) {
+    if (data && data.market) {
+        receive_market(data.market);
+    }
+    if (data && data.nudge) {
+        if (window.ZTSNudge) {
+            window.ZTSNudge.receive(data.nudge);
+        } else {
+            toastr.info(data.nudge.nudge_text, data.nudge.bias_tag || 'Nudge', {timeOut: 10000});
+        }
+    }
+}
+
 /*------------------------------------------------------------------
 Helper Functions:
     - get a dictionary with all the info for a trade
     - disable the buttons once trading period is over
     - get current date & time
+    - next sequence number of a trade report (survives page refresh)
     - to comma seperated adds a comma for thousands for readability
 ------------------------------------------------------------------*/
 function get_trade_report(action, cur_price, amount) {
@@ -211,6 +358,8 @@ function get_trade_report(action, cur_price, amount) {
         "action": action,
         "quantity": amount,
         "time": get_datetime(),
+        "client_ts_ms": Date.now(),
+        "client_seq": next_report_seq(),
         "price_per_share": cur_price,
         "cash": parseFloat(localStorage.cash),
         "owned_shares": parseInt(localStorage.shares),
@@ -235,11 +384,17 @@ function disable_buttons() {
 
 function get_datetime() {
     var today = new Date();
-    var date = today.getFullYear()+'-'+(today.getMonth()+1)+'-'+today.getDate();
-    var time = today.getHours() + ":" + today.getMinutes() + ":" + today.getSeconds();
+    var pad = function (n) { return n < 10 ? '0' + n : '' + n; };
+    var date = today.getFullYear()+'-'+pad(today.getMonth()+1)+'-'+pad(today.getDate());
+    var time = pad(today.getHours()) + ":" + pad(today.getMinutes()) + ":" + pad(today.getSeconds());
     return date+' '+time;
 }
 
+function next_report_seq() {
+    localStorage.report_seq = (parseInt(localStorage.report_seq) || 0) + 1;
+    return parseInt(localStorage.report_seq);
+}
+
 function to_comma_separated(amount) {
     x = parseInt(amount)
     x = x.toString().replace(/\B(?=(\d{3})+(?!\d))/g, ",");
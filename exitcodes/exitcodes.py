@@ -1,70 +1,136 @@
-from otree.models import Session
-from otree.api import safe_json
 # from Crypto.Cipher import AES
 # from Crypto.Hash import SHA
+import glob
 import hashlib
-from datetime import datetime
 import json
 import os
+import tempfile
+import threading
+from datetime import datetime
+
+# Exit codes are derived from the participant codes on demand (sha_hash), so
+# nothing is computed or written while a session is created. The files are
+# written in a background thread when the admin report is first opened
+# (save_in_background), atomically (temporary file + rename), so readers never
+# see a partial file; the custom export of the app streams all pairs.
 
-folder = '__access-exitcodes/'
-date = datetime.now().strftime("%Y-%m-%d")
+folder = os.environ.get('EXITCODES_DIR', os.path.join(os.getcwd(), '__access-exitcodes'))
 
-def hash_and_save_csv(participants, session_code, url):
+
+def file_path(session_code, extension, date=None):
 	"""
-	participants is the participants list
-	session_code is the current session code
-	url is the participant start url
-	for example:
-		http://192.168.99.100:3000/InitializeParticipant/
-		or
-		http://example.com/InitializeParticipant/
-	"""
-	codes = [participant.code for participant in participants]
-	hashed = hash_participant_codes(codes)
-	try:
-		if not os.path.exists(folder):
-			os.makedirs(folder)
-		with open(folder+date +"_"+ session_code + ".csv", 'x') as out:
-			print(out.name, 'does not yet exist')
+	Path of the persisted file of a session, e.g. __access-exitcodes/2024-01-31_abcd1234.csv
+	An existing file of the session keeps its date.
+	"""
+	if date is None:
+		existing = sorted(glob.glob(os.path.join(folder, "*_" + session_code + "." + extension)))
+		if existing:
+			return existing[0]
+		date = datetime.now().strftime("%Y-%m-%d")
+	return os.path.join(folder, date + "_" + session_code + "." + extension)
 
-			out.write('AccessCode,ExitCode'+'\n')     
-			for code_exit_code in hashed:
-				out.write(code_exit_code['AccessCode']+','+code_exit_code['ExitCode']+'\n')
-	except:
-		print(folder+date +"_"+ session_code + ".csv", 'does already exist')
+
+def save_csv(hashed, session_code, overwrite=False):
+	"""
+	hashed is an iterable of {'AccessCode', 'ExitCode'} dicts
+	session_code is the current session code
+	Returns the path; an existing file is kept unless overwrite is set.
+	"""
+	return write_atomic(file_path(session_code, 'csv'), iter_csv(hashed), overwrite)
 
 
-def hash_and_save_json(participants, session_code, url=""):
+def save_json(hashed, session_code, overwrite=False):
 	"""
-	participants is the participants list
+	hashed is an iterable of {'AccessCode', 'ExitCode'} dicts
 	session_code is the current session code
-	see above
+	Returns the path; an existing file is kept unless overwrite is set.
+	"""
+	return write_atomic(file_path(session_code, 'json'), iter_json(hashed), overwrite)
+
+
+_writing = set()
+_writing_lock = threading.Lock()
+
+
+def saved_files(session_code):
+	"""
+	Paths of the CSV and JSON file of a session, or None while they are not both written.
+	"""
+	paths = file_path(session_code, 'csv'), file_path(session_code, 'json')
+	return paths if all(os.path.exists(path) for path in paths) else None
+
+
+def save_in_background(codes, session_code):
+	"""
+	Write the CSV and JSON files of a session in a thread, unless that is already running.
+	codes is the list of participant codes; they are hashed in the thread.
+	"""
+	with _writing_lock:
+		if session_code in _writing:
+			return
+		_writing.add(session_code)
+
+	def run():
+		try:
+			save_csv(iter_exit_codes(codes), session_code)
+			save_json(iter_exit_codes(codes), session_code)
+		finally:
+			with _writing_lock:
+				_writing.discard(session_code)
+
+	threading.Thread(target=run, name='exitcodes-' + session_code, daemon=True).start()
+
+
+def write_atomic(path, chunks, overwrite=False):
+	"""
+	Write the text chunks to a temporary file next to path and rename it into place.
 	"""
-	codes = [participant.code for participant in participants]
-	# Choose Hashing or Encrypting here
-	hashed = hash_participant_codes(codes)
+	if os.path.exists(path) and not overwrite:
+		return path
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', dir=os.path.dirname(path))
 	try:
-		if not os.path.exists(folder):
-			os.makedirs(folder)
-		with open(folder+date +"_"+ session_code + ".json", 'x') as out:
-			print(out.name, 'does not yet exist')
+		with os.fdopen(fd, 'w', newline='') as out:
+			for chunk in chunks:
+				out.write(chunk)
+			out.flush()
+			os.fsync(out.fileno())
+		os.replace(tmp_path, path)
+	except BaseException:
+		os.unlink(tmp_path)
+		raise
+	return path
 
-			json.dump(hashed, out, indent=4)
-			safe_json(hashed)
-	except:
-		print(folder+date +"_"+ session_code + ".json", 'does already exist')
 
-	return hashed
+def iter_exit_codes(codes):
+	"""
+	Lazily pair participant codes with their exit codes.
+	"""
+	for code in codes:
+		yield {'AccessCode': code, 'ExitCode': sha_hash(code)}
+
 
-def hash_participant_codes(codes):
+def iter_csv(hashed):
 	"""
-	Hash the participants codes
+	CSV text of the code pairs, one line per chunk.
 	"""
-	return [{'AccessCode': code,
-			 'ExitCode': sha_hash(code)} for code in codes]
+	yield 'AccessCode,ExitCode\n'
+	for pair in hashed:
+		yield pair['AccessCode'] + ',' + pair['ExitCode'] + '\n'
+
+
+def iter_json(hashed):
+	"""
+	JSON array text of the code pairs, one element per chunk.
+	"""
+	yield '['
+	for i, pair in enumerate(hashed):
+		yield (',\n' if i else '\n') + json.dumps(pair)
+	yield '\n]\n'
+
 
 def sha_hash(string):
 	# b: Specify the length of the codes here
 	# return SHA.new(string.encode()).hexdigest()[:8]
-	return hashlib.sha256(string.encode()).hexdigest()[:8]
\ No newline at end of file
+	return hashlib.sha256(string.encode()).hexdigest()[:8]
+
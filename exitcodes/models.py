@@ -2,7 +2,12 @@ from otree.api import (
 	models, widgets, BaseConstants, BaseSubsession, BaseGroup, BasePlayer,
 	Currency as c, currency_range, safe_json
 )
-from .exitcodes import hash_and_save_csv, hash_and_save_json
+from otree.database import db
+from otree.models import Participant
+from .exitcodes import iter_exit_codes, save_in_background, saved_files
+
+# how many code pairs the admin report shows; the files and the custom export contain all
+N_PREVIEW = 100
 
 class Constants(BaseConstants):
 	name_in_url = 'exitcodes'
@@ -10,19 +15,58 @@ class Constants(BaseConstants):
 	num_rounds = 1
 
 class Subsession(BaseSubsession):
-	def creating_session(self):
-		# You can change the URL or leave it blank for a simple AccessCode, ExitCode file.
-		hash_and_save_csv(self.session.participant_set.all(), self.session.code, "")
-		# global json_data
-		self.session.vars['codes'] = hash_and_save_json(self.session.participant_set.all(), self.session.code, "")
+	# Exit codes are derived from participant codes on demand (see exitcodes.py),
+	# so creating a session neither hashes nor writes anything. They are the
+	# same whenever they are derived; the files are written in the background
+	# when the admin report is first opened, as the report used to fill session.vars.
 
-	def vars_for_admin_report(self):	
-		if('codes' not in self.session.vars):	
-			self.session.vars['codes'] = hash_and_save_json(self.session.participant_set.all(), self.session.code, "")	
-		return {'AccessExit': safe_json(self.session.vars['codes'])}	
+	def vars_for_admin_report(self):
+		session = self.session
+		paths = saved_files(session.code)
+		if paths is None:
+			save_in_background(list(participant_codes(session)), session.code)
+		csv_path, json_path = paths or ('', '')
+		return {
+			'AccessExit': safe_json(list(iter_exit_codes(participant_codes(session, limit=N_PREVIEW)))),
+			'num_participants': session.num_participants,
+			'num_preview': N_PREVIEW,
+			'csv_path': csv_path,
+			'json_path': json_path,
+		}
 
 class Group(BaseGroup):
 	pass
 
 class Player(BasePlayer):
 	pass
+
+
+def participant_codes(session, limit=None):
+	"""
+	Participant codes of a session in id order, read in batches without
+	loading the Participant objects.
+	"""
+	query = (
+		db.query(Participant.code)
+		.filter(Participant.session_id == session.id)
+		.order_by(Participant.id_in_session)
+	)
+	if limit:
+		query = query.limit(limit)
+	for (code,) in query.yield_per(1000):
+		yield code
+
+
+def custom_export(players):
+	"""
+	All AccessCode/ExitCode pairs of the sessions of the given players.
+	"""
+	yield ['session', 'AccessCode', 'ExitCode']
+	seen = set()
+	for p in players:
+		session = p.session
+		if session.id in seen:
+			continue
+		seen.add(session.id)
+		for pair in iter_exit_codes(participant_codes(session)):
+			yield [session.code, pair['AccessCode'], pair['ExitCode']]
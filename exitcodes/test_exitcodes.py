@@ -0,0 +1,83 @@
+import json
+import os
+import time
+
+import pytest
+
+from . import exitcodes
+
+
+@pytest.fixture(autouse=True)
+def folder(tmp_path, monkeypatch):
+	monkeypatch.setattr(exitcodes, 'folder', str(tmp_path))
+	return tmp_path
+
+
+def test_iter_exit_codes_is_lazy():
+	taken = []
+
+	def codes():
+		for code in ('abc123', 'def456', 'ghi789'):
+			taken.append(code)
+			yield code
+
+	pairs = exitcodes.iter_exit_codes(codes())
+	assert taken == []
+	assert next(pairs) == {'AccessCode': 'abc123', 'ExitCode': exitcodes.sha_hash('abc123')}
+	assert taken == ['abc123']
+	assert [pair['AccessCode'] for pair in pairs] == ['def456', 'ghi789']
+	# derived, so the same every time
+	assert exitcodes.sha_hash('abc123') == exitcodes.sha_hash('abc123') != exitcodes.sha_hash('def456')
+	assert len(exitcodes.sha_hash('abc123')) == 8
+
+
+def test_csv_and_json_text():
+	pairs = list(exitcodes.iter_exit_codes(['abc123', 'def456']))
+	assert ''.join(exitcodes.iter_csv(pairs)).splitlines() == [
+		'AccessCode,ExitCode', 'abc123,' + pairs[0]['ExitCode'], 'def456,' + pairs[1]['ExitCode']]
+	assert json.loads(''.join(exitcodes.iter_json(pairs))) == pairs
+	assert json.loads(''.join(exitcodes.iter_json([]))) == []
+
+
+def test_write_atomic_keeps_or_replaces_the_file(folder):
+	path = str(folder / 'sub' / 'codes.csv')
+	assert exitcodes.write_atomic(path, ['a', 'b']) == path
+	assert open(path).read() == 'ab'
+	# an existing file is kept unless overwrite is set
+	exitcodes.write_atomic(path, ['c'])
+	assert open(path).read() == 'ab'
+	exitcodes.write_atomic(path, ['c'], overwrite=True)
+	assert open(path).read() == 'c'
+	assert os.listdir(str(folder / 'sub')) == ['codes.csv']
+
+
+def test_write_atomic_leaves_no_partial_file(folder):
+	path = str(folder / 'codes.csv')
+
+	def failing():
+		yield 'first line\n'
+		raise RuntimeError('lost connection')
+
+	with pytest.raises(RuntimeError):
+		exitcodes.write_atomic(path, failing())
+	assert os.listdir(str(folder)) == []
+
+	exitcodes.write_atomic(path, ['old'])
+	with pytest.raises(RuntimeError):
+		exitcodes.write_atomic(path, failing(), overwrite=True)
+	assert os.listdir(str(folder)) == ['codes.csv']
+	assert open(path).read() == 'old'
+
+
+def test_save_in_background_writes_both_files():
+	assert exitcodes.saved_files('sess1') is None
+	exitcodes.save_in_background(['abc123', 'def456'], 'sess1')
+	deadline = time.monotonic() + 10
+	while exitcodes.saved_files('sess1') is None and time.monotonic() < deadline:
+		time.sleep(0.01)
+	csv_path, json_path = exitcodes.saved_files('sess1')
+	pairs = list(exitcodes.iter_exit_codes(['abc123', 'def456']))
+	assert json.load(open(json_path)) == pairs
+	assert open(csv_path).read() == ''.join(exitcodes.iter_csv(pairs))
+	# an existing file keeps its date
+	assert exitcodes.file_path('sess1', 'csv') == csv_path
@@ -38,6 +38,56 @@ SESSION_CONFIG_DEFAULTS = dict(
     real_world_currency_per_point=1,
     participation_fee=1.00,
     doc='',
+
+    # ===== Metrics =====
+    # Window in days of the rolling risk metrics (Player.get_rolling_metrics)
+    metrics_rolling_window_days=20,
+    # Round logs in participant.vars: exact recent values/trades, older values downsampled (ZTS/round_series.py)
+    round_series_capacity=500,
+    round_series_buckets=250,
+    # Keep rounds in memory and write only the end-of-round result: '' (off), 'training' or 'all'
+    ephemeral_rounds='',
+
+    # ===== Performance knobs =====
+    # Buffer TradingAction rows (Redis stream if REDIS_URL is set, else in-process) and
+    # bulk-insert them from a background thread (server DB only) and at round end, see ZTS/write_behind.py
+    trading_action_write_behind=False,
+    # Write the TradingActions to a CSV file in the background when the last participant
+    # finishes; the custom export then streams that file (ZTS/exports.py). The admin
+    # report can also start the export at any time
+    trading_action_export_on_complete=False,
+    # Record serialized size of participant/session vars (admin report) and
+    # warn when a budget in bytes is exceeded; 0 disables a budget
+    vars_footprint=False,
+    vars_footprint_sample_every=10,
+    participant_vars_budget_bytes=0,
+    participant_vars_key_budget_bytes=0,
+    session_vars_budget_bytes=0,
+    # Merge Buy/Sell clicks of one day for this many ms into one net order (0 = off)
+    order_coalesce_ms=0,
+    # Per-player live messages per second (token bucket, 0 = unlimited), see ZTS/rate_limit.py
+    live_rate_limit_per_s=0,
+    live_rate_limit_burst=40,
+    # Players of a group trade with each other through a limit order book, see ZTS/order_book.py
+    group_market=False,
+    # Sampling profiler (ZTS/profiling.py): a window of this many seconds (0 = off), opened by the
+    # first 'Start' of round 'profile_round'; status and download in the ZTS admin report
+    profile_window_s=0,
+    profile_round=1,
+
+    # Page benchmark (zts_page_benchmark session, see ZTS/page_benchmark.py); 0 disables a budget
+    page_benchmark=False,
+    page_html_budget_bytes=0,
+    page_js_vars_budget_bytes=0,
+    page_render_budget_ms=0,
+
+    # ===== Nudges =====
+    # In-process nudge rules for the treatment arm (cond == 1), see ZTS/nudges.py;
+    # 'nudge_rules' may override the default rules with a JSON list. Off by default,
+    # turn on per study session
+    live_nudges=False,
+    nudge_cooldown_s=30,
+    nudge_max_per_round=5,
 )
 
 # ---------------------------------------------------------------------
@@ -74,6 +124,50 @@ SESSION_CONFIGS = [
         initial_shares='[0,0,0]',
         trading_button_values='[[1,10,20],[1,10,20],[1,10,20]]',
     ),
+
+    # Page payload / render-time benchmark: run with 'otree test zts_page_benchmark'
+    # (generated scenarios of increasing length, see ZTS/page_benchmark.py)
+    dict(
+        name='zts_page_benchmark',
+        display_name='ZTS page benchmark (bots only)',
+        num_demo_participants=1,
+        app_sequence=['ZTS'],
+        training_round=False,
+        nudge_link_round='',
+        timeseries_filename='[{"model": "gbm", "length": 250, "seed": 1}, {"model": "gbm", "length": 1000, "seed": 1}, '
+                            '{"model": "gbm", "length": 2500, "seed": 1}, {"model": "gbm", "length": 5000, "seed": 1}]',
+        refresh_rate_ms='500',
+        initial_cash='5000',
+        initial_shares='17',
+        trading_button_values='[[1, 10, 20], [1, 10, 20], [1, 10, 20], [1, 10, 20]]',
+        page_benchmark=True,
+        page_html_budget_bytes=150000,
+        page_js_vars_budget_bytes=100000,
+        page_render_budget_ms=200,
+    ),
+
+    # The same scenario twice, the training round ephemeral: run with 'otree test zts_ephemeral_check',
+    # the bots check that both rounds end with the same result
+    dict(
+        name='zts_ephemeral_check',
+        display_name='ZTS ephemeral round check (bots only)',
+        num_demo_participants=1,
+        app_sequence=['ZTS'],
+        nudge_link_round='',
+        timeseries_filename='["demo_1.csv", "demo_1.csv"]',
+        ephemeral_rounds='training',
+    ),
+
+    # Group market mode with two traders: run with 'otree test zts_group_market_check',
+    # the bots trade through the order book and check the positions
+    dict(
+        name='zts_group_market_check',
+        display_name='ZTS group market check (bots only)',
+        num_demo_participants=2,
+        app_sequence=['ZTS'],
+        nudge_link_round='',
+        group_market=True,
+    ),
 ]
 
 # Session-wide extra values (optional)